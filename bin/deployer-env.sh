@@ -10,7 +10,11 @@ export ETCD_TOTEM_BASE="${ETCD_TOTEM_BASE:-/totem}"
 export ETCD_YODA_BASE="${ETCD_YODA_BASE:-/yoda}"
 export CELERY_GEVENT_EXECUTORS="${CELERY_GEVENT_EXECUTORS:-1}"
 export CELERY_GEVENT_CONCURRENCY="${CELERY_GEVENT_CONCURRENCY:-50}"
+export CELERY_GEVENT_MAX_CONCURRENCY="${CELERY_GEVENT_MAX_CONCURRENCY:-200}"
 export CELERY_PREFORK_CONCURRENCY="${CELERY_PREFORK_CONCURRENCY:-2}"
+export CELERY_PREFORK_MAX_CONCURRENCY="${CELERY_PREFORK_MAX_CONCURRENCY:-8}"
+export CELERY_CRITICAL_CONCURRENCY="${CELERY_CRITICAL_CONCURRENCY:-20}"
+export CELERY_NOTIFICATION_CONCURRENCY="${CELERY_NOTIFICATION_CONCURRENCY:-10}"
 export API_EXECUTORS="${API_EXECUTORS:-2}"
 export C_FORCE_ROOT="${C_FORCE_ROOT:-true}"
 export SSH_HOST_KEY="${SSH_HOST_KEY:-/root/.ssh/id_rsa}"
@@ -68,6 +68,8 @@ TASK_SETTINGS = {
     'START_CONCURRENCY': os.getenv('START_CONCURRENCY', 3),
     'START_CONCURRENCY_RETRIES': 60,
     'START_CONCURRENCY_RETRY_DELAY': 60,
+    'SYNC_CREATE_TIMEOUT': int(os.getenv('SYNC_CREATE_TIMEOUT', '600')),
+    'SYNC_WAIT_POLL_INTERVAL': 2,
 
 }
 
@@ -101,6 +103,35 @@ NOTIFICATIONS_DEFAULTS = {
     }
 }
 
+# Notifications for same channel (endpoint) queued within the window are
+# coalesced and sent as a single notification.
+NOTIFICATION_SETTINGS = {
+    'coalesce': os.getenv('NOTIFICATION_COALESCE_ENABLED', 'true').strip()
+    .lower() in BOOLEAN_TRUE_VALUES,
+    'coalesce-window': float(os.getenv('NOTIFICATION_COALESCE_WINDOW', '5')),
+    'coalesce-size': int(os.getenv('NOTIFICATION_COALESCE_SIZE', '10')),
+    'rate-limits': {
+        'hipchat': os.getenv('NOTIFICATION_RATE_LIMIT_HIPCHAT', '30/m'),
+        'slack': os.getenv('NOTIFICATION_RATE_LIMIT_SLACK', '60/m'),
+        'github': os.getenv('NOTIFICATION_RATE_LIMIT_GITHUB', '60/m')
+    }
+}
+
+# Notification templates are compiled once per process (and never reloaded).
+# Compiled bytecode is shared across processes using bytecode cache.
+TEMPLATE_SETTINGS = {
+    'bytecode-cache': os.getenv('TEMPLATE_BYTECODE_CACHE_ENABLED', 'true')
+    .strip().lower() in BOOLEAN_TRUE_VALUES,
+    'bytecode-cache-dir': os.getenv('TEMPLATE_BYTECODE_CACHE_DIR') or None
+}
+
+# Settings for outgoing HTTP requests (e.g. notifications)
+HTTP_SETTINGS = {
+    'connect-timeout': float(os.getenv('HTTP_CONNECT_TIMEOUT', '5')),
+    'read-timeout': float(os.getenv('HTTP_READ_TIMEOUT', '10')),
+    'pool-size': int(os.getenv('HTTP_POOL_SIZE', '10'))
+}
+
 DEFAULT_STOP_TIMEOUT = '30s'
 
 DEPLOYMENT_DEFAULTS = {
@@ -211,6 +242,9 @@ LOCK_JOB_TTL = 120
 LOCK_JOB_BASE = '/cluster-deployer/locks/jobs'
 LOCK_JOB_SYNC_PROMOTED_UPSTREAMS = 'sync-promoted-upstreams'
 LOCK_JOB_SYNC_PROMOTED_UNITS = 'sync-promoted-units'
+# No. of deployments whose runtime updates are written together by the sync
+# jobs
+RUNTIME_SYNC_CHUNK_SIZE = int(os.getenv('RUNTIME_SYNC_CHUNK_SIZE', '50'))
 
 TOTEM_ETCD_SETTINGS = {
     'base': os.getenv('ETCD_TOTEM_BASE', '/totem'),
@@ -224,8 +258,8 @@ CORS_ENABLED = os.getenv('CORS_ENABLED', 'true').strip().lower() in \
 CORS_SETTINGS = {
     'origins': os.getenv('CORS_ORIGINS', '*'),
     'headers': ['Content-Type', 'Authorization'],
-    'expose_headers': ['Content-Type', 'Link', 'Location', 'E-Tag',
-                       'If-Modified-Since', 'Content-Length'],
+    'expose_headers': ['Content-Type', 'Link', 'Location', 'E-Tag', 'ETag',
+                       'Last-Modified', 'If-Modified-Since', 'Content-Length'],
     'supports_credentials': True,
 
 }
@@ -237,6 +271,12 @@ ENCRYPTION = {
         'base': os.getenv('ENCRYPTION_S3_BASE', 'totem/keys'),
     },
     'passphrase': os.getenv('ENCRYPTION_PASSPHRASE', None),
+    'cache': {
+        'enabled': os.getenv('ENCRYPTION_CACHE_ENABLED', 'true').strip()
+        .lower() in BOOLEAN_TRUE_VALUES,
+        'ttl': float(os.getenv('ENCRYPTION_CACHE_TTL', '300')),
+        'max-size': int(os.getenv('ENCRYPTION_CACHE_MAX_SIZE', '100'))
+    }
 }
 
 MIME_JSON = 'application/json'
@@ -253,6 +293,9 @@ MIME_APP_VERSION_CREATE_V1 = \
 MIME_APP_VERSION_DELETE_V1 = \
     'application/vnd.deployer.app.version.delete.v1+json'
 MIME_APP_DELETE_V1 = 'application/vnd.deployer.app.delete.v1+json'
+MIME_APP_VERSION_EVENT_LIST_V1 = \
+    'application/vnd.deployer.app.version.event-list.v1+json'
+MIME_DEPLOY_LATENCY_V1 = 'application/vnd.deployer.deploy-latency.v1+json'
 MIME_HEALTH_V1 = 'application/vnd.deployer.health.v1+json'
 MIME_RECOVERY_V1 = 'application/vnd.deployer.recovery.v1+json'
 
@@ -263,17 +306,61 @@ SCHEMA_APP_VERSION_CREATE_V1 = 'app-version-create-v1'
 SCHEMA_APP_VERSION_V1 = 'app-version-v1'
 SCHEMA_APP_VERSION_LIST_V1 = 'app-version-list-v1'
 SCHEMA_APP_VERSION_UNIT_LIST_V1 = 'app-version-unit-list-v1'
+SCHEMA_APP_VERSION_EVENT_LIST_V1 = 'app-version-event-list-v1'
+SCHEMA_DEPLOY_LATENCY_V1 = 'deploy-latency-v1'
 SCHEMA_HEALTH_V1 = 'health-v1'
 SCHEMA_RECOVERY_V1 = 'recovery-v1'
 
 API_MAX_PAGE_SIZE = 1000
 API_DEFAULT_PAGE_SIZE = 10
+API_STREAM_BUFFER_SIZE = 64 * 1024
 
 HEALTH_OK = 'ok'
 HEALTH_FAILED = 'failed'
 
+# Health checks are probed in background and cached results are served by
+# the health API. Results older than stale-after seconds are marked stale.
+HEALTH_SETTINGS = {
+    'probe-interval': float(os.getenv('HEALTH_PROBE_INTERVAL', '15')),
+    'stale-after': float(os.getenv('HEALTH_STALE_AFTER', '60')),
+    'timeout': float(os.getenv('HEALTH_TIMEOUT', '10'))
+}
+
+# Celery worker pools are autoscaled (See: deployer.autoscale) to drain the
+# queue backlog within drain-seconds, using observed task runtimes.
+AUTOSCALE_SETTINGS = {
+    'poll-interval': float(os.getenv('AUTOSCALE_POLL_INTERVAL', '5')),
+    'drain-seconds': float(os.getenv('AUTOSCALE_DRAIN_SECONDS', '60')),
+    'default-runtime': float(os.getenv('AUTOSCALE_DEFAULT_RUNTIME', '5'))
+}
+
+# Gevent hub blocking monitor (for workers running with gevent pool).
+# Greenlets running without yielding for more than threshold seconds are
+# reported.
+HUB_MONITOR_SETTINGS = {
+    'enabled': os.getenv('HUB_MONITOR_ENABLED', 'true').strip().lower() in
+    BOOLEAN_TRUE_VALUES,
+    'threshold': float(os.getenv('HUB_MONITOR_THRESHOLD', '0.5'))
+}
+
+# Deploy latency analytics
+ANALYTICS_SETTINGS = {
+    # Sliding windows (e.g. 1h, 1d, 7d) for which latency rollups are
+    # computed. Empty config falls back to the default windows.
+    'windows': [window.strip() for window in
+                os.getenv('ANALYTICS_WINDOWS', '').split(',')
+                if window.strip()] or ['1h', '1d', '7d'],
+    'percentiles': (50, 95, 99)
+}
+
 # Storage
-DEFAULT_STORE_NAME = 'mongo'
+DEFAULT_STORE_NAME = os.getenv('DEFAULT_STORE_NAME', 'mongo')
+STORE_CACHE_SETTINGS = {
+    'enabled': os.getenv('STORE_CACHE_ENABLED', 'false').strip().lower() in
+    BOOLEAN_TRUE_VALUES,
+    'ttl': float(os.getenv('STORE_CACHE_TTL', '5')),
+    'max-size': int(os.getenv('STORE_CACHE_MAX_SIZE', '1000'))
+}
 # Mongo Settings
 MONGODB_USERNAME = os.getenv('MONGODB_USERNAME', '')
 MONGODB_PASSWORD = os.getenv('MONGODB_PASSWORD', '')
@@ -297,6 +384,25 @@ MONGODB_DEPLOYMENT_COLLECTION = os.getenv('MONGODB_DEPLOYMENT_COLLECTION') or \
     'deployments'
 MONGODB_EVENT_COLLECTION = os.getenv('MONGODB_EVENT_COLLECTION') or \
     'events'
+MONGODB_APP_COLLECTION = os.getenv('MONGODB_APP_COLLECTION') or 'apps'
+MONGODB_ROLLUP_COLLECTION = os.getenv('MONGODB_ROLLUP_COLLECTION') or \
+    'rollups'
+MONGODB_CLIENT_SETTINGS = {
+    'maxPoolSize': int(os.getenv('MONGODB_MAX_POOL_SIZE', '50')),
+    'connectTimeoutMS': int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000')),
+    'socketTimeoutMS': int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '30000')),
+    'serverSelectionTimeoutMS': int(
+        os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '10000')),
+    'waitQueueTimeoutMS': int(
+        os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '10000'))
+}
+# Read preference for read only operations (primary, primaryPreferred,
+# secondary, secondaryPreferred, nearest)
+MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE') or 'primary'
+# Read preference for read only operations serving the API (list / read
+# endpoints), where slightly stale data is acceptable.
+MONGODB_API_READ_PREFERENCE = os.getenv('MONGODB_API_READ_PREFERENCE') or \
+    'secondaryPreferred'
 
 # Number of seconds after a non running deployment will expire
 DEFAULT_DEPLOYMENT_EXPIRY_SECONDS = 4 * 7 * 24 * 3600  # 4 weeks
@@ -305,3 +411,14 @@ DEPLOYMENT_EXPIRY_SECONDS = int(
 DEFAULT_EVENT_EXPIRY_SECONDS = 365 * 24 * 3600  # 1 year
 EVENT_EXPIRY_SECONDS = int(
     os.getenv('EVENT_EXPIRY_SECONDS', DEFAULT_EVENT_EXPIRY_SECONDS))
+
+# Storage mode for events:
+#   ttl: Single collection with events expired using TTL index
+#   bucketed: Daily collections ({event_coll}-YYYYMMDD) that are dropped
+#             as a whole once expired
+#   capped: Single capped collection (EVENT_CAPPED_SIZE bytes)
+EVENT_STORAGE_MODE_TTL = 'ttl'
+EVENT_STORAGE_MODE_BUCKETED = 'bucketed'
+EVENT_STORAGE_MODE_CAPPED = 'capped'
+EVENT_STORAGE_MODE = os.getenv('EVENT_STORAGE_MODE') or EVENT_STORAGE_MODE_TTL
+EVENT_CAPPED_SIZE = int(os.getenv('EVENT_CAPPED_SIZE', 512 * 1024 * 1024))
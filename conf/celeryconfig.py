@@ -4,7 +4,7 @@ from ast import literal_eval
 
 from celery.schedules import crontab
 from kombu import Queue
-from conf.appconfig import MONGODB_DB, MONGODB_URL
+from conf.appconfig import MONGODB_DB, MONGODB_URL, NOTIFICATION_SETTINGS
 
 TOTEM_ENV = os.getenv('TOTEM_ENV', 'local')
 CLUSTER_NAME = os.getenv('CLUSTER_NAME', TOTEM_ENV)
@@ -31,35 +31,57 @@ BROKER_CONNECTION_RETRY = True
 BROKER_CONNECTION_MAX_RETRIES = 100
 CELERY_DEFAULT_QUEUE = 'ha.cluster-deployer-%s-default' % CLUSTER_NAME
 CELERY_PREFORK_QUEUE = 'ha.cluster-deployer-%s-prefork' % CLUSTER_NAME
+CELERY_CRITICAL_QUEUE = 'ha.cluster-deployer-%s-critical' % CLUSTER_NAME
+CELERY_NOTIFICATION_QUEUE = 'ha.cluster-deployer-%s-notification' % \
+    CLUSTER_NAME
 CELERY_QUEUES = (
     Queue(CELERY_DEFAULT_QUEUE, routing_key='default',
           queue_arguments={'x-message-ttl': MESSAGES_TTL}),
     Queue(CELERY_PREFORK_QUEUE, routing_key='prefork',
           queue_arguments={'x-message-ttl': MESSAGES_TTL}),
+    Queue(CELERY_CRITICAL_QUEUE, routing_key='critical',
+          queue_arguments={'x-message-ttl': MESSAGES_TTL}),
+    Queue(CELERY_NOTIFICATION_QUEUE, routing_key='notification',
+          queue_arguments={'x-message-ttl': MESSAGES_TTL}),
 )
 CELERY_DEFAULT_EXCHANGE = 'ha.cluster-deployer-%s' % (CLUSTER_NAME)
 CELERY_DEFAULT_EXCHANGE_TYPE = 'direct'
 CELERY_DEFAULT_ROUTING_KEY = 'default'
-CELERY_ROUTES = {
-    'deployer.tasks.deployment._fleet_deploy': {
-        'routing_key': 'prefork',
-    },
-    'deployer.tasks.deployment._fleet_undeploy': {
-        'routing_key': 'prefork',
-    },
-    'deployer.tasks.deployment._wait_for_undeploy': {
-        'routing_key': 'prefork',
-    },
-    'deployer.tasks.deployment._wait_for_undeploy': {
-        'routing_key': 'prefork',
-    },
-    'deployer.tasks.deployment._fleet_check_running': {
-        'routing_key': 'prefork',
-    },
-    'deployer.tasks.deployment.sync_units_task': {
-        'routing_key': 'prefork',
-    }
-}
+# Tasks on the deploy critical path get a dedicated lane so that they are
+# not queued behind background (sync / notification) tasks.
+CRITICAL_TASKS = (
+    'deployer.tasks.deployment.create',
+    'deployer.tasks.deployment._start_deployment',
+    'deployer.tasks.deployment._using_lock',
+    'deployer.tasks.deployment._release_lock',
+    'deployer.tasks.deployment._pre_create_undeploy',
+    'deployer.tasks.deployment._register_upstreams',
+    'deployer.tasks.deployment._deploy_all',
+    'deployer.tasks.deployment._fleet_start_and_wait',
+    'deployer.tasks.deployment._check_discover',
+    'deployer.tasks.deployment._check_deployment',
+    'deployer.tasks.deployment._check_node',
+    'deployer.tasks.deployment._deployment_check_passed',
+    'deployer.tasks.deployment._promote_deployment',
+    'deployer.tasks.deployment._promote_success',
+)
+NOTIFICATION_TASKS = (
+    'deployer.tasks.notification.notify',
+    'deployer.tasks.notification.notify_batch',
+    'deployer.tasks.notification.notify_hipchat',
+    'deployer.tasks.notification.notify_slack',
+    'deployer.tasks.notification.notify_github',
+    'deployer.tasks.notification.send_hipchat',
+    'deployer.tasks.notification.send_slack',
+    'deployer.tasks.notification.send_github',
+)
+TASK_ROUTES = dict(
+    [(task, {'routing_key': 'critical'}) for task in CRITICAL_TASKS] +
+    [(task, {'routing_key': 'notification'}) for task in NOTIFICATION_TASKS]
+)
+# Tasks marked as blocking (e.g. SSH using paramiko / fabric) are routed to
+# prefork pool ahead of other routes, so that they never block gevent hub.
+CELERY_ROUTES = ('deployer.tasks.routing.BlockingTaskRouter', TASK_ROUTES)
 
 # Backend Settings
 print('Mongo URL %s', MONGODB_URL)
@@ -84,6 +106,16 @@ CELERY_IGNORE_RESULT = False
 # Task Limits
 # Prevent celery from hogging a lot of resources on a host
 CELERY_DEFAULT_RATE_LIMIT = '50/m'
+# Per channel token bucket (per worker) for outgoing notifications. Coalesced
+# notifications are sent using send_<channel> tasks, others using
+# notify_<channel> tasks.
+CELERY_ANNOTATIONS = {
+    'deployer.tasks.notification.%s_%s' % (task, channel): {
+        'rate_limit': rate_limit
+    } for channel, rate_limit in
+    NOTIFICATION_SETTINGS['rate-limits'].items()
+    for task in ('notify', 'send')
+}
 CELERYD_TASK_SOFT_TIME_LIMIT = 3600 * 3
 CELERYD_TASK_TIME_LIMIT = 3600 * 4
 CELERY_SEND_TASK_SENT_EVENT = True
@@ -93,6 +125,9 @@ CELERY_RESULT_PERSISTENT = True
 # Remote Management
 CELERYD_POOL_RESTARTS = True
 
+# Autoscaling (used by workers started with --autoscale)
+CELERYD_AUTOSCALER = 'deployer.autoscale:QueueDepthAutoscaler'
+
 # Queue Settings
 CELERY_QUEUE_HA_POLICY = 'all'
 
@@ -114,6 +149,16 @@ CELERYBEAT_SCHEDULE = {
         'schedule': crontab(hour="*/2", minute=0),
         'args': (),
     },
+    'deployer.tasks.expire_events': {
+        'task': 'deployer.tasks.expire_events',
+        'schedule': crontab(minute=5),
+        'args': ()
+    },
+    'deployer.tasks.update_analytics': {
+        'task': 'deployer.tasks.update_analytics',
+        'schedule': crontab(minute='*/15'),
+        'args': ()
+    },
     'deployer.tasks.deployment.sync_promoted_units': {
         'task': 'deployer.tasks.deployment.sync_promoted_units',
         'schedule': crontab(minute='*/15'),
@@ -123,6 +168,11 @@ CELERYBEAT_SCHEDULE = {
         'task': 'deployer.tasks.deployment.sync_promoted_upstreams',
         'schedule': crontab(minute='*/15'),
         'args': ()
+    },
+    'deployer.tasks.deployment.reconcile_promoted_proxy': {
+        'task': 'deployer.tasks.deployment.reconcile_promoted_proxy',
+        'schedule': crontab(minute='*/10'),
+        'args': ()
     }
 }
 
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import deployer.logger
-from celery.signals import setup_logging
+import deployer.hubmonitor
+from celery.signals import setup_logging, worker_init
 
 
 __version__ = '0.5.2'
@@ -8,3 +9,4 @@ __author__ = 'sukrit'
 
 deployer.logger.init_logging()
 setup_logging.connect(deployer.logger.init_celery_logging)
+worker_init.connect(deployer.hubmonitor.start_monitor)
@@ -0,0 +1,176 @@
+"""
+Queue depth aware autoscaler for celery workers (See: CELERYD_AUTOSCALER)
+"""
+from __future__ import absolute_import
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from celery.five import monotonic
+from celery.signals import task_prerun, task_postrun
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+from conf.appconfig import AUTOSCALE_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest observed runtime in the moving average
+RUNTIME_EWMA_WEIGHT = 0.2
+
+
+class RuntimeStats(object):
+    """
+    Moving average of the task runtimes. The average is kept in shared memory
+    so that runtimes recorded in the pool (child) processes forked from the
+    worker process are visible to the autoscaler in the worker process.
+    """
+
+    def __init__(self):
+        # Negative value denotes that no runtime was recorded yet
+        self._runtime = multiprocessing.Value('d', -1.0)
+        self._started = {}
+
+    def record(self, runtime):
+        """
+        Records the runtime of a task
+
+        :param runtime: Runtime in seconds
+        :type runtime: float
+        :return: None
+        """
+        with self._runtime.get_lock():
+            current = self._runtime.value
+            self._runtime.value = runtime if current < 0 else \
+                RUNTIME_EWMA_WEIGHT * runtime + \
+                (1 - RUNTIME_EWMA_WEIGHT) * current
+
+    @property
+    def runtime(self):
+        runtime = self._runtime.value
+        return None if runtime < 0 else runtime
+
+    def task_started(self, task_id):
+        self._started[task_id] = monotonic()
+
+    def task_finished(self, task_id):
+        started = self._started.pop(task_id, None)
+        if started is not None:
+            self.record(monotonic() - started)
+
+
+runtime_stats = RuntimeStats()
+
+
+def _on_task_prerun(task_id=None, **kwargs):
+    runtime_stats.task_started(task_id)
+
+
+def _on_task_postrun(task_id=None, **kwargs):
+    runtime_stats.task_finished(task_id)
+
+
+class QueueDepthAutoscaler(Autoscaler):
+    """
+    Autoscaler that sizes the pool using the depth of the broker queues
+    consumed by the worker and the observed task runtimes, instead of only
+    the no. of reserved tasks (which is bounded by prefetch). The pool is
+    sized so that the backlog (shared with other consumers of the queue) is
+    drained within drain_seconds. Each worker (prefork / gevent) scales
+    independently as per its own queues and runtimes.
+
+    Queue depth is polled in a background (daemon) thread as qty gets
+    invoked from the worker event loop. Runtimes are recorded using the
+    task_prerun / task_postrun signals.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.poll_interval = kwargs.pop(
+            'poll_interval', AUTOSCALE_SETTINGS['poll-interval'])
+        self.drain_seconds = kwargs.pop(
+            'drain_seconds', AUTOSCALE_SETTINGS['drain-seconds'])
+        self.default_runtime = kwargs.pop(
+            'default_runtime', AUTOSCALE_SETTINGS['default-runtime'])
+        self.runtime_stats = kwargs.pop('runtime_stats', runtime_stats)
+        super(QueueDepthAutoscaler, self).__init__(*args, **kwargs)
+        self.backlog = 0
+        self._connection = None
+        self._poller_pid = None
+        self._poller_lock = threading.Lock()
+        task_prerun.connect(_on_task_prerun, weak=False)
+        task_postrun.connect(_on_task_postrun, weak=False)
+
+    @property
+    def runtime(self):
+        return self.runtime_stats.runtime
+
+    def _queues(self):
+        return list(self.worker.app.amqp.queues.consume_from.keys())
+
+    def _close_connection(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.release()
+            except Exception:
+                logger.debug('Failed to release connection', exc_info=True)
+
+    def poll_backlog(self):
+        """
+        Polls the depth of the consumed queues using the poller connection
+        (re-established on failure). Backlog of each queue is shared equally
+        among its consumers.
+
+        :return: None
+        """
+        backlog = 0
+        try:
+            if self._connection is None:
+                self._connection = self.worker.app.connection()
+            channel = self._connection.default_channel
+            for queue in self._queues():
+                _, messages, consumers = channel.queue_declare(
+                    queue=queue, passive=True)
+                backlog += float(messages) / max(consumers, 1)
+        except Exception:
+            logger.warning('Failed to get queue depth for autoscaling',
+                           exc_info=True)
+            self._close_connection()
+            return
+        self.backlog = backlog
+
+    def _run_poller(self):
+        while True:
+            self.poll_backlog()
+            time.sleep(self.poll_interval)
+
+    def start_poller(self):
+        """
+        Starts polling the queue depth in background (once per process)
+
+        :return: None
+        """
+        with self._poller_lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+        thread = threading.Thread(target=self._run_poller,
+                                  name='autoscale-poller')
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def qty(self):
+        self.start_poller()
+        runtime = self.runtime or self.default_runtime
+        return len(state.reserved_requests) + \
+            int(math.ceil(self.backlog * runtime / self.drain_seconds))
+
+    def info(self):
+        info = super(QueueDepthAutoscaler, self).info()
+        info.update({
+            'backlog': self.backlog,
+            'runtime': self.runtime
+        })
+        return info
@@ -0,0 +1,174 @@
+"""
+Detects the greenlets (tasks) blocking the gevent hub in workers running with
+gevent pool, e.g. blocking SSH calls that should be marked as blocking
+(See: deployer.tasks.routing).
+"""
+from __future__ import absolute_import
+from collections import deque
+import logging
+import sys
+import time
+import traceback
+import greenlet
+from celery.signals import task_prerun, task_postrun
+from conf.appconfig import HUB_MONITOR_SETTINGS
+from deployer.util import gevent_patched
+
+UNKNOWN_TASK = '<unknown>'
+
+logger = logging.getLogger(__name__)
+
+
+class HubMonitor(object):
+    """
+    Monitors the greenlet switches (using greenlet trace hook) from a native
+    thread. If the same greenlet (other than the hub) keeps running without
+    switching for more than threshold seconds, it is blocking the hub. The
+    task run by the greenlet, its stack and the blocked duration are
+    recorded. Reports are logged from a greenlet (as logging locks are not
+    safe to use from native thread when gevent is monkey patched).
+    """
+
+    def __init__(self, threshold=HUB_MONITOR_SETTINGS['threshold']):
+        """
+        :keyword threshold: Time in seconds after which greenlet running
+            without switching is considered to be blocking the hub
+        :type threshold: float
+        """
+        self.threshold = threshold
+        self.blocks = {}
+        self.reports = deque(maxlen=100)
+        self._tasks = {}
+        self._switches = 0
+        self._active = None
+        self._hub = None
+        self._thread_id = None
+        self._previous_trace = None
+        self._last_switches = 0
+        self._since = None
+        self._blocking = None
+
+    def _trace(self, event, args):
+        if event in ('switch', 'throw'):
+            self._switches += 1
+            self._active = args[1]
+        if self._previous_trace:
+            self._previous_trace(event, args)
+
+    def track_task(self, task_name):
+        self._tasks[greenlet.getcurrent()] = task_name
+
+    def untrack_task(self):
+        self._tasks.pop(greenlet.getcurrent(), None)
+
+    def _stack(self):
+        frame = sys._current_frames().get(self._thread_id)
+        return ''.join(traceback.format_stack(frame)) if frame else ''
+
+    def check(self, now):
+        """
+        Checks if the hub is blocked. Invoked periodically from the monitor
+        thread.
+
+        :param now: Current time (epoch seconds)
+        :type now: float
+        :return: Block (task, duration, stack) if hub is blocked else None
+        :rtype: dict
+        """
+        if self._since is None or self._switches != self._last_switches or \
+                self._active is self._hub:
+            if self._blocking:
+                self.reports.append(self._blocking)
+                self._blocking = None
+            self._last_switches, self._since = self._switches, now
+            return None
+
+        duration = now - self._since
+        if duration < self.threshold:
+            return None
+        if self._blocking is None:
+            task = self._tasks.get(self._active, UNKNOWN_TASK)
+            self._blocking = {
+                'task': task,
+                'duration': duration,
+                'stack': self._stack()
+            }
+            stats = self.blocks.setdefault(task, {
+                'count': 0,
+                'max-duration': 0
+            })
+            stats['count'] += 1
+        self._blocking['duration'] = duration
+        stats = self.blocks[self._blocking['task']]
+        stats['max-duration'] = max(stats['max-duration'], duration)
+        return self._blocking
+
+    def report(self):
+        """
+        Logs the recorded blocks
+
+        :return: None
+        """
+        while self.reports:
+            block = self.reports.popleft()
+            logger.warning(
+                'Task %s blocked gevent hub for %.2fs (Blocking tasks must '
+                'be marked using @app.task(blocking=True)):\n%s',
+                block['task'], block['duration'], block['stack'])
+
+    def _run(self):
+        from gevent.monkey import get_original
+        sleep = get_original('time', 'sleep')
+        while True:
+            sleep(self.threshold / 2.0)
+            self.check(time.time())
+
+    def _run_reporter(self):
+        import gevent
+        while True:
+            gevent.sleep(1)
+            try:
+                self.report()
+            except:
+                logger.exception('Failed to report hub blocks')
+
+    def start(self):
+        """
+        Starts monitoring the hub (for the current thread)
+
+        :return: None
+        """
+        import gevent
+        from gevent.monkey import get_original
+        self._hub = gevent.get_hub()
+        self._thread_id = get_original('thread', 'get_ident')()
+        self._previous_trace = greenlet.settrace(self._trace)
+        get_original('thread', 'start_new_thread')(self._run, ())
+        gevent.spawn(self._run_reporter)
+
+
+monitor = HubMonitor()
+
+
+def _on_task_prerun(task=None, **kwargs):
+    monitor.track_task(task.name if task else UNKNOWN_TASK)
+
+
+def _on_task_postrun(**kwargs):
+    monitor.untrack_task()
+
+
+def start_monitor(**kwargs):
+    """
+    Starts the hub monitor for worker running with gevent pool (handler for
+    worker_init signal)
+
+    :return: None
+    """
+    if not HUB_MONITOR_SETTINGS['enabled'] or not gevent_patched():
+        return
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
+    monitor.start()
+    logger.info('Started gevent hub monitor (threshold: %ss)',
+                monitor.threshold)
@@ -3,7 +3,8 @@ from flask import Flask
 from flask.ext.cors import CORS
 from conf.appconfig import CORS_SETTINGS, CORS_ENABLED
 import deployer
-from deployer.views import root, application, task, health, error, hypermedia
+from deployer.views import root, application, task, health, error, \
+    hypermedia, analytics
 
 app = Flask(__name__)
 
@@ -13,7 +14,7 @@ hypermedia.register_schema_api(app).register_error_handlers(app)
 if CORS_ENABLED:
     CORS(app, resources={'/*': CORS_SETTINGS})
 
-for module in [root, application, task, health, error]:
+for module in [root, application, task, health, analytics, error]:
     module.register(app)
 
 
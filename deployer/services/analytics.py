@@ -0,0 +1,165 @@
+"""
+Deploy latency analytics computed from the deployment events.
+"""
+import datetime
+import math
+from conf.appconfig import ANALYTICS_SETTINGS, CLUSTER_NAME
+from deployer.services.storage.base import EVENT_NEW_DEPLOYMENT, \
+    EVENT_ACQUIRED_LOCK, EVENT_UNITS_ADDED, EVENT_UNITS_STARTED, \
+    EVENT_NODES_DISCOVERED, EVENT_DEPLOYMENT_CHECK_PASSED, EVENT_PROMOTED
+from deployer.services.storage.factory import get_store
+from deployer.util import to_milliseconds
+
+__author__ = 'sukrit'
+
+# Events marking the end of each deployment stage (in pipeline order)
+STAGE_EVENTS = [EVENT_NEW_DEPLOYMENT, EVENT_ACQUIRED_LOCK, EVENT_UNITS_ADDED,
+                EVENT_UNITS_STARTED, EVENT_NODES_DISCOVERED,
+                EVENT_DEPLOYMENT_CHECK_PASSED, EVENT_PROMOTED]
+
+# Duration from new deployment till it gets promoted
+STAGE_TOTAL = 'TOTAL'
+
+
+def percentile(sorted_values, pct):
+    """
+    Computes percentile using nearest rank method
+
+    :param sorted_values: Sorted list of values
+    :type sorted_values: list
+    :param pct: Percentile (0-100)
+    :type pct: int
+    :return: Percentile value (None if values are empty)
+    """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def stage_durations(stage_dates):
+    """
+    Computes duration of each stage for a single deployment. Duration of a
+    stage is the time elapsed since the previous recorded stage.
+
+    :param stage_dates: Dictionary of stage event and date when it occurred
+    :type stage_dates: dict
+    :return: Dictionary of stage event and duration in seconds
+    :rtype: dict
+    """
+    durations = {}
+    previous = None
+    for stage in STAGE_EVENTS:
+        if stage not in stage_dates:
+            continue
+        if previous:
+            duration = (stage_dates[stage] -
+                        stage_dates[previous]).total_seconds()
+            if duration >= 0:
+                durations[stage] = duration
+        previous = stage
+
+    if EVENT_NEW_DEPLOYMENT in stage_dates and EVENT_PROMOTED in stage_dates:
+        durations[STAGE_TOTAL] = (
+            stage_dates[EVENT_PROMOTED] -
+            stage_dates[EVENT_NEW_DEPLOYMENT]).total_seconds()
+    return durations
+
+
+def summarize(durations, percentiles=ANALYTICS_SETTINGS['percentiles']):
+    """
+    Summarizes the stage durations using percentiles
+
+    :param durations: List of stage durations (dictionaries of stage and
+        duration)
+    :type durations: list
+    :param percentiles: Percentiles to be computed
+    :type percentiles: tuple
+    :return: Dictionary of stage and its summary (count, p50, p95 ...)
+    :rtype: dict
+    """
+    values = {}
+    for deployment_durations in durations:
+        for stage, duration in deployment_durations.items():
+            values.setdefault(stage, []).append(duration)
+
+    summary = {}
+    for stage, stage_values in values.items():
+        stage_values.sort()
+        summary[stage] = {
+            'count': len(stage_values),
+            'max': stage_values[-1]
+        }
+        for pct in percentiles:
+            summary[stage]['p{}'.format(pct)] = percentile(stage_values, pct)
+    return summary
+
+
+def compute_rollup(window, end=None, store=None):
+    """
+    Computes deploy latency rollup for the sliding window ending at given
+    time.
+
+    :param window: Window interval (e.g. 1h, 1d)
+    :type window: str
+    :keyword end: End of the window (naive UTC). Defaults to current time.
+    :type end: datetime.datetime
+    :keyword store: Store to be used. Defaults to default store.
+    :return: Rollup containing stage summary for cluster and each
+        application
+    :rtype: dict
+    """
+    store = store or get_store()
+    end = end or datetime.datetime.utcnow()
+    start = end - datetime.timedelta(milliseconds=to_milliseconds(window))
+
+    # Dates for the first occurrence of each stage grouped by deployment
+    deployments = {}
+    for event in store.filter_events(STAGE_EVENTS, start, end):
+        deployment = event.get('deployment') or {}
+        if not deployment.get('id'):
+            continue
+        entry = deployments.setdefault(deployment['id'], {
+            'name': deployment.get('name'),
+            'stages': {}
+        })
+        entry['stages'].setdefault(event['type'], event['date'])
+
+    app_durations = {}
+    for entry in deployments.values():
+        app_durations.setdefault(entry['name'], []).append(
+            stage_durations(entry['stages']))
+
+    return {
+        'window': window,
+        'cluster': CLUSTER_NAME,
+        'start': start,
+        'end': end,
+        'deployments': len(deployments),
+        'stages': summarize([
+            durations for app_values in app_durations.values()
+            for durations in app_values
+        ]),
+        'apps': [
+            {
+                'name': name,
+                'deployments': len(app_values),
+                'stages': summarize(app_values)
+            } for name, app_values in sorted(app_durations.items())
+        ]
+    }
+
+
+def update_rollups(windows=ANALYTICS_SETTINGS['windows'], store=None):
+    """
+    Computes and saves the deploy latency rollups for all windows
+
+    :keyword windows: Window intervals
+    :type windows: list
+    :keyword store: Store to be used. Defaults to default store.
+    :return: None
+    """
+    store = store or get_store()
+    end = datetime.datetime.utcnow()
+    for window in windows:
+        store.save_rollup(compute_rollup(window, end=end, store=store))
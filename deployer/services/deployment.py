@@ -76,7 +76,7 @@ def fetch_runtime_units(app_name, version=None, exclude_version=None):
                         exclude_version)
 
 
-def sync_upstreams(deployment_id, ignore_error=True):
+def sync_upstreams(deployment_id, ignore_error=True, uow=None):
     """
     Synchronizes runtime upstream information for given deployment
 
@@ -84,6 +84,8 @@ def sync_upstreams(deployment_id, ignore_error=True):
     :type deployment_id: str
     :keyword ignore_error: Ignore error during sync
     :type ignore_error: bool
+    :keyword uow: Optional unit of work used for updating the store
+    :type uow: deployer.services.storage.base.UnitOfWork
     :return: None
     """
     store = get_store()
@@ -94,7 +96,7 @@ def sync_upstreams(deployment_id, ignore_error=True):
     if deployment:
         try:
             upstreams = fetch_runtime_upstreams(deployment)
-            store.update_runtime_upstreams(deployment_id, upstreams)
+            (uow or store).update_runtime_upstreams(deployment_id, upstreams)
             output.update(upstreams=upstreams, state='success')
         except Exception as exception:
             logger.exception('Unknown error took place while trying to sync '
@@ -106,7 +108,7 @@ def sync_upstreams(deployment_id, ignore_error=True):
     return output
 
 
-def sync_units(deployment_id, ignore_error=True):
+def sync_units(deployment_id, ignore_error=True, uow=None):
     """
     Synchronizes runtime units information for given deployment
 
@@ -114,6 +116,8 @@ def sync_units(deployment_id, ignore_error=True):
     :type deployment_id: str
     :keyword ignore_error: Ignore error during sync
     :type ignore_error: bool
+    :keyword uow: Optional unit of work used for updating the store
+    :type uow: deployer.services.storage.base.UnitOfWork
     :return: None
     """
     store = get_store()
@@ -125,7 +129,7 @@ def sync_units(deployment_id, ignore_error=True):
         try:
             units = fetch_runtime_units(deployment['deployment']['name'],
                                         deployment['deployment']['version'])
-            store.update_runtime_units(deployment_id, units)
+            (uow or store).update_runtime_units(deployment_id, units)
             output.update(units=units, state='success')
         except Exception as exception:
             logger.exception('Unknown error took place while trying to sync '
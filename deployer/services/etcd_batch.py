@@ -0,0 +1,159 @@
+"""
+Batched etcd writes. Writes and deletes are recorded and applied as a single
+diff against the current etcd state so that only changed keys get written.
+"""
+from collections import OrderedDict
+
+__author__ = 'sukrit'
+
+
+class EtcdBatch(object):
+    """
+    Etcd client proxy that records writes and deletes instead of applying
+    them. On flush, the resulting key set is diffed against the current etcd
+    state and only the changed keys are written (or deleted). All other
+    operations (e.g. read) are delegated to the wrapped client and do not
+    see the recorded changes.
+    """
+
+    def __init__(self, etcd_cl):
+        """
+        :param etcd_cl: Etcd client used for reading current state and
+            applying the changes
+        :type etcd_cl: etcd.Client
+        """
+        self.etcd_cl = etcd_cl
+        self._desired = OrderedDict()
+        self._cleared = []
+
+    def __getattr__(self, item):
+        return getattr(self.etcd_cl, item)
+
+    def write(self, key, value, ttl=None, dir=False, **kwargs):
+        """
+        Records write for the given key.
+
+        :return: None
+        """
+        self._desired[key] = (value, ttl, dir, kwargs)
+
+    def delete(self, key, recursive=None, dir=None, **kwargs):
+        """
+        Records (recursive) delete for the given key. Keys written later
+        within the deleted key are retained.
+
+        :return: None
+        """
+        for desired_key in list(self._desired.keys()):
+            if self._within(desired_key, key):
+                del(self._desired[desired_key])
+        if not any(self._within(key, cleared) for cleared in self._cleared):
+            self._cleared = [cleared for cleared in self._cleared
+                             if not self._within(cleared, key)]
+            self._cleared.append(key)
+
+    def merge(self, etcd_batch):
+        """
+        Records the changes from another batch (in the order deletes, writes)
+
+        :param etcd_batch: Batch to be merged
+        :type etcd_batch: EtcdBatch
+        :return: None
+        """
+        for key in etcd_batch._cleared:
+            self.delete(key, recursive=True)
+        for key, (value, ttl, is_dir, kwargs) in etcd_batch._desired.items():
+            self.write(key, value, ttl=ttl, dir=is_dir, **kwargs)
+
+    @staticmethod
+    def _within(key, parent):
+        return key == parent or key.startswith(parent.rstrip('/') + '/')
+
+    @staticmethod
+    def _always_written(ttl, kwargs):
+        return ttl is not None or bool(kwargs)
+
+    def _delete_stale(self, root, current, desired):
+        """
+        Deletes the current keys (and directories) within the cleared root
+        that are neither desired nor ancestors of a desired key.
+
+        :return: No. of keys deleted
+        :rtype: int
+        """
+        deleted = []
+        for current_key in sorted(current):
+            if not self._within(current_key, root) or \
+                    any(self._within(current_key, deleted_key)
+                        for deleted_key in deleted) or \
+                    any(self._within(desired_key, current_key)
+                        for desired_key in desired):
+                continue
+            if current[current_key].dir:
+                self.etcd_cl.delete(current_key, recursive=True)
+            else:
+                self.etcd_cl.delete(current_key)
+            deleted.append(current_key)
+        return len(deleted)
+
+    def _read_current(self, key):
+        """
+        Reads the current etcd nodes (recursively) for given key
+
+        :return: Dictionary of key and etcd node
+        :rtype: dict
+        """
+        try:
+            result = self.etcd_cl.read(key, recursive=True)
+        except KeyError:
+            return {}
+        return {node.key: node for node in result.get_subtree()}
+
+    def flush(self, base=None):
+        """
+        Applies the recorded changes to etcd. Writes having ttl (or
+        conditions like prevExist) are always applied, so that ttl gets
+        refreshed (and their current state is not read).
+
+        :keyword base: Base key containing all the recorded changes. If
+            given, current state is read using single recursive read of the
+            base key (instead of reading each changed key).
+        :type base: str
+        :return: No. of keys written or deleted
+        :rtype: int
+        """
+        desired, self._desired = self._desired, OrderedDict()
+        cleared, self._cleared = self._cleared, []
+
+        if base:
+            current = self._read_current(base)
+        else:
+            current = {}
+            for key in cleared:
+                current.update(self._read_current(key))
+            for key, (_, ttl, _, kwargs) in desired.items():
+                if not self._always_written(ttl, kwargs) and \
+                        key not in current and \
+                        not any(self._within(key, root) for root in cleared):
+                    current.update(self._read_current(key))
+
+        changes = 0
+        for key in cleared:
+            if not any(self._within(desired_key, key)
+                       for desired_key in desired):
+                if any(self._within(current_key, key)
+                       for current_key in current):
+                    self.etcd_cl.delete(key, recursive=True)
+                    changes += 1
+                continue
+            changes += self._delete_stale(key, current, desired)
+
+        for key, (value, ttl, is_dir, kwargs) in desired.items():
+            node = current.get(key)
+            if node is not None and not self._always_written(ttl, kwargs) \
+                    and (is_dir or (not node.dir and
+                                    node.value == u'{}'.format(value))):
+                continue
+            self.etcd_cl.write(key, value, ttl=ttl, dir=is_dir, **kwargs)
+            changes += 1
+        return changes
@@ -1,13 +1,21 @@
-from functools import wraps
+from functools import wraps, partial
+import datetime
 import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
 import sys
+import threading
+import time
 from etcd import client
-from conf.appconfig import HEALTH_OK, HEALTH_FAILED, TOTEM_ETCD_SETTINGS
+import pytz
+from conf.appconfig import HEALTH_OK, HEALTH_FAILED, TOTEM_ETCD_SETTINGS, \
+    HEALTH_SETTINGS
 from deployer.services.storage.factory import get_store
 from deployer.tasks.common import ping
-from deployer.util import timeout
+from deployer.util import deadline, remaining_time
 
-HEALTH_TIMEOUT_SECONDS = 10
+HEALTH_TIMEOUT_SECONDS = HEALTH_SETTINGS['timeout']
 
 log = logging.getLogger(__name__)
 
@@ -44,7 +52,6 @@ def _check(func):
     return inner
 
 
-@timeout(HEALTH_TIMEOUT_SECONDS)
 @_check
 def _check_etcd():
     etcd_cl = client.Client(
@@ -55,7 +62,6 @@ def _check_etcd():
     }
 
 
-@timeout(HEALTH_TIMEOUT_SECONDS)
 @_check
 def _check_store():
     """
@@ -64,30 +70,194 @@ def _check_store():
     return get_store().health()
 
 
-@timeout(HEALTH_TIMEOUT_SECONDS)
 @_check
 def _check_celery():
     """
     Checks health for celery integration using ping-pong task output.
     """
-    output = ping.delay().get(timeout=HEALTH_TIMEOUT_SECONDS)
+    output = ping.delay().get(
+        timeout=remaining_time(HEALTH_TIMEOUT_SECONDS))
     return 'Celery ping:%s' % output
 
 
+CHECKS = {
+    'etcd': _check_etcd,
+    'store': _check_store,
+    'celery': _check_celery
+}
+
+
+def _run_check(check, check_timeout):
+    with deadline(check_timeout):
+        return check()
+
+
+def run_checks(checks, check_timeout=HEALTH_TIMEOUT_SECONDS):
+    """
+    Runs the health checks concurrently. Each check runs within deadline of
+    check_timeout (See: deployer.util.deadline). Checks that do not complete
+    within the timeout are reported as failed (and are left running in
+    background).
+
+    :param checks: Dictionary of check name and check function
+    :type checks: dict
+    :keyword check_timeout: Timeout in seconds for all the checks
+    :type check_timeout: float
+    :return: Dictionary of check name and health status
+    :rtype: dict
+    """
+    if not checks:
+        return {}
+    pool = ThreadPool(len(checks))
+    try:
+        async_results = {
+            name: pool.apply_async(partial(_run_check, check, check_timeout))
+            for name, check in checks.items()
+        }
+        expires_at = time.time() + check_timeout
+        health_status = {}
+        for name, async_result in async_results.items():
+            try:
+                health_status[name] = async_result.get(
+                    max(0, expires_at - time.time()))
+            except multiprocessing.TimeoutError:
+                health_status[name] = {
+                    'status': HEALTH_FAILED,
+                    'details': 'Health check timed out after %ss' %
+                               check_timeout
+                }
+        return health_status
+    finally:
+        pool.close()
+
+
+class HealthProber(object):
+    """
+    Probes the health checks periodically in a background (daemon) thread and
+    caches the last results so that health can be served from memory. Only
+    the checks that were requested at least once are probed. Results older
+    than stale_after seconds are marked stale.
+    """
+
+    def __init__(self, checks, interval=HEALTH_SETTINGS['probe-interval'],
+                 stale_after=HEALTH_SETTINGS['stale-after'],
+                 check_timeout=HEALTH_TIMEOUT_SECONDS, background=True):
+        """
+        :param checks: Dictionary of check name and check function
+        :type checks: dict
+        :keyword interval: Interval in seconds between background probes
+        :type interval: float
+        :keyword stale_after: Time in seconds after which results are stale
+        :type stale_after: float
+        :keyword check_timeout: Timeout in seconds for the checks
+        :type check_timeout: float
+        :keyword background: If False, checks are probed on demand (when
+            results are missing or stale) instead of in background.
+        :type background: bool
+        """
+        self.checks = checks
+        self.interval = interval
+        self.stale_after = stale_after
+        self.check_timeout = check_timeout
+        self.background = background
+        self._results = {}
+        self._requested = set()
+        self._lock = threading.Lock()
+        self._thread_pid = None
+
+    def probe(self, names=None):
+        """
+        Probes the given (or all requested) checks and caches the results
+
+        :keyword names: Names of the checks to be probed
+        :type names: list
+        :return: Dictionary of check name and health status
+        :rtype: dict
+        """
+        with self._lock:
+            names = list(self._requested if names is None else names)
+        results = run_checks({name: self.checks[name] for name in names},
+                             check_timeout=self.check_timeout)
+        probed_at = time.time()
+        checked_at = datetime.datetime.now(tz=pytz.UTC)
+        with self._lock:
+            for name, result in results.items():
+                self._results[name] = (probed_at, dict(result, **{
+                    'checked-at': checked_at
+                }))
+        return results
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.probe()
+            except:
+                log.exception('Failed to probe health')
+
+    def start(self):
+        """
+        Starts the background probing (once per process, so that it gets
+        restarted in forked processes)
+
+        :return: None
+        """
+        with self._lock:
+            if not self.background or self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='health-prober')
+        thread.daemon = True
+        thread.start()
+
+    def _is_stale(self, probed_at, now):
+        return now - probed_at > self.stale_after
+
+    def get(self, names):
+        """
+        Gets the cached health status for given checks. Checks that were
+        never probed are probed synchronously.
+
+        :param names: Names of the checks
+        :type names: list
+        :return: Dictionary of check name and health status
+        :rtype: dict
+        """
+        now = time.time()
+        with self._lock:
+            self._requested.update(names)
+            pending = [
+                name for name in names if name not in self._results or
+                (not self.background and
+                 self._is_stale(self._results[name][0], now))
+            ]
+        if pending:
+            self.probe(pending)
+        self.start()
+
+        now = time.time()
+        with self._lock:
+            results = {name: self._results[name] for name in names}
+        return {
+            name: dict(result, stale=self._is_stale(probed_at, now))
+            for name, (probed_at, result) in results.items()
+        }
+
+
+_prober = HealthProber(CHECKS)
+
+
 def get_health(check_celery=True):
     """
-    Gets the health of the all the external services.
+    Gets the health of the all the external services. Health is served from
+    the results cached by the background prober.
 
     :return: dictionary with
         key: service name like etcd, celery, elasticsearch
         value: dictionary of health status
     :rtype: dict
     """
-
-    health_status = {
-        'etcd': _check_etcd(),
-        'store': _check_store()
-    }
+    names = ['etcd', 'store']
     if check_celery:
-        health_status['celery'] = _check_celery()
-    return health_status
+        names.append('celery')
+    return _prober.get(names)
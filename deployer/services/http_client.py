@@ -0,0 +1,52 @@
+"""
+Pooled HTTP sessions (per endpoint) with default timeouts for outgoing
+requests.
+"""
+import os
+import threading
+from urlparse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from conf.appconfig import HTTP_SETTINGS
+
+__author__ = 'sukrit'
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url):
+    """
+    Gets the pooled session for the endpoint (scheme and host) of given url.
+    Sessions are created once per process.
+
+    :param url: Request url
+    :type url: str
+    :return: Pooled session
+    :rtype: requests.Session
+    """
+    parsed = urlparse(url)
+    key = (os.getpid(), parsed.scheme, parsed.netloc)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.mount('{0}://'.format(parsed.scheme), HTTPAdapter(
+                pool_connections=1, pool_maxsize=HTTP_SETTINGS['pool-size']))
+            _sessions[key] = session
+        return session
+
+
+def post(url, **kwargs):
+    """
+    Sends POST request using pooled session. Default (connect, read) timeouts
+    are applied if no timeout is given.
+
+    :param url: Request url
+    :type url: str
+    :return: Response
+    :rtype: requests.Response
+    """
+    kwargs.setdefault('timeout', (HTTP_SETTINGS['connect-timeout'],
+                                  HTTP_SETTINGS['read-timeout']))
+    return get_session(url).post(url, **kwargs)
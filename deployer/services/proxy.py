@@ -1,10 +1,13 @@
 import re
+import time
 import yoda
 from conf.appconfig import DEPLOYMENT_MODE_BLUEGREEN, TOTEM_ETCD_SETTINGS, \
     UPSTREAM_DEFAULTS
 from yoda.model import Location, Host, TcpListener
 from yoda.client import as_upstream
-from deployer.util import to_milliseconds
+from deployer.services.distributed_lock import get_etcd_client
+from deployer.services.etcd_batch import EtcdBatch
+from deployer.util import to_milliseconds, content_hash, LRUCache
 
 __author__ = 'sukrit'
 
@@ -13,20 +16,31 @@ Module that provides service methods for doing different operations releated
 to proxy
 """
 
+# Recorded proxy changes of deployments (keyed by deployment id) used for
+# reconciliation
+_desired_proxy_cache = LRUCache(max_size=1000)
 
-def get_proxy_client():
+
+def get_proxy_client(etcd_cl=None):
     """
     Creates yoda client instance.
+    :keyword etcd_cl: Etcd client to be used by yoda client. If None, yoda
+        creates a new client using TOTEM_ETCD_SETTINGS.
+    :type etcd_cl: etcd.Client
     :return: Yoda Client
     :rtype: yoda.client.Client
     """
+    if etcd_cl is not None:
+        return yoda.client.Client(
+            etcd_cl=etcd_cl,
+            etcd_base=TOTEM_ETCD_SETTINGS['yoda_base'])
     return yoda.client.Client(
         etcd_host=TOTEM_ETCD_SETTINGS['host'],
         etcd_port=TOTEM_ETCD_SETTINGS['port'],
         etcd_base=TOTEM_ETCD_SETTINGS['yoda_base'])
 
 
-def wire_host(host, app_name, use_version):
+def wire_host(host, app_name, use_version, yoda_cl=None):
     """
     Task for wiring up yoda proxy for a single host
 
@@ -49,10 +63,13 @@ def wire_host(host, app_name, use_version):
     :param use_version: Application Version. Required only for Blue Green
         deploys.  (e.g.: 12312)
     :type use_version: str
+    :keyword yoda_cl: Yoda client to be used. If None, a new client is
+        created.
+    :type yoda_cl: yoda.client.Client
     :return: None
     """
 
-    yoda_cl = get_proxy_client()
+    yoda_cl = yoda_cl or get_proxy_client()
     yoda_locations = [
         Location(
             as_upstream(app_name, location['port'], use_version),
@@ -68,7 +85,7 @@ def wire_host(host, app_name, use_version):
     yoda_cl.wire_proxy(yoda_host)
 
 
-def wire_listener(listener, app_name, use_version):
+def wire_listener(listener, app_name, use_version, yoda_cl=None):
     """
     Wires TCP listener for application.
 
@@ -84,9 +101,12 @@ def wire_listener(listener, app_name, use_version):
     :type app_name: str
     :param use_version: Use application version for creating upstream.
     :type use_version: str
+    :keyword yoda_cl: Yoda client to be used. If None, a new client is
+        created.
+    :type yoda_cl: yoda.client.Client
     :return: None
     """
-    yoda_cl = get_proxy_client()
+    yoda_cl = yoda_cl or get_proxy_client()
     yoda_listener = TcpListener(
         listener['name'], listener['bind'],
         upstream=as_upstream(app_name, listener['upstream-port'],
@@ -100,23 +120,111 @@ def wire_listener(listener, app_name, use_version):
 def wire_proxy(app_name, app_version, proxy,
                deployment_mode=DEPLOYMENT_MODE_BLUEGREEN):
     """
-    Wires proxy with yoda.
+    Wires proxy with yoda. Keys for all hosts and listeners are diffed
+    against the current etcd state and only the changed keys are written.
 
     :param deployment: Dictionary containing proxy settings.
     :type deployment: dict
     :return: None
     """
 
+    _record_proxy(app_name, app_version, proxy,
+                  deployment_mode=deployment_mode).flush()
+
+
+def _record_proxy(app_name, app_version, proxy,
+                  deployment_mode=DEPLOYMENT_MODE_BLUEGREEN):
+    """
+    Records the etcd changes for wiring the proxy (without applying them)
+
+    :return: Batch containing the recorded changes
+    :rtype: EtcdBatch
+    """
     use_version = app_version \
         if deployment_mode == DEPLOYMENT_MODE_BLUEGREEN else None
+    etcd_batch = EtcdBatch(get_etcd_client())
+    yoda_cl = get_proxy_client(etcd_cl=etcd_batch)
 
     for host in proxy.get('hosts', {}).values():
         if host.get('enabled', True):
-            wire_host(host, app_name, use_version)
+            wire_host(host, app_name, use_version, yoda_cl=yoda_cl)
 
     for listener in proxy.get('listeners', {}).values():
         if listener.get('enabled', True):
-            wire_listener(listener, app_name, use_version)
+            wire_listener(listener, app_name, use_version, yoda_cl=yoda_cl)
+    return etcd_batch
+
+
+def _desired_proxy(deployment):
+    """
+    Gets the recorded etcd changes for wiring the proxy of a deployment.
+    Recorded changes are cached (per process) till the proxy configuration of
+    the deployment changes.
+
+    :param deployment: Dictionary representing deployment
+    :type deployment: dict
+    :return: Batch containing the recorded changes
+    :rtype: EtcdBatch
+    """
+    name = deployment['deployment']['name']
+    version = deployment['deployment']['version']
+    proxy = deployment.get('proxy') or {}
+    proxy_hash = content_hash([name, version, proxy])
+    cached = _desired_proxy_cache.get(deployment['id'])
+    if cached and cached[0] == proxy_hash:
+        return cached[1]
+    etcd_batch = _record_proxy(name, version, proxy)
+    _desired_proxy_cache.put(deployment['id'], (proxy_hash, etcd_batch))
+    return etcd_batch
+
+
+def reconcile_proxy(deployments, get_skip_apps=None):
+    """
+    Reconciles the yoda proxy configuration with the desired configuration of
+    given deployments. Desired configuration is diffed against the yoda etcd
+    tree (read once) and only the drifted keys are repaired.
+
+    :param deployments: Deployments (e.g. all promoted deployments)
+    :type deployments: iterable
+    :keyword get_skip_apps: Optional function returning the names of the
+        applications that must not be reconciled (e.g. applications being
+        promoted). It is invoked before and again after computing the
+        desired configuration, so that applications that changed during the
+        pass are skipped as well.
+    :type get_skip_apps: function
+    :return: Dictionary with no. of deployments reconciled, no. of
+        deployments skipped, no. of keys repaired and duration of
+        reconciliation (in seconds)
+    :rtype: dict
+    """
+    start = time.time()
+    get_skip_apps = get_skip_apps or set
+    skip_apps = get_skip_apps()
+    desired = []
+    skipped = 0
+    for deployment in deployments:
+        name = deployment['deployment']['name']
+        if name in skip_apps:
+            skipped += 1
+            continue
+        desired.append((name, _desired_proxy(deployment)))
+
+    skip_apps = get_skip_apps()
+    etcd_batch = EtcdBatch(get_etcd_client())
+    count = 0
+    for name, desired_batch in desired:
+        if name in skip_apps:
+            skipped += 1
+            continue
+        etcd_batch.merge(desired_batch)
+        count += 1
+    repaired = etcd_batch.flush(base=TOTEM_ETCD_SETTINGS['yoda_base'])
+    return {
+        'deployments': count,
+        'skipped': skipped,
+        'repaired': repaired,
+        'duration': time.time() - start
+    }
 
 
 def register_upstreams(
@@ -134,7 +242,8 @@ def register_upstreams(
     :param next_task: Next task to be executed if Not None
     :return: Result of next task if passed else None.
     """
-    yoda_cl = get_proxy_client()
+    etcd_batch = EtcdBatch(get_etcd_client())
+    yoda_cl = get_proxy_client(etcd_cl=etcd_batch)
     use_version = app_version \
         if deployment_mode == DEPLOYMENT_MODE_BLUEGREEN else None
     for port, upstream in upstreams.iteritems():
@@ -147,6 +256,7 @@ def register_upstreams(
             ttl=to_milliseconds(
                 upstream.get('ttl', UPSTREAM_DEFAULTS['ttl'])) / 1000
         )
+    etcd_batch.flush()
 
 
 def get_discovered_nodes(app_name, app_version, check_port, deployment_mode,
@@ -1,15 +1,91 @@
 from functools import wraps
 import logging
+import threading
 from encryption.security import decrypt_obj
 from encryption.store.s3 import S3Provider
 from conf.appconfig import ENCRYPTION
+from deployer.util import LRUCache
 
 logger = logging.getLogger(__name__)
 
+_s3_stores = {}
+_s3_stores_lock = threading.Lock()
+
+
+def _zeroize(key, value):
+    """
+    Overwrites the evicted buffer so that key material does not linger in
+    memory.
+    """
+    if isinstance(value, bytearray):
+        value[:] = b'\0' * len(value)
+
+
+class CachedKeyStore(object):
+    """
+    Encryption store proxy that caches the keys loaded from the wrapped store
+    (using load) with expiry (ttl) and size limits. Cached keys are held in
+    buffers that are zeroized on eviction. All other attributes are
+    delegated to the wrapped store.
+
+    Zeroization only covers the cache buffers: load returns an immutable
+    copy of the key (decrypt_obj expects a str key), which lives until it is
+    garbage collected, as does the value returned by the wrapped store.
+    """
+
+    def __init__(self, store, ttl=ENCRYPTION['cache']['ttl'],
+                 max_size=ENCRYPTION['cache']['max-size']):
+        self.store = store
+        self._cache = LRUCache(max_size=max_size, ttl=ttl, on_evict=_zeroize)
+
+    def load(self, profile, name):
+        """
+        Loads the key (cached) from the wrapped store
+
+        :param profile: Security profile
+        :type profile: str
+        :param name: Name of the key
+        :type name: str
+        :return: Key (copy of the cached buffer, not zeroized on eviction)
+        :rtype: bytes
+        """
+        cache_key = (profile, name)
+        value = self._cache.get(cache_key)
+        if value is None:
+            value = self.store.load(profile, name)
+            if value is None:
+                return None
+            value = bytearray(value)
+            self._cache.put(cache_key, value)
+        return bytes(value)
+
+    def __getattr__(self, item):
+        return getattr(self.store, item)
+
+    def clear(self):
+        """
+        Removes (and zeroizes) all the cached keys
+        :return: None
+        """
+        self._cache.clear()
+
 
 def get_s3_store():
-    return S3Provider(ENCRYPTION['s3']['bucket'],
-                      keys_base=ENCRYPTION['s3']['base'])
+    """
+    Gets the S3 encryption store. Store is created once per process (for
+    given bucket and base) so that keys loaded from S3 can be cached.
+
+    :return: S3 encryption store
+    """
+    bucket, base = ENCRYPTION['s3']['bucket'], ENCRYPTION['s3']['base']
+    with _s3_stores_lock:
+        store = _s3_stores.get((bucket, base))
+        if store is None:
+            store = S3Provider(bucket, keys_base=base)
+            if ENCRYPTION['cache']['enabled']:
+                store = CachedKeyStore(store)
+            _s3_stores[(bucket, base)] = store
+        return store
 
 
 def using_encryption_store(fun):
@@ -29,5 +105,7 @@ def using_encryption_store(fun):
 
 @using_encryption_store
 def decrypt_config(config, profile='default', store=None, passphrase=None):
+    # Decrypted configs are not cached (unlike keys) as plaintext values are
+    # immutable strings that can not be zeroized on eviction.
     return decrypt_obj(config, profile=profile, store=store,
                        passphrase=passphrase)
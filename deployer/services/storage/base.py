@@ -1,6 +1,9 @@
+from contextlib import contextmanager
 import copy
 import datetime
+import threading
 import pytz
+from conf.appconfig import DEPLOYMENT_STATE_PROMOTED
 from deployer.util import dict_merge
 
 __author__ = 'sukrit'
@@ -24,6 +27,33 @@ EVENT_UPSTREAMS_REGISTERED = 'UPSTREAMS_REGISTERED'
 EVENT_PROMOTED = 'PROMOTED'
 EVENT_DEPLOYMENT_FAILED = 'DEPLOYMENT_FAILED'
 
+_read_context = threading.local()
+
+
+@contextmanager
+def api_reads():
+    """
+    Context for serving API reads. Read only operations within the context
+    may use relaxed read preference (e.g. mongo secondaries) that can return
+    stale data. Must not be used for operations that need to read their own
+    writes (e.g. task logic).
+    """
+    previous = is_api_read()
+    _read_context.api = True
+    try:
+        yield
+    finally:
+        _read_context.api = previous
+
+
+def is_api_read():
+    """
+    Checks if the current operation is serving API reads (See: api_reads)
+
+    :rtype: bool
+    """
+    return getattr(_read_context, 'api', False)
+
 
 class AbstractStore:
 
@@ -34,6 +64,19 @@ class AbstractStore:
                 'modified': datetime.datetime.now(tz=pytz.UTC)
             }, deployment)
 
+    @staticmethod
+    def _generate_expiry(state):
+        """
+        Generates the expiry timestamp for deployment in given state.
+        Promoted deployments never expire.
+        :param state: Deployment state
+        :type state: str
+        :rtype: datetime.datetime
+        """
+        if state == DEPLOYMENT_STATE_PROMOTED:
+            return datetime.datetime.max
+        return datetime.datetime.now(tz=pytz.UTC)
+
     def not_supported(self):
         """
         Raises NotImplementedError with a message
@@ -83,6 +126,17 @@ class AbstractStore:
         :type search_params: dict
         :return: None
         """
+        self._add_raw_event(
+            self._create_event(event_type, details=details,
+                               search_params=search_params))
+
+    @staticmethod
+    def _create_event(event_type, details=None, search_params=None):
+        """
+        Creates raw event for given event type
+        :return: Event
+        :rtype: dict
+        """
         event_upd = copy.deepcopy(search_params or {})
         event_upd.update({
             'type': event_type,
@@ -90,7 +144,37 @@ class AbstractStore:
             'date': datetime.datetime.utcnow(),
             'component': 'deployer'
         })
-        self._add_raw_event(event_upd)
+        return event_upd
+
+    def unit_of_work(self):
+        """
+        Creates unit of work for the store. Deployment updates and events
+        recorded using the unit of work are committed together (when used as
+        context manager, commit happens on successful exit).
+
+        Example:
+            with store.unit_of_work() as uow:
+                uow.update_state(deployment_id, DEPLOYMENT_STATE_PROMOTED)
+                uow.add_event(EVENT_PROMOTED)
+
+        :return: Unit of work
+        :rtype: UnitOfWork
+        """
+        return UnitOfWork(self)
+
+    def _commit(self, operations):
+        """
+        Commits the operations recorded using unit of work. By default,
+        operations are applied one at a time. Stores can override this to
+        apply operations in bulk.
+
+        :param operations: List of tuples consisting of store method name and
+            positional arguments (e.g. ('update_state', (id, state)))
+        :type operations: list
+        :return: None
+        """
+        for method, args in operations:
+            getattr(self, method)(*args)
 
     def update_state_bulk(self, name, new_state, existing_state=None,
                           version=None):
@@ -114,6 +198,7 @@ class AbstractStore:
     def update_runtime_upstreams(self, deployment_id, upstreams):
         """
         Updates the runtime upstreams information in the store
+        (write is skipped if the information is unchanged)
 
         :param deployment_id: Id of the deployment
         :type deployment_id: str
@@ -126,6 +211,7 @@ class AbstractStore:
     def update_runtime_units(self, deployment_id, units):
         """
         Updates the runtime units information in the store for given deployment
+        (write is skipped if the information is unchanged)
 
         :param deployment_id: Id of the deployment
         :type deployment_id: str
@@ -144,7 +230,7 @@ class AbstractStore:
         self.not_supported()
 
     def filter_deployments(self, name=None, version=None, only_running=True,
-                           only_ids=False, state=None):
+                           only_ids=False, state=None, lazy=False):
         """
         Filter deployments
         :keyword name: Optional Application name
@@ -160,11 +246,88 @@ class AbstractStore:
         :type only_ids: bool
         :keyword state: Filter based on deployment state
         :type state: str
+        :keyword lazy: If True, an iterable over deployments (e.g. cursor) is
+            returned instead of list, so that deployments can be streamed.
+        :type lazy: bool
         :return: List of deployments
         :rtype list
         """
         self.not_supported()
 
+    def get_change_stamp(self, name=None, version=None):
+        """
+        Gets the change stamp for deployments matching given name and version.
+        Change stamp changes whenever any matching deployment is created,
+        modified or removed and can be used for cache validation (e.g. ETag)
+
+        :keyword name: Optional Application name
+        :type name: str
+        :keyword version: Optional Application version
+        :type version: str
+        :return: Dictionary containing last modified timestamp ('modified')
+            and no. of matching deployments ('count')
+        :rtype: dict
+        """
+        self.not_supported()
+
+    def find_events(self, deployment_id, event_types=None, after=None,
+                    limit=100):
+        """
+        Finds the events for given deployment sorted by date (oldest first)
+
+        :param deployment_id: Id of the deployment
+        :type deployment_id: str
+        :keyword event_types: Optional list of event types to filter on
+        :type event_types: list
+        :keyword after: Optional tuple of (date, event id) for the last event
+            seen. Only events following this event are returned.
+        :type after: tuple
+        :keyword limit: Max. no. of events to be returned
+        :type limit: int
+        :return: List of events. Each event has an 'id' that can be used for
+            paging.
+        :rtype: list
+        :raises ValueError: if event id in after is invalid for the store
+        """
+        self.not_supported()
+
+    def filter_events(self, event_types, start, end):
+        """
+        Filters events of given types that occurred between start and end.
+
+        :param event_types: List of event types
+        :type event_types: list
+        :param start: Start date (inclusive, naive UTC)
+        :type start: datetime.datetime
+        :param end: End date (exclusive, naive UTC)
+        :type end: datetime.datetime
+        :return: Iterable over matching events (with type, date and
+            deployment) sorted by date
+        """
+        self.not_supported()
+
+    def save_rollup(self, rollup):
+        """
+        Saves the deploy latency rollup. Rollup replaces the existing rollup
+        for the same window.
+
+        :param rollup: Rollup (See: deployer.services.analytics)
+        :type rollup: dict
+        :return: None
+        """
+        self.not_supported()
+
+    def get_rollup(self, window):
+        """
+        Gets the deploy latency rollup for given window
+
+        :param window: Window interval (e.g. 1h, 1d)
+        :type window: str
+        :return: Rollup or None if not found
+        :rtype: dict
+        """
+        self.not_supported()
+
     def _add_raw_event(self, event):
         """
         Adds raw event to store.
@@ -174,6 +337,14 @@ class AbstractStore:
         """
         self.not_supported()
 
+    def expire_events(self):
+        """
+        Removes the expired events. Stores that expire events on their own
+        (e.g. using TTL) do not need to override this.
+        :return: None
+        """
+        pass
+
     def setup(self):
         """
         Setup the store prior to use.
@@ -184,3 +355,46 @@ class AbstractStore:
 
     def health(self):
         self.not_supported()
+
+
+class UnitOfWork:
+    """
+    Collects deployment updates and events to be committed together to the
+    store (See: AbstractStore.unit_of_work)
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.operations = []
+
+    def update_state(self, deployment_id, state):
+        self.operations.append(('update_state', (deployment_id, state)))
+
+    def update_runtime_upstreams(self, deployment_id, upstreams):
+        self.operations.append(
+            ('update_runtime_upstreams', (deployment_id, upstreams)))
+
+    def update_runtime_units(self, deployment_id, units):
+        self.operations.append(
+            ('update_runtime_units', (deployment_id, units)))
+
+    def add_event(self, event_type, details=None, search_params=None):
+        self.operations.append(('_add_raw_event', (
+            self.store._create_event(event_type, details=details,
+                                     search_params=search_params),)))
+
+    def commit(self):
+        """
+        Commits the recorded operations to the store
+        :return: None
+        """
+        operations, self.operations = self.operations, []
+        if operations:
+            self.store._commit(operations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
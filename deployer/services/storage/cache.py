@@ -0,0 +1,180 @@
+import copy
+import threading
+from conf.appconfig import STORE_CACHE_SETTINGS
+from deployer.services.storage.base import AbstractStore
+from deployer.util import LRUCache
+
+__author__ = 'sukrit'
+
+"""
+Read-through caching layer for the store.
+"""
+
+
+def cached(store, ttl=STORE_CACHE_SETTINGS['ttl'],
+           max_size=STORE_CACHE_SETTINGS['max-size']):
+    """
+    Wraps the store with the read-through caching layer
+
+    :param store: Store to be wrapped
+    :type store: AbstractStore
+    :keyword ttl: Time in seconds for which deployments are cached
+    :type ttl: float
+    :keyword max_size: Maximum no. of deployments to be cached
+    :type max_size: int
+    :return: Cached store
+    :rtype: CachedStore
+    """
+    return CachedStore(store, ttl=ttl, max_size=max_size)
+
+
+class CachedStore(AbstractStore):
+    """
+    Store decorator that caches deployments read using get_deployment.
+    Writes through this store invalidate the cached deployments. Each
+    deployment has a version stamp that is bumped on every write so that a
+    read racing with a write never caches a stale deployment. Version stamps
+    are drawn from a single increasing sequence and are tracked in a bounded
+    LRU cache. Deployments whose stamp got evicted get the highest evicted
+    stamp, so that the stamp observed by a racing read still changes.
+    """
+
+    def __init__(self, store, ttl=STORE_CACHE_SETTINGS['ttl'],
+                 max_size=STORE_CACHE_SETTINGS['max-size']):
+        self.store = store
+        self._cache = LRUCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        # Values are single element lists so that bumping the stamp does not
+        # replace (evict) the entry
+        self._versions = LRUCache(max_size=max_size,
+                                  on_evict=self._on_version_evict)
+        self._last_version = 0
+        self._evicted_version = 0
+        self._generation = 0
+
+    def _on_version_evict(self, deployment_id, version):
+        self._evicted_version = max(self._evicted_version, version[0])
+
+    def _stamp(self, deployment_id):
+        with self._lock:
+            version = self._versions.get(deployment_id)
+            return self._generation, \
+                version[0] if version else self._evicted_version
+
+    def _invalidate(self, deployment_id):
+        with self._lock:
+            self._last_version += 1
+            version = self._versions.get(deployment_id)
+            if version:
+                version[0] = self._last_version
+            else:
+                self._versions.put(deployment_id, [self._last_version])
+        self._cache.invalidate(deployment_id)
+
+    def _invalidate_all(self):
+        with self._lock:
+            self._generation += 1
+            self._versions.clear()
+        self._cache.clear()
+
+    def get_deployment(self, deployment_id):
+        stamp = self._stamp(deployment_id)
+        cached_entry = self._cache.get(deployment_id)
+        if cached_entry and cached_entry[0] == stamp:
+            return copy.deepcopy(cached_entry[1])
+
+        deployment = self.store.get_deployment(deployment_id)
+        if deployment is not None and self._stamp(deployment_id) == stamp:
+            self._cache.put(deployment_id,
+                            (stamp, copy.deepcopy(deployment)))
+        return deployment
+
+    def create_deployment(self, deployment):
+        self._invalidate(deployment['id'])
+        try:
+            return self.store.create_deployment(deployment)
+        finally:
+            self._invalidate(deployment['id'])
+
+    def update_state(self, deployment_id, state):
+        self._invalidate(deployment_id)
+        try:
+            return self.store.update_state(deployment_id, state)
+        finally:
+            self._invalidate(deployment_id)
+
+    def update_state_bulk(self, name, new_state, existing_state=None,
+                          version=None):
+        self._invalidate_all()
+        try:
+            return self.store.update_state_bulk(
+                name, new_state, existing_state=existing_state,
+                version=version)
+        finally:
+            self._invalidate_all()
+
+    def update_runtime_upstreams(self, deployment_id, upstreams):
+        self._invalidate(deployment_id)
+        try:
+            return self.store.update_runtime_upstreams(deployment_id,
+                                                       upstreams)
+        finally:
+            self._invalidate(deployment_id)
+
+    def update_runtime_units(self, deployment_id, units):
+        self._invalidate(deployment_id)
+        try:
+            return self.store.update_runtime_units(deployment_id, units)
+        finally:
+            self._invalidate(deployment_id)
+
+    def _commit(self, operations):
+        deployment_ids = set(
+            args[0] for method, args in operations
+            if method != '_add_raw_event')
+        for deployment_id in deployment_ids:
+            self._invalidate(deployment_id)
+        try:
+            return self.store._commit(operations)
+        finally:
+            for deployment_id in deployment_ids:
+                self._invalidate(deployment_id)
+
+    def add_event(self, event_type, details=None, search_params=None):
+        return self.store.add_event(event_type, details=details,
+                                    search_params=search_params)
+
+    def find_apps(self):
+        return self.store.find_apps()
+
+    def filter_deployments(self, *args, **kwargs):
+        return self.store.filter_deployments(*args, **kwargs)
+
+    def get_change_stamp(self, name=None, version=None):
+        return self.store.get_change_stamp(name=name, version=version)
+
+    def find_events(self, deployment_id, event_types=None, after=None,
+                    limit=100):
+        return self.store.find_events(deployment_id, event_types=event_types,
+                                      after=after, limit=limit)
+
+    def filter_events(self, event_types, start, end):
+        return self.store.filter_events(event_types, start, end)
+
+    def save_rollup(self, rollup):
+        return self.store.save_rollup(rollup)
+
+    def get_rollup(self, window):
+        return self.store.get_rollup(window)
+
+    def _add_raw_event(self, event):
+        return self.store._add_raw_event(event)
+
+    def expire_events(self):
+        return self.store.expire_events()
+
+    def setup(self):
+        return self.store.setup()
+
+    def health(self):
+        return self.store.health()
@@ -1,7 +1,8 @@
 import copy
 import importlib
 import os
-from conf.appconfig import DEFAULT_STORE_NAME
+from conf.appconfig import DEFAULT_STORE_NAME, STORE_CACHE_SETTINGS
+from deployer.services.storage.cache import cached
 
 
 class AbstractStorageFactory:
@@ -25,11 +26,20 @@ class AbstractStorageFactory:
 class DefaultStorageFactory(AbstractStorageFactory):
 
     _defaut_providers = {
-        'mongo': 'deployer.services.storage.mongo'
+        'mongo': 'deployer.services.storage.mongo',
+        'memory': 'deployer.services.storage.memory'
     }
 
-    def __init__(self, init_cache=None):
+    def __init__(self, init_cache=None, cache_settings=None):
+        """
+        :keyword init_cache: Initial stores keyed by name
+        :type init_cache: dict
+        :keyword cache_settings: Settings for read-through caching of
+            created stores (enabled, ttl, max-size)
+        :type cache_settings: dict
+        """
         self._cache = copy.deepcopy(init_cache or {})
+        self.cache_settings = cache_settings or STORE_CACHE_SETTINGS
 
     def register(self, name, store):
         store.setup()
@@ -47,6 +57,9 @@ class DefaultStorageFactory(AbstractStorageFactory):
                     'environment variable {env_var} to correct store '
                     'implementation'.format(name=name, env_var=env_var))
             store = importlib.import_module(module).create()
+            if self.cache_settings.get('enabled'):
+                store = cached(store, ttl=self.cache_settings['ttl'],
+                               max_size=self.cache_settings['max-size'])
             self.register(name, store)
             return store
 
@@ -0,0 +1,355 @@
+import copy
+import datetime
+import heapq
+import threading
+import pytz
+from conf.appconfig import DEPLOYMENT_EXPIRY_SECONDS, EVENT_EXPIRY_SECONDS, \
+    RUNNING_DEPLOYMENT_STATES, CLUSTER_NAME
+from deployer.services.storage.base import AbstractStore
+
+__author__ = 'sukrit'
+
+"""
+In memory implementation of the store. Useful for running the deployer (and
+its tests/benchmarks) on a single node without any external services.
+"""
+
+
+def create(deployment_expiry=DEPLOYMENT_EXPIRY_SECONDS,
+           event_expiry=EVENT_EXPIRY_SECONDS):
+    """
+    Creates Instance of MemoryStore
+    :keyword deployment_expiry: Seconds after which non promoted deployments
+        expire
+    :type deployment_expiry: int
+    :keyword event_expiry: Seconds after which events expire
+    :type event_expiry: int
+    :return: Instance of MemoryStore
+    :rtype: MemoryStore
+    """
+    return MemoryStore(deployment_expiry=deployment_expiry,
+                       event_expiry=event_expiry)
+
+
+def _as_utc(timestamp):
+    """
+    Converts timestamp to timezone aware timestamp (UTC is assumed for naive
+    timestamps)
+    :param timestamp: Timestamp
+    :type timestamp: datetime.datetime
+    :rtype: datetime.datetime
+    """
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=pytz.UTC)
+    return timestamp
+
+
+class MemoryStore(AbstractStore):
+    """
+    Thread safe in-memory implementation of store. Deployments are indexed by
+    id, application name and state. Expiry of deployments and events (TTL) is
+    emulated by lazily purging expired entries on access. Deployment expiry
+    timestamps are tracked in a heap (entries superseded by later updates are
+    skipped when popped) and events are kept in the order of addition, so
+    that only the expired entries are visited.
+    """
+
+    def __init__(self, deployment_expiry=DEPLOYMENT_EXPIRY_SECONDS,
+                 event_expiry=EVENT_EXPIRY_SECONDS):
+        self.deployment_expiry = datetime.timedelta(seconds=deployment_expiry)
+        self.event_expiry = datetime.timedelta(seconds=event_expiry)
+        self._lock = threading.RLock()
+        self._deployments = {}
+        self._by_name = {}
+        self._by_state = {}
+        self._expiry_heap = []
+        self._events = []
+        self._event_seq = 0
+        self._rollups = {}
+
+    @staticmethod
+    def _add_to_index(index, key, deployment_id):
+        index.setdefault(key, set()).add(deployment_id)
+
+    @staticmethod
+    def _remove_from_index(index, key, deployment_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(deployment_id)
+            if not ids:
+                del(index[key])
+
+    def _index(self, deployment):
+        self._add_to_index(self._by_name, self._name(deployment),
+                           deployment['id'])
+        self._add_to_index(self._by_state, deployment.get('state'),
+                           deployment['id'])
+
+    def _unindex(self, deployment):
+        self._remove_from_index(self._by_name, self._name(deployment),
+                                deployment['id'])
+        self._remove_from_index(self._by_state, deployment.get('state'),
+                                deployment['id'])
+
+    def _track_expiry(self, deployment):
+        """
+        Adds the expiry timestamp of the deployment to the expiry heap.
+        Deployments that never expire are not tracked. Must be called with
+        lock acquired.
+        :return: None
+        """
+        expiry = deployment.get('_expiry')
+        if expiry is not None and \
+                expiry.replace(tzinfo=None) != datetime.datetime.max:
+            heapq.heappush(self._expiry_heap,
+                           (_as_utc(expiry), deployment['id']))
+
+    @staticmethod
+    def _name(deployment):
+        return deployment.get('deployment', {}).get('name')
+
+    @staticmethod
+    def _version(deployment):
+        return deployment.get('deployment', {}).get('version')
+
+    def _is_expired(self, timestamp, expiry, now):
+        return timestamp is not None and \
+            now - _as_utc(timestamp) > expiry
+
+    def _purge_expired(self):
+        """
+        Removes the expired deployments and events (emulates mongo TTL
+        indexes). Must be called with lock acquired.
+        :return: None
+        """
+        now = datetime.datetime.now(tz=pytz.UTC)
+        while self._expiry_heap and self._is_expired(
+                self._expiry_heap[0][0], self.deployment_expiry, now):
+            expiry, deployment_id = heapq.heappop(self._expiry_heap)
+            deployment = self._deployments.get(deployment_id)
+            if deployment is None or deployment.get('_expiry') is None or \
+                    _as_utc(deployment['_expiry']) != expiry:
+                # Deployment was removed or its expiry was updated
+                continue
+            self._unindex(deployment)
+            del(self._deployments[deployment_id])
+
+        expired = 0
+        while expired < len(self._events) and self._is_expired(
+                self._events[expired].get('date'), self.event_expiry, now):
+            expired += 1
+        if expired:
+            del(self._events[:expired])
+
+    def _matching(self, name=None, version=None, only_running=True,
+                  state=None, exclude_names=None):
+        """
+        Finds deployments matching the given criteria using the name and
+        state indexes. Must be called with lock acquired.
+        :return: List of matching deployments (not copied)
+        :rtype: list
+        """
+        self._purge_expired()
+        candidates = None
+        if name:
+            candidates = set(self._by_name.get(name, ()))
+
+        if state:
+            states = [state]
+        elif only_running:
+            states = RUNNING_DEPLOYMENT_STATES
+        else:
+            states = None
+        if states is not None:
+            state_ids = set()
+            for each_state in states:
+                state_ids.update(self._by_state.get(each_state, ()))
+            candidates = state_ids if candidates is None else \
+                candidates & state_ids
+
+        if candidates is None:
+            candidates = self._deployments.keys()
+
+        excluded = set(exclude_names or []) if not name else set()
+        matching = []
+        for deployment_id in candidates:
+            deployment = self._deployments[deployment_id]
+            if deployment.get('cluster') != CLUSTER_NAME or \
+                    self._name(deployment) in excluded or \
+                    (version and self._version(deployment) != version):
+                continue
+            matching.append(deployment)
+        return matching
+
+    def _update(self, deployment_id, updates, runtime=None):
+        """
+        Applies updates to the deployment with given id. Must be called with
+        lock acquired.
+        :return: None
+        """
+        deployment = self._deployments.get(deployment_id)
+        if deployment is None:
+            return
+        self._unindex(deployment)
+        deployment.update(updates)
+        if runtime:
+            deployment.setdefault('runtime', {}).update(runtime)
+        self._index(deployment)
+        if '_expiry' in updates:
+            self._track_expiry(deployment)
+
+    def _state_updates(self, state):
+        now = datetime.datetime.now(tz=pytz.UTC)
+        return {
+            'state': state,
+            'modified': now,
+            'state-updated': now,
+            '_expiry': self._generate_expiry(state),
+            'runtime': {}  # Reset runtime info during state change
+        }
+
+    def create_deployment(self, deployment):
+        deployment_upd = self.apply_modified_ts(deployment)
+        deployment_upd['_expiry'] = datetime.datetime.now(tz=pytz.UTC)
+        deployment_upd['state-updated'] = datetime.datetime.now(tz=pytz.UTC)
+        with self._lock:
+            existing = self._deployments.get(deployment_upd['id'])
+            if existing is not None:
+                self._unindex(existing)
+            self._deployments[deployment_upd['id']] = deployment_upd
+            self._index(deployment_upd)
+            self._track_expiry(deployment_upd)
+
+    def get_deployment(self, deployment_id):
+        with self._lock:
+            self._purge_expired()
+            deployment = copy.deepcopy(self._deployments.get(deployment_id))
+        if deployment is not None:
+            deployment.pop('_expiry', None)
+        return deployment
+
+    def update_state(self, deployment_id, state):
+        with self._lock:
+            self._update(deployment_id, self._state_updates(state))
+
+    def update_state_bulk(self, name, new_state, existing_state=None,
+                          version=None):
+        with self._lock:
+            for deployment in self._matching(
+                    name=name, version=version, only_running=False,
+                    state=existing_state):
+                self._update(deployment['id'], self._state_updates(new_state))
+
+    def _update_runtime(self, deployment_id, field, value):
+        """
+        Updates the runtime field for the deployment, unless it is unchanged.
+        Must be called with lock acquired.
+        :return: None
+        """
+        runtime = self._deployments.get(deployment_id, {}).get('runtime', {})
+        if field in runtime and runtime[field] == value:
+            return
+        self._update(deployment_id, {
+            'modified': datetime.datetime.now(tz=pytz.UTC)
+        }, runtime={
+            field: copy.deepcopy(value)
+        })
+
+    def update_runtime_upstreams(self, deployment_id, upstreams):
+        with self._lock:
+            self._update_runtime(deployment_id, 'proxy-upstreams', upstreams)
+
+    def update_runtime_units(self, deployment_id, units):
+        with self._lock:
+            self._update_runtime(deployment_id, 'units', units)
+
+    def find_apps(self):
+        with self._lock:
+            return sorted({
+                self._name(deployment) for deployment in
+                self._matching(only_running=False)
+            })
+
+    def filter_deployments(self, name=None, version=None, only_running=True,
+                           only_ids=False, state=None, exclude_names=None,
+                           lazy=False):
+        with self._lock:
+            deployments = sorted(
+                self._matching(name=name, version=version,
+                               only_running=only_running, state=state,
+                               exclude_names=exclude_names),
+                key=lambda deployment: (self._version(deployment),
+                                        deployment['id']))
+            if only_ids:
+                deployments = [{'id': deployment['id']}
+                               for deployment in deployments]
+            else:
+                deployments = copy.deepcopy(deployments)
+        return iter(deployments) if lazy else deployments
+
+    def get_change_stamp(self, name=None, version=None):
+        with self._lock:
+            deployments = self._matching(name=name, version=version,
+                                         only_running=False)
+            modified = [deployment['modified'] for deployment in deployments
+                        if deployment.get('modified')]
+            return {
+                'modified': max(modified) if modified else None,
+                'count': len(deployments)
+            }
+
+    def _add_raw_event(self, event):
+        with self._lock:
+            self._event_seq += 1
+            event_upd = copy.deepcopy(event)
+            event_upd['id'] = '{:024d}'.format(self._event_seq)
+            self._events.append(event_upd)
+
+    def find_events(self, deployment_id, event_types=None, after=None,
+                    limit=100):
+        with self._lock:
+            self._purge_expired()
+            events = [
+                event for event in self._events
+                if event.get('deployment', {}).get('id') == deployment_id and
+                (not event_types or event.get('type') in event_types) and
+                (not after or (event['date'], event['id']) > after)
+            ]
+            events.sort(key=lambda event: (event['date'], event['id']))
+            return copy.deepcopy(events[:limit])
+
+    def filter_events(self, event_types, start, end):
+        with self._lock:
+            self._purge_expired()
+            events = [
+                event for event in self._events
+                if event.get('type') in event_types and
+                start <= event['date'] < end
+            ]
+            events.sort(key=lambda event: (event['date'], event['id']))
+            return copy.deepcopy(events)
+
+    def save_rollup(self, rollup):
+        with self._lock:
+            self._rollups[rollup['window']] = copy.deepcopy(rollup)
+
+    def get_rollup(self, window):
+        with self._lock:
+            return copy.deepcopy(self._rollups.get(window))
+
+    def _commit(self, operations):
+        # Apply all operations atomically
+        with self._lock:
+            AbstractStore._commit(self, operations)
+
+    def expire_events(self):
+        with self._lock:
+            self._purge_expired()
+
+    def health(self):
+        with self._lock:
+            return {
+                'type': 'memory',
+                'deployments': len(self._deployments),
+                'events': len(self._events)
+            }
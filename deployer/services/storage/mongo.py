@@ -1,19 +1,147 @@
+from collections import OrderedDict
 import datetime
-from pymongo import MongoClient
+import logging
+import os
+import re
+import threading
+from pymongo import MongoClient, ReadPreference
 import pymongo
 import pytz
+from bson import ObjectId
 from conf.appconfig import MONGODB_URL, MONGODB_DEPLOYMENT_COLLECTION, \
     MONGODB_DB, DEPLOYMENT_EXPIRY_SECONDS, MONGODB_EVENT_COLLECTION, \
     DEPLOYMENT_STATE_PROMOTED, RUNNING_DEPLOYMENT_STATES, CLUSTER_NAME, \
-    EVENT_EXPIRY_SECONDS
-from deployer.services.storage.base import AbstractStore
+    EVENT_EXPIRY_SECONDS, MONGODB_APP_COLLECTION, MONGODB_CLIENT_SETTINGS, \
+    MONGODB_READ_PREFERENCE, MONGODB_API_READ_PREFERENCE, \
+    EVENT_STORAGE_MODE, EVENT_CAPPED_SIZE, EVENT_STORAGE_MODE_BUCKETED, \
+    EVENT_STORAGE_MODE_CAPPED, EVENT_STORAGE_MODE_TTL, \
+    MONGODB_ROLLUP_COLLECTION
+from deployer.services.storage.base import AbstractStore, is_api_read
+from deployer.util import content_hash
 
 __author__ = 'sukrit'
 
+logger = logging.getLogger(__name__)
+
+# Field storing content hashes of runtime information (keyed by runtime field)
+RUNTIME_HASHES_FIELD = '_runtime-hashes'
+
+# Indexes for the deployment collection along with the queries they serve.
+DEPLOYMENT_INDEXES = {
+    # get_deployment, update_state, update_runtime_*
+    'identity_idx': {
+        'keys': [('id', pymongo.ASCENDING)],
+        'unique': True
+    },
+    # TTL for non running deployments
+    'expiry_idx': {
+        'keys': [('_expiry', pymongo.DESCENDING)],
+        'background': True,
+        'expireAfterSeconds': DEPLOYMENT_EXPIRY_SECONDS
+    },
+    # filter_deployments (by name, version and state sorted by version),
+    # update_state_bulk, _recompute_app
+    'app_state_idx': {
+        'keys': [('cluster', pymongo.ASCENDING),
+                 ('deployment.name', pymongo.ASCENDING),
+                 ('deployment.version', pymongo.ASCENDING),
+                 ('state', pymongo.ASCENDING)],
+        'background': True
+    },
+    # filter_deployments (by state across applications sorted by version)
+    'state_idx': {
+        'keys': [('cluster', pymongo.ASCENDING),
+                 ('state', pymongo.ASCENDING),
+                 ('deployment.version', pymongo.ASCENDING)],
+        'background': True
+    },
+    # filter_deployments for promoted deployments (sync jobs, recovery).
+    # Partial index only holds the promoted deployments.
+    'promoted_idx': {
+        'keys': [('cluster', pymongo.ASCENDING),
+                 ('deployment.version', pymongo.ASCENDING)],
+        'partialFilterExpression': {
+            'state': DEPLOYMENT_STATE_PROMOTED
+        },
+        'background': True
+    },
+    # get_change_stamp (cluster wide)
+    'modified_idx': {
+        'keys': [('cluster', pymongo.ASCENDING),
+                 ('modified', pymongo.DESCENDING)],
+        'background': True
+    },
+    # get_change_stamp (by application)
+    'app_modified_idx': {
+        'keys': [('cluster', pymongo.ASCENDING),
+                 ('deployment.name', pymongo.ASCENDING),
+                 ('modified', pymongo.DESCENDING)],
+        'background': True
+    }
+}
+
+# Indexes that no longer match any of the store queries.
+OBSOLETE_DEPLOYMENT_INDEXES = ('created_idx', 'app_idx')
+
+# Indexes for events collection (all storage modes)
+EVENT_INDEXES = {
+    # find_events (sorted by date and paged using date and event id)
+    'deployment_date_idx': {
+        'keys': [('deployment.id', pymongo.ASCENDING),
+                 ('date', pymongo.ASCENDING),
+                 ('_id', pymongo.ASCENDING)],
+        'background': True
+    },
+    # filter_events (deploy latency analytics)
+    'type_date_idx': {
+        'keys': [('type', pymongo.ASCENDING),
+                 ('date', pymongo.ASCENDING)],
+        'background': True
+    }
+}
+
+# Indexes for events collection when events are expired using TTL index
+EVENT_TTL_INDEXES = {
+    'expiry_idx': {
+        'keys': [('_expiry', pymongo.DESCENDING)],
+        'background': True,
+        'expireAfterSeconds': EVENT_EXPIRY_SECONDS
+    }
+}
+
+# Date format used as suffix for bucketed event collections
+EVENT_BUCKET_FORMAT = '%Y%m%d'
+
+ROLLUP_INDEXES = {
+    # get_rollup, save_rollup
+    'identity_idx': {
+        'keys': [('cluster', pymongo.ASCENDING),
+                 ('window', pymongo.ASCENDING)],
+        'unique': True
+    }
+}
+
+APP_INDEXES = {
+    # find_apps, _refresh_app, _recompute_app
+    'identity_idx': {
+        'keys': [('cluster', pymongo.ASCENDING),
+                 ('name', pymongo.ASCENDING)],
+        'unique': True
+    },
+    'expiry_idx': {
+        'keys': [('_expiry', pymongo.DESCENDING)],
+        'background': True,
+        'expireAfterSeconds': DEPLOYMENT_EXPIRY_SECONDS
+    }
+}
+
 
 def create(url=MONGODB_URL, dbname=MONGODB_DB,
            deployment_coll=MONGODB_DEPLOYMENT_COLLECTION,
-           event_coll=MONGODB_EVENT_COLLECTION
+           event_coll=MONGODB_EVENT_COLLECTION,
+           app_coll=MONGODB_APP_COLLECTION,
+           event_storage_mode=EVENT_STORAGE_MODE,
+           rollup_coll=MONGODB_ROLLUP_COLLECTION
            ):
     """
     Creates Instance of MongoStore
@@ -23,10 +151,61 @@ def create(url=MONGODB_URL, dbname=MONGODB_DB,
     :type dbname: str
     :keyword deployment_coll: MongoDB Deployment Collection name
     :type deployment_coll: str
+    :keyword app_coll: MongoDB Application Collection name
+    :type app_coll: str
+    :keyword event_storage_mode: Storage mode for events (ttl, bucketed or
+        capped)
+    :type event_storage_mode: str
+    :keyword rollup_coll: MongoDB Rollup Collection name
+    :type rollup_coll: str
     :return: Instance of MongoStore
     :rtype: MongoStore
     """
-    return MongoStore(url, dbname, deployment_coll, event_coll)
+    return MongoStore(url, dbname, deployment_coll, event_coll,
+                      app_coll=app_coll,
+                      event_storage_mode=event_storage_mode,
+                      rollup_coll=rollup_coll)
+
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST
+}
+
+
+class ClientManager:
+    """
+    Manages mongo clients per process. MongoClient is not fork safe, so a
+    new client is created (lazily) for each process that uses the store
+    (e.g. prefork celery workers, uwsgi workers).
+    """
+
+    def __init__(self, url, **settings):
+        self.url = url
+        self.settings = settings
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Gets the mongo client for current process
+        :return: Mongo client
+        :rtype: MongoClient
+        """
+        pid = os.getpid()
+        client = self._clients.get(pid)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(pid)
+                if client is None:
+                    client = MongoClient(self.url, tz_aware=True,
+                                         connect=False, **self.settings)
+                    # Discard clients inherited from the parent process.
+                    self._clients = {pid: client}
+        return client
 
 
 class MongoStore(AbstractStore):
@@ -34,51 +213,146 @@ class MongoStore(AbstractStore):
     Mongo based implementation of store.
     """
 
-    def __init__(self, url, dbname, deployment_coll, event_coll):
-        self.client = MongoClient(url, tz_aware=True)
+    def __init__(self, url, dbname, deployment_coll, event_coll,
+                 app_coll=MONGODB_APP_COLLECTION,
+                 client_settings=MONGODB_CLIENT_SETTINGS,
+                 read_preference=MONGODB_READ_PREFERENCE,
+                 api_read_preference=MONGODB_API_READ_PREFERENCE,
+                 event_storage_mode=EVENT_STORAGE_MODE,
+                 event_capped_size=EVENT_CAPPED_SIZE,
+                 rollup_coll=MONGODB_ROLLUP_COLLECTION):
+        self._client_manager = ClientManager(url, **client_settings)
         self.dbname = dbname
         self.deployment_coll = deployment_coll
         self.event_coll = event_coll
+        self.app_coll = app_coll
+        self.read_preference = READ_PREFERENCES[read_preference]
+        self.api_read_preference = READ_PREFERENCES[api_read_preference]
+        self.event_storage_mode = event_storage_mode
+        self.event_capped_size = event_capped_size
+        self.rollup_coll = rollup_coll
+        self._event_bucket_pattern = re.compile(
+            r'^{}-(\d{{8}})$'.format(re.escape(event_coll)))
+        self._ready_event_buckets = set()
+
+    @property
+    def client(self):
+        """
+        Gets the mongo client for current process
+        :rtype: MongoClient
+        """
+        return self._client_manager.get()
 
     def setup(self):
         """
-        Setup indexes for mongo store
+        Setup indexes for mongo store. Indexes are derived from the query
+        shapes used by the store (See: DEPLOYMENT_INDEXES, EVENT_INDEXES,
+        APP_INDEXES). Missing indexes are created and obsolete indexes that
+        no longer match any query are dropped.
         :return:
         """
-        idxs = self._deployments.index_information()
-        if 'created_idx' not in idxs:
-            self._deployments.create_index(
-                [('cluster', pymongo.ASCENDING),
-                 ('date', pymongo.DESCENDING)],
-                name='created_idx')
+        self._ensure_indexes(self._deployments, DEPLOYMENT_INDEXES,
+                             obsolete=OBSOLETE_DEPLOYMENT_INDEXES)
+        if self.event_storage_mode == EVENT_STORAGE_MODE_TTL:
+            self._ensure_indexes(self._events,
+                                 dict(EVENT_INDEXES, **EVENT_TTL_INDEXES))
+        elif self.event_storage_mode == EVENT_STORAGE_MODE_CAPPED:
+            self._ensure_capped_events()
+        # Indexes for bucketed events are created along with the bucket.
+        self._ensure_indexes(self._apps, APP_INDEXES)
+        self._ensure_indexes(self._rollups, ROLLUP_INDEXES)
 
-        if 'identity_idx' not in idxs:
-            self._deployments.create_index(
-                'id', name='identity_idx', unique=True)
+        if not self._apps.find_one({'cluster': CLUSTER_NAME}):
+            self._sync_apps()
 
-        if 'expiry_idx' not in idxs:
-            self._deployments.create_index(
-                [('_expiry', pymongo.DESCENDING)], name='expiry_idx',
-                background=True, expireAfterSeconds=DEPLOYMENT_EXPIRY_SECONDS)
+    def _supports_partial_indexes(self):
+        """
+        Checks if mongo server supports partial indexes (3.2+)
+        :rtype: bool
+        """
+        return self.client.server_info().get('versionArray', []) >= [3, 2]
 
-        if 'app_idx' not in idxs:
-            self._deployments.create_index([
-                ('cluster', pymongo.ASCENDING),
-                ('deployment.name', pymongo.ASCENDING),
-                ('deployment.version', pymongo.ASCENDING)
+    def _ensure_indexes(self, collection, indexes, obsolete=()):
+        """
+        Creates missing indexes and drops obsolete indexes for given
+        collection.
+
+        :param collection: Mongo collection
+        :type collection: pymongo.collection.Collection
+        :param indexes: Dictionary of index name and index specification
+            (keys and index options)
+        :type indexes: dict
+        :param obsolete: Names of indexes that needs to be dropped
+        :type obsolete: tuple
+        :return: None
+        """
+        existing = collection.index_information()
+        for name in obsolete:
+            if name in existing:
+                collection.drop_index(name)
 
-            ], name='app_idx')
+        for name, spec in indexes.items():
+            if name in existing:
+                continue
+            options = dict(spec)
+            keys = options.pop('keys')
+            if 'partialFilterExpression' in options and \
+                    not self._supports_partial_indexes():
+                # Partial index not supported. Fallback to regular index
+                del(options['partialFilterExpression'])
+            collection.create_index(keys, name=name, **options)
+
+    def _ensure_capped_events(self):
+        """
+        Creates the capped events collection. Existing (non capped) events
+        collection is never converted during setup, as conversion locks the
+        database and discards events beyond the cap. Until it gets migrated
+        (See: convert_events_to_capped), events expire using ttl index.
+        :return: None
+        """
+        if self.event_coll not in self._db.collection_names():
+            self._db.create_collection(self.event_coll, capped=True,
+                                       size=self.event_capped_size)
+        elif not self._events.options().get('capped'):
+            logger.warn('Events collection: %s is not capped. Using ttl '
+                        'expiry until it gets converted using '
+                        'convert_events_to_capped.', self.event_coll)
+            self._ensure_indexes(self._events,
+                                 dict(EVENT_INDEXES, **EVENT_TTL_INDEXES))
+            return
+        self._ensure_indexes(self._events, EVENT_INDEXES)
 
-        event_idxs = self._events.index_information()
-        if 'expiry_idx' not in event_idxs:
-            self._events.create_index(
-                [('_expiry', pymongo.DESCENDING)], name='expiry_idx',
-                background=True, expireAfterSeconds=EVENT_EXPIRY_SECONDS)
+    def convert_events_to_capped(self):
+        """
+        Migrates the existing events collection to capped collection (of
+        event_capped_size bytes) for capped storage mode. Conversion holds an
+        exclusive database lock for its duration and discards the events
+        beyond the cap, so it must be run explicitly during maintenance
+        (never as part of setup).
+        :return: None
+        """
+        self._db.command('convertToCapped', self.event_coll,
+                         size=self.event_capped_size)
+        self._ensure_indexes(self._events, EVENT_INDEXES,
+                             obsolete=tuple(EVENT_TTL_INDEXES))
 
     @property
     def _db(self):
         return self.client[self.dbname]
 
+    def _for_read(self, collection):
+        """
+        Gets the collection reference to be used for read only operations
+        (using configured read preference, or API read preference when
+        serving API reads)
+        :param collection: Collection reference
+        :type collection: pymongo.collection.Collection
+        :rtype: pymongo.collection.Collection
+        """
+        return collection.with_options(
+            read_preference=self.api_read_preference if is_api_read()
+            else self.read_preference)
+
     @property
     def _deployments(self):
         """
@@ -97,6 +371,284 @@ class MongoStore(AbstractStore):
         """
         return self._db[self.event_coll]
 
+    def _event_bucket(self, date):
+        """
+        Gets the bucketed events collection for given date. Indexes are
+        created when the bucket is used for the first time.
+        :param date: Event date
+        :type date: datetime.datetime
+        :return: Events collection reference
+        :rtype: pymongo.collection.Collection
+        """
+        name = '{}-{}'.format(self.event_coll,
+                              date.strftime(EVENT_BUCKET_FORMAT))
+        if name not in self._ready_event_buckets:
+            self._ensure_indexes(self._db[name], EVENT_INDEXES)
+            self._ready_event_buckets.add(name)
+        return self._db[name]
+
+    def _event_buckets(self):
+        """
+        Gets the existing event buckets sorted by bucket date
+        :return: List of tuple containing bucket date and collection name
+        :rtype: list
+        """
+        buckets = []
+        for name in self._db.collection_names(
+                include_system_collections=False):
+            match = self._event_bucket_pattern.match(name)
+            if match:
+                buckets.append((datetime.datetime.strptime(
+                    match.group(1), EVENT_BUCKET_FORMAT), name))
+        return sorted(buckets)
+
+    def _event_collections(self, newest_first=False, since=None):
+        """
+        Gets the collections holding the events.
+
+        :keyword newest_first: If True, buckets holding newer events are
+            returned first
+        :type newest_first: bool
+        :keyword since: If specified, buckets holding events older than
+            given date are skipped.
+        :type since: datetime.datetime
+        :return: List of event collections
+        :rtype: list
+        """
+        if self.event_storage_mode != EVENT_STORAGE_MODE_BUCKETED:
+            return [self._events]
+        since_day = datetime.datetime(since.year, since.month, since.day) \
+            if since else None
+        collections = [
+            self._db[name] for bucket_date, name in self._event_buckets()
+            if not since_day or bucket_date >= since_day
+        ]
+        if newest_first:
+            collections.reverse()
+        return collections
+
+    def _find_events(self, query, projection=None, newest_first=False,
+                     since=None, limit=0):
+        """
+        Finds the events matching given query across all event collections
+        (buckets). Events are returned sorted by date.
+
+        :param query: Mongo query for events
+        :type query: dict
+        :keyword projection: Optional projection for events
+        :type projection: dict
+        :keyword newest_first: If True, newest events are returned first.
+        :type newest_first: bool
+        :keyword since: If specified, only buckets that can hold events
+            newer than given date are queried. (The query itself must filter
+            on date)
+        :type since: datetime.datetime
+        :keyword limit: Max. no. of events to be returned (0 for no limit)
+        :type limit: int
+        :return: Generator for matching events
+        """
+        remaining = limit
+        sort_order = pymongo.DESCENDING if newest_first else pymongo.ASCENDING
+        for collection in self._event_collections(newest_first=newest_first,
+                                                  since=since):
+            cursor = self._for_read(collection) \
+                .find(query, projection=projection) \
+                .sort([('date', sort_order), ('_id', sort_order)])
+            if limit:
+                cursor = cursor.limit(remaining)
+            for event in cursor:
+                yield event
+                if limit:
+                    remaining -= 1
+                    if remaining <= 0:
+                        return
+
+    def find_events(self, deployment_id, event_types=None, after=None,
+                    limit=100):
+        query = {
+            'deployment.id': deployment_id
+        }
+        if event_types:
+            query['type'] = {
+                '$in': list(event_types)
+            }
+        since = None
+        if after:
+            since, after_id = after
+            if not ObjectId.is_valid(after_id):
+                raise ValueError('Invalid event id: {}'.format(after_id))
+            query['$or'] = [
+                {'date': {'$gt': since}},
+                {'date': since, '_id': {'$gt': ObjectId(after_id)}}
+            ]
+
+        events = []
+        for event in self._find_events(query, projection={'_expiry': False},
+                                       since=since, limit=limit):
+            event['id'] = str(event.pop('_id'))
+            events.append(event)
+        return events
+
+    def filter_events(self, event_types, start, end):
+        return self._find_events(
+            {
+                'type': {
+                    '$in': list(event_types)
+                },
+                'date': {
+                    '$gte': start,
+                    '$lt': end
+                }
+            },
+            projection={
+                '_id': False,
+                'type': True,
+                'date': True,
+                'deployment': True
+            },
+            since=start)
+
+    def save_rollup(self, rollup):
+        rollup_upd = dict(rollup, cluster=CLUSTER_NAME)
+        self._rollups.replace_one(
+            {
+                'cluster': CLUSTER_NAME,
+                'window': rollup['window']
+            },
+            rollup_upd,
+            upsert=True
+        )
+
+    def get_rollup(self, window):
+        return self._for_read(self._rollups).find_one(
+            {
+                'cluster': CLUSTER_NAME,
+                'window': window
+            },
+            projection={
+                '_id': False
+            }
+        )
+
+    def expire_events(self):
+        """
+        Drops the expired event buckets. For ttl and capped storage modes,
+        events are expired by mongo itself.
+        :return: None
+        """
+        if self.event_storage_mode != EVENT_STORAGE_MODE_BUCKETED:
+            return
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=EVENT_EXPIRY_SECONDS)
+        for bucket_date, name in self._event_buckets():
+            # Bucket holds events for the whole day
+            if bucket_date + datetime.timedelta(days=1) <= cutoff:
+                self._db.drop_collection(name)
+                self._ready_event_buckets.discard(name)
+
+    @property
+    def _rollups(self):
+        """
+        Gets the rollups collection reference
+        :return: Rollups collection reference
+        :rtype: pymongo.collection.Collection
+        """
+        return self._db[self.rollup_coll]
+
+    @property
+    def _apps(self):
+        """
+        Gets the applications collection reference. Applications collection
+        maintains the application names for the deployments, so that apps can
+        be listed without scanning all deployments.
+        :return: Applications collection reference
+        :rtype: pymongo.collection.Collection
+        """
+        return self._db[self.app_coll]
+
+    def _sync_apps(self):
+        """
+        Populates applications collection using existing deployments. Each
+        application expires along with its last expiring deployment.
+        :return: None
+        """
+        requests = [
+            pymongo.UpdateOne(
+                {'cluster': CLUSTER_NAME, 'name': app['_id']},
+                {'$set': {'_expiry': app['_expiry']}},
+                upsert=True
+            ) for app in self._deployments.aggregate([
+                {'$match': {'cluster': CLUSTER_NAME}},
+                {'$group': {'_id': '$deployment.name',
+                            '_expiry': {'$max': '$_expiry'}}}
+            ]) if app['_id']
+        ]
+        if requests:
+            self._apps.bulk_write(requests, ordered=False)
+
+    def _refresh_app(self, name, expiry):
+        """
+        Refreshes application entry for given name with the expiry of a
+        created (or updated) deployment, using single upsert. Expiry (and
+        modified time) only move forward, so that concurrent refreshes never
+        write an older expiry last (See: _recompute_app).
+        :param name: Application name
+        :type name: str
+        :param expiry: Expiry of the deployment
+        :type expiry: datetime.datetime
+        :return: None
+        """
+        if not name:
+            return
+        self._apps.update_one(
+            {
+                'cluster': CLUSTER_NAME,
+                'name': name
+            },
+            {
+                '$max': {
+                    '_expiry': expiry,
+                    'modified': datetime.datetime.now(tz=pytz.UTC)
+                }
+            }, upsert=True)
+
+    def _recompute_app(self, name):
+        """
+        Recomputes application entry for given name using the deployment that
+        expires last. Entry is removed if no deployment exists for given name.
+        Used when expiry can move backwards (e.g. promoted deployments getting
+        decommissioned), which _refresh_app never does.
+        :param name: Application name
+        :type name: str
+        :return: None
+        """
+        if not name:
+            return
+        app_filter = {
+            'cluster': CLUSTER_NAME,
+            'name': name
+        }
+        latest = self._deployments.find_one(
+            {
+                'cluster': CLUSTER_NAME,
+                'deployment.name': name
+            },
+            projection={
+                '_id': False,
+                '_expiry': True
+            },
+            sort=[('_expiry', pymongo.DESCENDING)]
+        )
+        if latest:
+            self._apps.update_one(app_filter, {
+                '$set': {
+                    '_expiry': latest.get('_expiry'),
+                    'modified': datetime.datetime.now(tz=pytz.UTC)
+                }
+            }, upsert=True)
+        else:
+            self._apps.delete_one(app_filter)
+
     def create_deployment(self, deployment):
         deployment_upd = self.apply_modified_ts(deployment)
         deployment_upd['_expiry'] = datetime.datetime.now(tz=pytz.UTC)
@@ -108,28 +660,84 @@ class MongoStore(AbstractStore):
             self.apply_modified_ts(deployment_upd),
             upsert=True
         )
+        self._refresh_app(deployment_upd.get('deployment', {}).get('name'),
+                          deployment_upd['_expiry'])
+
+    def _state_updates(self, state):
+        """
+        Creates the fields to be set for state change
+        :param state: New state
+        :type state: str
+        :rtype: dict
+        """
+        return {
+            'state': state,
+            'modified': datetime.datetime.now(tz=pytz.UTC),
+            'state-updated': datetime.datetime.now(tz=pytz.UTC),
+            '_expiry': self._generate_expiry(state),
+            'runtime': {},  # Reset runtime info during state change
+            RUNTIME_HASHES_FIELD: {}
+        }
 
     @staticmethod
-    def _generate_expiry(state):
-        if state == DEPLOYMENT_STATE_PROMOTED:
-            return datetime.datetime.max
-        return datetime.datetime.now(tz=pytz.UTC)
+    def _runtime_updates(field, value):
+        """
+        Creates the fields to be set for updating runtime information along
+        with the content hash of the runtime value
+        :param field: Runtime field (e.g. units)
+        :type field: str
+        :param value: Runtime value
+        :rtype: dict
+        """
+        return {
+            'runtime.{}'.format(field): value,
+            '{}.{}'.format(RUNTIME_HASHES_FIELD, field): content_hash(value),
+            'modified': datetime.datetime.now(tz=pytz.UTC)
+        }
+
+    @staticmethod
+    def _runtime_filter(deployment_id, fields):
+        """
+        Creates the query matching the deployment only if its runtime
+        information differs from the one being set (using content hashes), so
+        that unchanged runtime information is never re-written.
+        :param deployment_id: Id of the deployment
+        :type deployment_id: str
+        :param fields: Fields to be set (created using _runtime_updates)
+        :type fields: dict
+        :return: Mongo query
+        :rtype: dict
+        """
+        changed = [
+            {key: {'$ne': value}} for key, value in sorted(fields.items())
+            if key.startswith(RUNTIME_HASHES_FIELD + '.')
+        ]
+        u_filter = {
+            'id': deployment_id
+        }
+        if len(changed) == 1:
+            u_filter.update(changed[0])
+        else:
+            u_filter['$or'] = changed
+        return u_filter
 
     def update_state(self, deployment_id, state):
-        self._deployments.update_one(
+        updates = self._state_updates(state)
+        deployment = self._deployments.find_one_and_update(
             {
                 'id': deployment_id,
             },
             {
-                '$set': {
-                    'state': state,
-                    'modified': datetime.datetime.now(tz=pytz.UTC),
-                    'state-updated': datetime.datetime.now(tz=pytz.UTC),
-                    '_expiry': self._generate_expiry(state),
-                    'runtime': {}  # Reset runtime info during state change
-                }
+                '$set': updates
+            },
+            projection={
+                '_id': False,
+                'deployment.name': True
             }
         )
+        if deployment:
+            self._refresh_app(deployment.get('deployment', {}).get('name'),
+                              updates['_expiry'])
 
     def get_deployment(self, deployment_id):
         return self._deployments.find_one(
@@ -138,18 +746,23 @@ class MongoStore(AbstractStore):
             },
             projection={
                 '_id': False,
-                '_expiry': False
+                '_expiry': False,
+                RUNTIME_HASHES_FIELD: False
             }
         )
 
     def health(self):
+        # Query collections first, so that client gets connected (clients are
+        # created with connect=False) before node information is read.
+        collections = self.client.get_database(
+            self.dbname, read_preference=self.read_preference
+        ).collection_names(include_system_collections=False)
         return {
             'type': 'mongo',
             'nodes': list(self.client.nodes),
             'primary': self.client.primary,
             'secondaries': list(self.client.secondaries),
-            'collections': self._db.collection_names(
-                include_system_collections=False)
+            'collections': collections
         }
 
     def _add_raw_event(self, event):
@@ -158,42 +771,140 @@ class MongoStore(AbstractStore):
         :param event:
         :return:
         """
-        self._events.insert_one(event)
+        self._event_collection(event).insert_one(event)
 
-    def update_state_bulk(self, name, new_state, existing_state=None,
-                          version=None):
-        u_filter = {
-            'cluster': CLUSTER_NAME,
-            'deployment.name': name
-        }
-        if existing_state:
-            u_filter['state'] = existing_state
+    def _event_collection(self, event):
+        """
+        Gets the collection where the event needs to be stored (and applies
+        expiry for TTL and capped modes)
+        :param event: Event
+        :type event: dict
+        :rtype: pymongo.collection.Collection
+        """
+        if self.event_storage_mode == EVENT_STORAGE_MODE_BUCKETED:
+            return self._event_bucket(event['date'])
+        # Expiry is applied in capped mode too, so that events expire (using
+        # ttl index) until the events collection is converted to capped.
+        event['_expiry'] = event['date']
+        return self._events
 
-        if version:
-            u_filter['deployment.version'] = version
+    @staticmethod
+    def _merge_set(updates, fields):
+        """
+        Merges the fields to be set into existing updates ($set) for a
+        deployment so that they can be applied using single update.
+        :param updates: Existing fields to be set
+        :type updates: dict
+        :param fields: Fields to be merged
+        :type fields: dict
+        :return: None
+        """
+        for key, value in fields.items():
+            parent, _, child = key.partition('.')
+            if not child:
+                # Field replaces any previous updates to its sub-fields
+                for existing in list(updates.keys()):
+                    if existing.startswith(key + '.'):
+                        del(updates[existing])
+                updates[key] = value
+            elif isinstance(updates.get(parent), dict):
+                updates[parent][child] = value
+            else:
+                updates[key] = value
+
+    def _commit(self, operations):
+        """
+        Commits the operations recorded using unit of work using single
+        bulk_write per collection. Updates to the same deployment are merged
+        into a single update. Deployments having only runtime updates are
+        updated only if the runtime information has changed.
+        """
+        deployment_updates = OrderedDict()
+        state_changes = set()
+        runtime_only = set()
+        event_requests = OrderedDict()
+        for method, args in operations:
+            if method == '_add_raw_event':
+                event = args[0]
+                collection = self._event_collection(event)
+                _, requests = event_requests.setdefault(
+                    collection.name, (collection, []))
+                requests.append(pymongo.InsertOne(event))
+                continue
+
+            deployment_id = args[0]
+            if deployment_id not in deployment_updates:
+                runtime_only.add(deployment_id)
+            if method == 'update_state':
+                fields = self._state_updates(args[1])
+                state_changes.add(deployment_id)
+                runtime_only.discard(deployment_id)
+            elif method == 'update_runtime_upstreams':
+                fields = self._runtime_updates('proxy-upstreams', args[1])
+            elif method == 'update_runtime_units':
+                fields = self._runtime_updates('units', args[1])
+            else:
+                raise NotImplementedError(
+                    'Store: {} does not support operation {} in unit of work'
+                    .format(self.__class__, method))
+            self._merge_set(
+                deployment_updates.setdefault(deployment_id, {}), fields)
 
+        if deployment_updates:
+            requests = []
+            for update_id, update_fields in deployment_updates.items():
+                if update_id in runtime_only:
+                    u_filter = self._runtime_filter(update_id, update_fields)
+                else:
+                    u_filter = {'id': update_id}
+                requests.append(
+                    pymongo.UpdateOne(u_filter, {'$set': update_fields}))
+            self._deployments.bulk_write(requests, ordered=False)
+        for collection, requests in event_requests.values():
+            collection.bulk_write(requests)
+
+        if state_changes:
+            app_expiries = {}
+            for deployment in self._deployments.find(
+                    {'id': {'$in': list(state_changes)}},
+                    projection={'_id': False, 'id': True,
+                                'deployment.name': True}):
+                name = deployment.get('deployment', {}).get('name')
+                expiry = deployment_updates[deployment['id']]['_expiry']
+                # Expiry is either UTC or naive (datetime.max)
+                app_expiries[name] = max(
+                    app_expiries.get(name, expiry), expiry,
+                    key=lambda date: date.replace(tzinfo=None))
+            for name, expiry in app_expiries.items():
+                self._refresh_app(name, expiry)
+
+    def update_state_bulk(self, name, new_state, existing_state=None,
+                          version=None):
+        u_filter = self._deployment_filter(
+            name=name, version=version, only_running=False,
+            state=existing_state)
         self._deployments.update_many(u_filter, {
-            '$set': {
-                'state': new_state,
-                'modified': datetime.datetime.now(tz=pytz.UTC),
-                'state-updated': datetime.datetime.now(tz=pytz.UTC),
-                '_expiry': self._generate_expiry(new_state),
-                'runtime': {}  # Reset runtime info during state change
-            }
+            '$set': self._state_updates(new_state)
         })
+        self._recompute_app(name)
 
     def find_apps(self):
         return [
-            app['_id'] for app in
-            self._deployments.aggregate([
-                {'$match': {'cluster': CLUSTER_NAME}},
-                {'$group': {'_id': '$deployment.name'}},
-                {'$sort':  {'_id':  1}}
-            ]) or []
+            app['name'] for app in
+            self._for_read(self._apps).find(
+                {'cluster': CLUSTER_NAME},
+                projection={'_id': False, 'name': True}
+            ).sort('name', pymongo.ASCENDING)
         ]
 
-    def filter_deployments(self, name=None, version=None, only_running=True,
-                           only_ids=False, state=None, exclude_names=None):
+    @staticmethod
+    def _deployment_filter(name=None, version=None, only_running=True,
+                           state=None, exclude_names=None):
+        """
+        Creates the mongo query used for filtering deployments
+        :return: Mongo query
+        :rtype: dict
+        """
         u_filter = {
             'cluster': CLUSTER_NAME
         }
@@ -203,9 +914,6 @@ class MongoStore(AbstractStore):
             u_filter['deployment.name'] = {
                 '$nin': list(exclude_names)
             }
-        projection = {
-            '_id': False
-        }
         if version:
             u_filter['deployment.version'] = version
 
@@ -215,37 +923,61 @@ class MongoStore(AbstractStore):
             u_filter['state'] = {
                 '$in': RUNNING_DEPLOYMENT_STATES
             }
+        return u_filter
+
+    def filter_deployments(self, name=None, version=None, only_running=True,
+                           only_ids=False, state=None, exclude_names=None,
+                           lazy=False):
+        u_filter = self._deployment_filter(
+            name=name, version=version, only_running=only_running,
+            state=state, exclude_names=exclude_names)
+        projection = {
+            '_id': False
+        }
         if only_ids:
             projection['id'] = True
+        else:
+            projection[RUNTIME_HASHES_FIELD] = False
 
-        return [
-            deployment for deployment in
-            self._deployments.find(u_filter, projection=projection)
-                .sort('deployment.version')
-        ]
+        cursor = self._for_read(self._deployments) \
+            .find(u_filter, projection=projection) \
+            .sort('deployment.version')
+        if lazy:
+            return cursor
+        return [deployment for deployment in cursor]
+
+    def get_change_stamp(self, name=None, version=None):
+        u_filter = self._deployment_filter(
+            name=name, version=version, only_running=False)
+
+        deployments = self._for_read(self._deployments)
+        latest = deployments.find_one(
+            u_filter,
+            projection={
+                '_id': False,
+                'modified': True
+            },
+            sort=[('modified', pymongo.DESCENDING)]
+        ) or {}
+        return {
+            'modified': latest.get('modified'),
+            'count': deployments.count(u_filter)
+        }
 
     def update_runtime_upstreams(self, deployment_id, upstreams):
+        fields = self._runtime_updates('proxy-upstreams', upstreams)
         self._deployments.update_one(
+            self._runtime_filter(deployment_id, fields),
             {
-                'id': deployment_id,
-                },
-            {
-                '$set': {
-                    'runtime.proxy-upstreams': upstreams,
-                    'modified': datetime.datetime.now(tz=pytz.UTC)
-                }
+                '$set': fields
             }
         )
 
     def update_runtime_units(self, deployment_id, units):
+        fields = self._runtime_updates('units', units)
         self._deployments.update_one(
+            self._runtime_filter(deployment_id, fields),
             {
-                'id': deployment_id,
-                },
-            {
-                '$set': {
-                    'runtime.units': units,
-                    'modified': datetime.datetime.now(tz=pytz.UTC)
-                }
+                '$set': fields
             }
         )
@@ -3,10 +3,12 @@ This module defines client service methods for celery result (for client
 processing)
 
 """
+import gevent
 from celery.result import ResultBase, AsyncResult
 from conf.appconfig import TASK_SETTINGS
 from deployer import util
 from deployer.tasks.exceptions import TaskExecutionException
+from deployer.tasks.util import RESULT_RETRY_POLICY
 
 
 class TaskClient:
@@ -39,12 +41,15 @@ class TaskClient:
               timeout=TASK_SETTINGS['DEFAULT_GET_TIMEOUT']):
 
         @util.timeout(seconds=timeout)
-        @util.retry(10, delay=5, backoff=1, except_on=(IOError,))
         def get_result():
+            return RESULT_RETRY_POLICY.call(_get_result)
+
+        def _get_result():
             status = 'READY'
             output = self.celery_app.AsyncResult(id)
-            error_task = self.find_error_task(output, raise_error=False,
-                                              wait=wait, timeout=timeout)
+            error_task = self.find_error_task(
+                output, raise_error=False, wait=wait,
+                timeout=util.remaining_time(timeout))
 
             if error_task:
                 output, status = \
@@ -52,12 +57,13 @@ class TaskClient:
                 if not isinstance(output, (TaskExecutionException,)):
                     output = TaskExecutionException(output,
                                                     error_task.traceback)
-                    if raise_error:
-                        raise output
+                if raise_error:
+                    raise output
             else:
                 while isinstance(output, AsyncResult) and status is 'READY':
                     if wait:
-                        output.get(timeout=timeout, propagate=raise_error)
+                        output.get(timeout=util.remaining_time(timeout),
+                                   propagate=raise_error)
                     if output.ready():
                         output = output.result
                     else:
@@ -76,3 +82,44 @@ class TaskClient:
                 'output': output
             }
         return get_result()
+
+    def wait(self, id, raise_error=False,
+             timeout=TASK_SETTINGS['SYNC_CREATE_TIMEOUT'],
+             interval=TASK_SETTINGS['SYNC_WAIT_POLL_INTERVAL']):
+        """
+        Cooperatively waits for the task (and the tasks chained to it) to
+        finish. Instead of blocking on the result backend, the status is
+        polled and gevent yields between the polls so that waiting does not
+        hold an OS worker.
+
+        :param id: Task id
+        :type id: str
+        :keyword raise_error: If True, task failure is raised as
+            TaskExecutionException
+        :type raise_error: bool
+        :keyword timeout: Maximum time to wait (in seconds)
+        :type timeout: int
+        :keyword interval: Poll interval in seconds
+        :type interval: int
+        :return: Dictionary with status and output (as returned by ready). If
+            task did not finish within the timeout, status is 'PENDING'.
+        :rtype: dict
+        """
+        with util.deadline(timeout), gevent.Timeout(timeout, False):
+            while True:
+                # Each poll is bounded by the time remaining for the wait
+                remaining = util.remaining_time()
+                if remaining <= 0:
+                    break
+                try:
+                    result = self.ready(id, raise_error=raise_error,
+                                        timeout=remaining)
+                except util.TimeoutError:
+                    break
+                if result['status'] != 'PENDING':
+                    return result
+                gevent.sleep(min(interval, util.remaining_time()))
+        return {
+            'status': 'PENDING',
+            'output': None
+        }
@@ -1,6 +1,24 @@
 from deployer.celery import app
+from deployer.services import analytics
+from deployer.services.storage.factory import get_store
 
 
 @app.task
 def backend_cleanup():
     app.tasks['celery.backend_cleanup']()
+
+
+@app.task
+def expire_events():
+    """
+    Removes the expired events from the store.
+    """
+    get_store().expire_events()
+
+
+@app.task
+def update_analytics():
+    """
+    Updates the deploy latency rollups (See: deployer.services.analytics)
+    """
+    analytics.update_rollups()
@@ -1,23 +1,28 @@
 from conf.appconfig import TASK_SETTINGS
 from deployer.celery import app
-from deployer.tasks.util import simple_result, TaskNotReadyException
+from deployer.tasks.util import simple_result, TaskNotReadyException, \
+    RESULT_RETRY_POLICY
 
 
 @app.task(bind=True)
 def async_wait(self, result,
                default_retry_delay=TASK_SETTINGS['DEFAULT_RETRY_DELAY'],
                max_retries=TASK_SETTINGS['DEFAULT_RETRIES'],
-               ret_value=None):
+               ret_value=None, error_retries=0):
     """
     Performs asynchronous wait for result. It uses retry approach for result
     to be available rather calling get() . This way the trask do not directly
-    wait for wach other
+    wait for wach other. Transient errors while reading the result are also
+    retried (as per RESULT_RETRY_POLICY, using countdown) instead of blocking
+    the worker.
 
     :param result: Result to be evaluated.
     :param default_retry_delay: Delay between retries.
     :param max_retries: Maximum no. of retries to wait for result
     :param ret_value: If None, evaluated result is returned else ret_value is
         returned
+    :param error_retries: No. of retries already performed for transient
+        errors (counted separately from max_retries)
     :return: ret_value or evaluated result
     """
     try:
@@ -25,7 +30,12 @@ def async_wait(self, result,
     except TaskNotReadyException as exc:
         self.retry(exc=exc,
                    countdown=default_retry_delay,
-                   max_retries=max_retries)
+                   max_retries=max_retries + error_retries)
+    except RESULT_RETRY_POLICY.except_on as exc:
+        RESULT_RETRY_POLICY.retry_task(
+            self, exc, retries=error_retries,
+            kwargs=dict(self.request.kwargs or {},
+                        error_retries=error_retries + 1))
     return ret_value or result
 
 
@@ -43,11 +43,12 @@ from conf.appconfig import DEPLOYMENT_DEFAULTS, \
     DEPLOYMENT_STATE_FAILED, DEPLOYMENT_STATE_PROMOTED, \
     LEVEL_STARTED, LEVEL_FAILED, LEVEL_SUCCESS, CLUSTER_NAME, \
     DEPLOYMENT_STATE_DECOMMISSIONED, LOCK_JOB_BASE, DEPLOYMENT_TYPE_DEFAULT, \
-    DEFAULT_CHORD_OPTIONS, DEPLOYMENT_STATE_STARTED, FLEET_STARTED_STATES
+    DEFAULT_CHORD_OPTIONS, DEPLOYMENT_STATE_STARTED, FLEET_STARTED_STATES, \
+    RUNTIME_SYNC_CHUNK_SIZE
 
 from deployer.tasks.common import async_wait
 from deployer.services.proxy import wire_proxy, register_upstreams, \
-    get_discovered_nodes
+    get_discovered_nodes, reconcile_proxy
 
 from deployer.util import dict_merge, to_milliseconds
 
@@ -255,7 +256,7 @@ def delete(name, version=None):
     ).apply_async()
 
 
-@app.task
+@app.task(blocking=True)
 def list_units(name, version):
     """
     Lists fleet units for a given application and version
@@ -360,7 +361,29 @@ def _deploy_all(deployment, search_params, next_task=None):
     )()
 
 
-@app.task(bind=True)
+def _fleet_deployment(name, version, nodes, service_type, template,
+                      template_args):
+    """
+    Creates fleet deployment for the unit with given service type
+
+    :param name: Name of the application
+    :param version: Version of the application
+    :param nodes: No. of nodes/units to be created
+    :param service_type: Type of unit ('app', 'logger' etc)
+    :param template: Fleet Template settings.
+    :param template_args: Arguments for the fleet template
+    :return: Fleet deployment
+    :rtype: Deployment
+    """
+    is_timer = (service_type == 'timer')
+    return Deployment(
+        fleet_provider=get_fleet_provider(), jinja_env=jinja_env, name=name,
+        version=version, template=template['name'], nodes=nodes,
+        template_args=template_args, service_type=service_type,
+        timer=is_timer)
+
+
+@app.task(bind=True, blocking=True)
 def _fleet_deploy(self, search_params, name, version, nodes, service_type,
                   template, security_profile):
     """
@@ -378,12 +401,8 @@ def _fleet_deploy(self, search_params, name, version, nodes, service_type,
                 nodes, template)
     template_args = decrypt_config(template.get('args', {}),
                                    profile=security_profile)
-    is_timer = (service_type == 'timer')
-    fleet_deployment = Deployment(
-        fleet_provider=get_fleet_provider(), jinja_env=jinja_env, name=name,
-        version=version, template=template['name'], nodes=nodes,
-        template_args=template_args, service_type=service_type,
-        timer=is_timer)
+    fleet_deployment = _fleet_deployment(name, version, nodes, service_type,
+                                         template, template_args)
     try:
         fleet_deployment.deploy(start=False)
     except RETRYABLE_FLEET_EXCEPTIONS as exc:
@@ -399,7 +418,7 @@ def _fleet_deploy(self, search_params, name, version, nodes, service_type,
         })
 
 
-@app.task(bind=True)
+@app.task(bind=True, blocking=True)
 def _fleet_start(self, search_params, name, version, nodes, service_type,
                  template):
     """
@@ -414,12 +433,8 @@ def _fleet_start(self, search_params, name, version, nodes, service_type,
     """
     logger.info('Starting %s:%s:%s nodes:%d %r', name, version, service_type,
                 nodes, template)
-    is_timer = (service_type == 'timer')
-    fleet_deployment = Deployment(
-        fleet_provider=get_fleet_provider(), jinja_env=jinja_env, name=name,
-        version=version, template=template['name'], nodes=nodes,
-        template_args=template['args'], service_type=service_type,
-        timer=is_timer)
+    fleet_deployment = _fleet_deployment(name, version, nodes, service_type,
+                                         template, template['args'])
     try:
         fleet_deployment.start_units()
     except RETRYABLE_FLEET_EXCEPTIONS as exc:
@@ -504,7 +519,7 @@ def _pre_create_undeploy(deployment, search_params, next_task=None):
     return chain(undeploy_chain).delay()
 
 
-@app.task(bind=True)
+@app.task(bind=True, blocking=True)
 def _fleet_undeploy(self, name, version=None, exclude_version=None,
                     ret_value=None, ignore_error=False):
     """
@@ -532,7 +547,7 @@ def _fleet_undeploy(self, name, version=None, exclude_version=None,
     return ret_value
 
 
-@app.task(bind=True)
+@app.task(bind=True, blocking=True)
 def _fleet_stop(self, name, version=None, exclude_version=None,
                 ignore_error=False):
     """
@@ -555,7 +570,7 @@ def _fleet_stop(self, name, version=None, exclude_version=None,
             raise
 
 
-@app.task(bind=True, default_retry_delay=5, max_retries=5)
+@app.task(bind=True, default_retry_delay=5, max_retries=5, blocking=True)
 def _wait_for_undeploy(self, name, version=None, ret_value=None,
                        search_params=None, exclude_version=None):
     """
@@ -589,7 +604,7 @@ def _wait_for_undeploy(self, name, version=None, ret_value=None,
     return ret_value
 
 
-@app.task(bind=True, default_retry_delay=5, max_retries=5)
+@app.task(bind=True, default_retry_delay=5, max_retries=5, blocking=True)
 def _wait_for_stop(self, name, version=None, exclude_version=None,
                    timeout=None, check_retries=None, search_params=None):
     """
@@ -640,7 +655,8 @@ def _wait_for_stop(self, name, version=None, exclude_version=None,
 
 @app.task(bind=True,
           default_retry_delay=TASK_SETTINGS['CHECK_RUNNING_RETRY_DELAY'],
-          max_retries=TASK_SETTINGS['CHECK_RUNNING_RETRIES'])
+          max_retries=TASK_SETTINGS['CHECK_RUNNING_RETRIES'],
+          blocking=True)
 def _fleet_check_deploy(self, name, version, service_cnt, min_nodes,
                         search_params=None, next_task=None):
     expected_cnt = min_nodes * service_cnt
@@ -678,13 +694,13 @@ def _deployment_error_event(task_id, deployment, search_params):
         output.result, ctx=notify_ctx, level=LEVEL_FAILED,
         notifications=deployment['notifications'],
         security_profile=deployment['security']['profile']).delay()
-    store = get_store()
-    store.update_state(deployment['id'], DEPLOYMENT_STATE_FAILED)
-    store.add_event(
-        EVENT_DEPLOYMENT_FAILED,
-        details={'deployment-error': util.as_dict(output.result)},
-        search_params=search_params,
-    )
+    with get_store().unit_of_work() as uow:
+        uow.update_state(deployment['id'], DEPLOYMENT_STATE_FAILED)
+        uow.add_event(
+            EVENT_DEPLOYMENT_FAILED,
+            details={'deployment-error': util.as_dict(output.result)},
+            search_params=search_params,
+        )
 
 
 @app.task
@@ -693,8 +709,9 @@ def _promote_success(deployment, search_params=None):
     deployment_id = deployment['id']
     notify_ctx = create_notify_ctx(deployment, 'create')
 
-    store.add_event(EVENT_PROMOTED, search_params=search_params)
-    store.update_state(deployment_id, DEPLOYMENT_STATE_PROMOTED)
+    with store.unit_of_work() as uow:
+        uow.add_event(EVENT_PROMOTED, search_params=search_params)
+        uow.update_state(deployment_id, DEPLOYMENT_STATE_PROMOTED)
     notification.notify.si(
         {'message': 'Promoted'}, ctx=notify_ctx,
         level=LEVEL_SUCCESS,
@@ -830,6 +847,41 @@ def _get_job_lock(job_name, raise_error=False):
                 lock_error.name))
 
 
+def _sync_runtime(sync, deployments, chunk_size=RUNTIME_SYNC_CHUNK_SIZE):
+    """
+    Synchronizes runtime information for given deployments. Runtime updates
+    are written together for every chunk of deployments, so that a failed
+    write only fails the deployments within the chunk.
+
+    :param sync: Sync function for single deployment (sync_upstreams or
+        sync_units)
+    :type sync: function
+    :param deployments: Deployments to be synchronized
+    :type deployments: list
+    :keyword chunk_size: No. of deployments written together
+    :type chunk_size: int
+    :return: Sync output for each deployment
+    :rtype: list
+    """
+    store = get_store()
+    outputs = []
+    for start in range(0, len(deployments), chunk_size):
+        uow = store.unit_of_work()
+        chunk_outputs = [sync(deployment['id'], uow=uow)
+                         for deployment in deployments[start:start+chunk_size]]
+        try:
+            uow.commit()
+        except Exception as exception:
+            logger.exception('Failed to write runtime updates for '
+                             'deployments: %s', [
+                                 output['deployment_id']
+                                 for output in chunk_outputs])
+            for output in chunk_outputs:
+                output.update(error=str(exception), state='failed')
+        outputs += chunk_outputs
+    return outputs
+
+
 @app.task(bind=True)
 def sync_promoted_upstreams(self):
     """
@@ -842,14 +894,12 @@ def sync_promoted_upstreams(self):
     try:
         deployments = get_store().filter_deployments(
             state=DEPLOYMENT_STATE_PROMOTED)
-
-        return list(sync_upstreams(deployment['id'])
-                    for deployment in deployments)
+        return _sync_runtime(sync_upstreams, deployments)
     finally:
         _release_lock.si(lock).delay()
 
 
-@app.task(bind=True)
+@app.task(bind=True, blocking=True)
 def sync_promoted_units(self):
     """
     Synchronizes upstreams of all promoted deployments
@@ -861,9 +911,61 @@ def sync_promoted_units(self):
     try:
         deployments = get_store().filter_deployments(
             state=DEPLOYMENT_STATE_PROMOTED, only_ids=True)
+        return _sync_runtime(sync_units, deployments)
+    finally:
+        _release_lock.si(lock).delay()
+
+
+def _unsettled_apps(store):
+    """
+    Gets the names of applications whose proxy may not be wired to the
+    promoted deployment, i.e. applications having a deployment (other than
+    decommissioned) whose state changed after the promoted deployment got
+    promoted. This includes deployments in progress (proxy gets wired to the
+    new version before it gets promoted, See: _promote_deployment) and
+    deployments that failed (possibly after wiring the proxy and stopping
+    the promoted version).
+
+    :return: Set of application names
+    :rtype: set
+    """
+    promoted_at = {}
+    updated = []
+    for deployment in store.filter_deployments(only_running=False):
+        name = deployment['deployment']['name']
+        state_updated = deployment.get('state-updated')
+        if deployment.get('state') == DEPLOYMENT_STATE_PROMOTED:
+            promoted_at[name] = state_updated
+        elif deployment.get('state') != DEPLOYMENT_STATE_DECOMMISSIONED:
+            updated.append((name, state_updated))
+    return set(
+        name for name, state_updated in updated
+        if promoted_at.get(name) is None or state_updated is None or
+        state_updated > promoted_at[name]
+    )
 
-        return list(sync_units(deployment['id'])
-                    for deployment in deployments)
+
+@app.task(bind=True)
+def reconcile_promoted_proxy(self):
+    """
+    Repairs the drift in yoda proxy configuration for all promoted deployments
+    (skipping the unsettled applications, See: _unsettled_apps)
+    """
+    lock = _get_job_lock(self.name)
+    if not lock:
+        return
+
+    try:
+        store = get_store()
+        deployments = store.filter_deployments(
+            state=DEPLOYMENT_STATE_PROMOTED, lazy=True)
+        result = reconcile_proxy(
+            deployments, get_skip_apps=lambda: _unsettled_apps(store))
+        logger.info('Reconciled proxy for %d deployments in %.3fs '
+                    '(repaired %d keys, skipped %d unsettled deployments)',
+                    result['deployments'], result['duration'],
+                    result['repaired'], result['skipped'])
+        return result
     finally:
         _release_lock.si(lock).delay()
 
@@ -2,6 +2,7 @@
 Tasks for notification
 """
 import json
+import logging
 
 import time
 from future.builtins import (  # noqa
@@ -9,22 +10,27 @@ from future.builtins import (  # noqa
     ascii, chr, hex, input, next, oct, open,
     pow, round, filter, map, zip)
 
-import requests
+from celery.contrib.batches import Batches
 
 from conf.appconfig import LEVEL_FAILED, \
     LEVEL_FAILED_WARN, LEVEL_STARTED, LEVEL_SUCCESS, LEVEL_PENDING, \
-    NOTIFICATIONS_DEFAULTS, DEFAULT_HIPCHAT_TOKEN, DEFAULT_GITHUB_TOKEN
+    NOTIFICATIONS_DEFAULTS, DEFAULT_HIPCHAT_TOKEN, DEFAULT_GITHUB_TOKEN, \
+    NOTIFICATION_SETTINGS
 from deployer import templatefactory
 from deployer.celery import app
+from deployer.services import http_client
 from deployer.services.security import decrypt_config
 from deployer.tasks import util
 
+logger = logging.getLogger(__name__)
+
 
 @app.task
 def notify(obj, ctx=None, level=LEVEL_FAILED,
            notifications=None, security_profile='default'):
     """
-    Handles notification or job failure.
+    Handles notification or job failure. Notifications are coalesced per
+    channel (See: notify_batch) when enabled.
 
     :return: None
     """
@@ -36,85 +42,241 @@ def notify(obj, ctx=None, level=LEVEL_FAILED,
         notification.get('level', LEVEL_FAILED) and
         globals().get('notify_%s' % name)
     }
+    coalesce = NOTIFICATION_SETTINGS['coalesce'] and \
+        not app.conf.CELERY_ALWAYS_EAGER
     for name, notification in enabled_notifications.items():
-        globals().get('notify_%s' % name).si(
-            obj, ctx, level, notification, security_profile).delay()
+        if coalesce:
+            notify_batch.delay(name, obj, ctx, level, notification,
+                               security_profile)
+        else:
+            globals().get('notify_%s' % name).si(
+                obj, ctx, level, notification, security_profile).delay()
 
 
-@app.task
-def notify_hipchat(obj, ctx, level, config, security_profile):
-    config = decrypt_config(config, profile=security_profile)
+def _hipchat_endpoint(ctx, config):
     api_url = config.get('url') or 'https://api.hipchat.com'
     room_url = '{0}/v2/room/{1}/notification'.format(
         api_url, config.get('room'))
-    msg = templatefactory.render_template(
-        'hipchat.html', notification=util.as_dict(obj), ctx=ctx, level=level)
     headers = {
         'content-type': 'application/json',
         'Authorization': 'Bearer {0}'.format(
             config.get('token', '') or DEFAULT_HIPCHAT_TOKEN)
     }
+    return room_url, headers
+
+
+def _hipchat_request(obj, ctx, level, config):
+    room_url, headers = _hipchat_endpoint(ctx, config)
+    msg = templatefactory.render_template(
+        'hipchat.html', notification=util.as_dict(obj), ctx=ctx, level=level)
     data = {
         'message_format': 'html',
         'message': msg[:5000],
         'color': config.get('colors', {}).get(str(level), 'gray'),
         'notify': level <= LEVEL_FAILED_WARN
     }
-    requests.post(room_url, data=json.dumps(data),
-                  headers=headers).raise_for_status()
+    return room_url, headers, data
 
 
-@app.task
-def notify_slack(obj, ctx, level, config, security_profile):
-    config = decrypt_config(config, profile=security_profile)
+def _slack_endpoint(ctx, config):
     url = config.get('url')
+    if not url:
+        return None
+    headers = {
+        'content-type': 'application/json',
+    }
+    return url, headers
+
+
+def _slack_request(obj, ctx, level, config):
+    endpoint = _slack_endpoint(ctx, config)
+    if not endpoint:
+        return None
     notification = util.as_dict(obj)
     notification['channel'] = config.get('channel')
     notification['date'] = int(time.time())
     msg = templatefactory.render_template(
         'slack.json.jinja', notification=notification, ctx=ctx,
         level=level)
-    headers = {
-        'content-type': 'application/json',
-    }
-    if url:
-        requests.post(url, data=msg, headers=headers) \
-            .raise_for_status()
+    return endpoint + (msg,)
 
 
-@app.task
-def notify_github(obj, ctx, level, config, security_profile):
-    config = decrypt_config(config, profile=security_profile)
+def _github_endpoint(ctx, config):
     api_url = config.get('url') or 'https://api.github.com'
     git = ctx.get('deployment', {}).get('meta-info', {}).get('git', {})
     owner, repo, commit = git.get('owner'), git.get('repo'), git.get('commit')
     git_type = git.get('type', 'github')
     token = config.get('token') or DEFAULT_GITHUB_TOKEN
-    if owner and repo and commit and token and git_type == 'github':
-        desc = util.as_dict(obj).get('message', str(obj))
-        # Max 140 characters allowed for description
-        use_desc = desc[:137] + '...' if len(desc) > 140 else desc
-
-        status_url = '{0}/repos/{1}/{2}/statuses/{3}'.format(
-            api_url, owner, repo, commit)
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/vnd.github.v3+json',
-            'Authorization': 'token {0}'.format(token)
-        }
-        data = {
-            'state': {
-                LEVEL_FAILED: 'failure',
-                LEVEL_FAILED_WARN: 'failure',
-                LEVEL_SUCCESS: 'success',
-                LEVEL_STARTED: 'pending',
-                LEVEL_PENDING: 'pending'
-            }.get(level, 'pending'),
-            'description': use_desc,
-            'context': ctx.get('cluster', 'local') + '::Deployer'
-        }
-        requests.post(status_url, data=json.dumps(data),
-                      headers=headers).raise_for_status()
-    else:
+    if not (owner and repo and commit and token and git_type == 'github'):
         # Github notification not sent
-        pass
+        return None
+    status_url = '{0}/repos/{1}/{2}/statuses/{3}'.format(
+        api_url, owner, repo, commit)
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/vnd.github.v3+json',
+        'Authorization': 'token {0}'.format(token)
+    }
+    return status_url, headers
+
+
+def _github_request(obj, ctx, level, config):
+    endpoint = _github_endpoint(ctx, config)
+    if not endpoint:
+        return None
+    desc = util.as_dict(obj).get('message', str(obj))
+    # Max 140 characters allowed for description
+    use_desc = desc[:137] + '...' if len(desc) > 140 else desc
+    data = {
+        'state': {
+            LEVEL_FAILED: 'failure',
+            LEVEL_FAILED_WARN: 'failure',
+            LEVEL_SUCCESS: 'success',
+            LEVEL_STARTED: 'pending',
+            LEVEL_PENDING: 'pending'
+        }.get(level, 'pending'),
+        'description': use_desc,
+        'context': ctx.get('cluster', 'local') + '::Deployer'
+    }
+    return endpoint + (data,)
+
+
+def _post(url, headers, data):
+    if isinstance(data, dict):
+        data = json.dumps(data)
+    http_client.post(url, data=data, headers=headers).raise_for_status()
+
+
+@app.task
+def notify_hipchat(obj, ctx, level, config, security_profile):
+    config = decrypt_config(config, profile=security_profile)
+    _post(*_hipchat_request(obj, ctx, level, config))
+
+
+@app.task
+def notify_slack(obj, ctx, level, config, security_profile):
+    config = decrypt_config(config, profile=security_profile)
+    request = _slack_request(obj, ctx, level, config)
+    if request:
+        _post(*request)
+
+
+@app.task
+def notify_github(obj, ctx, level, config, security_profile):
+    config = decrypt_config(config, profile=security_profile)
+    request = _github_request(obj, ctx, level, config)
+    if request:
+        _post(*request)
+
+
+def _send(name, ctx, config, security_profile, data):
+    """
+    Sends the (coalesced) notification data to the channel endpoint. Config
+    is decrypted here so that secrets (tokens, webhook urls) are not passed
+    around in task messages.
+    """
+    config = decrypt_config(config, profile=security_profile)
+    endpoint = globals().get('_%s_endpoint' % name)(ctx, config)
+    if endpoint:
+        _post(endpoint[0], endpoint[1], data)
+
+
+@app.task
+def send_hipchat(ctx, config, security_profile, data):
+    """
+    Sends the (coalesced) hipchat notification. Rate limited as per channel
+    (See: CELERY_ANNOTATIONS).
+    """
+    _send('hipchat', ctx, config, security_profile, data)
+
+
+@app.task
+def send_slack(ctx, config, security_profile, data):
+    """
+    Sends the (coalesced) slack notification. Rate limited as per channel
+    (See: CELERY_ANNOTATIONS).
+    """
+    _send('slack', ctx, config, security_profile, data)
+
+
+@app.task
+def send_github(ctx, config, security_profile, data):
+    """
+    Sends the (coalesced) github status. Rate limited as per channel
+    (See: CELERY_ANNOTATIONS).
+    """
+    _send('github', ctx, config, security_profile, data)
+
+
+def _coalesce_hipchat(notifications):
+    """
+    Combines the hipchat messages for a room into single message (using
+    color of the most severe level).
+    """
+    levels = [level for level, _ in notifications]
+    _, data = notifications[levels.index(min(levels))]
+    return dict(data, **{
+        'message': '<br/>'.join(
+            data['message'] for _, data in notifications)[:5000],
+        'notify': any(data['notify'] for _, data in notifications)
+    })
+
+
+def _coalesce_slack(notifications):
+    """
+    Combines the slack messages for a channel into single message with
+    multiple attachments.
+    """
+    messages = [json.loads(msg) for _, msg in notifications]
+    return dict(messages[0], attachments=[
+        attachment for message in messages
+        for attachment in message.get('attachments', [])
+    ])
+
+
+def _coalesce_github(notifications):
+    """
+    Only the latest status for a commit is sent.
+    """
+    return notifications[-1][1]
+
+
+@app.task(base=Batches, flush_every=NOTIFICATION_SETTINGS['coalesce-size'],
+          flush_interval=NOTIFICATION_SETTINGS['coalesce-window'])
+def notify_batch(requests):
+    """
+    Sends the notifications buffered within the coalesce window. Each request
+    has args: (name, obj, ctx, level, config, security_profile).
+    Notifications for the same channel endpoint are coalesced into a single
+    notification, which is sent using rate limited send_<channel> task. Send
+    task gets the encrypted config (of the latest notification for the
+    endpoint) instead of the endpoint, as it may contain secrets.
+
+    :param requests: Buffered requests
+    :type requests: list
+    :return: None
+    """
+    channels = {}
+    for request in requests:
+        name, obj, ctx, level, config, security_profile = request.args
+        try:
+            decrypted = decrypt_config(config, profile=security_profile)
+            notification_request = globals().get('_%s_request' % name)(
+                obj, ctx, level, decrypted)
+        except Exception:
+            logger.exception('Failed to create %s notification', name)
+            continue
+        if not notification_request:
+            continue
+        url, headers, data = notification_request
+        key = (name, url, tuple(sorted(headers.items())))
+        channel = channels.setdefault(key, {'notifications': []})
+        channel['notifications'].append((level, data))
+        channel['sender'] = (ctx, config, security_profile)
+
+    for (name, _, _), channel in channels.items():
+        ctx, config, security_profile = channel['sender']
+        globals().get('send_%s' % name).si(
+            ctx, config, security_profile,
+            globals().get('_coalesce_%s' % name)(channel['notifications'])
+        ).delay()
@@ -0,0 +1,44 @@
+"""
+Routing of tasks to worker pools. Tasks are classified as blocking (marked
+using @app.task(blocking=True), e.g. SSH calls using paramiko / fabric that
+block gevent hub) or cooperative (default). Blocking tasks are routed to the
+prefork pool.
+"""
+from deployer.celery import app
+
+ROUTE_BLOCKING = {
+    'routing_key': 'prefork'
+}
+
+
+def is_blocking(task_name):
+    """
+    Checks if the task with given name is marked as blocking
+
+    :param task_name: Name of the task
+    :type task_name: str
+    :rtype: bool
+    """
+    return bool(getattr(app.tasks.get(task_name), 'blocking', False))
+
+
+def blocking_tasks():
+    """
+    Gets the names of all registered tasks marked as blocking
+
+    :return: Sorted list of task names
+    :rtype: list
+    """
+    return sorted(name for name in app.tasks.keys() if is_blocking(name))
+
+
+class BlockingTaskRouter(object):
+    """
+    Celery router (See: CELERY_ROUTES) that routes blocking tasks to the
+    prefork pool. Cooperative tasks are left to subsequent routes.
+    """
+
+    def route_for_task(self, task, args=None, kwargs=None):
+        if is_blocking(task):
+            return ROUTE_BLOCKING
+        return None
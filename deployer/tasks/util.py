@@ -3,10 +3,16 @@ from celery.exceptions import ChordError
 from celery.result import ResultBase, AsyncResult, GroupResult
 import deployer
 from deployer.tasks.exceptions import TaskExecutionException
-from deployer.util import retry
+from deployer.util import RetryPolicy
 
 __author__ = 'sukrit'
 
+# Retry policy for transient broker / result backend errors while reading
+# the task results
+RESULT_RETRY_POLICY = RetryPolicy(10, delay=1, backoff=2, max_delay=10,
+                                  jitter=0.5, budget=60,
+                                  except_on=(IOError, socket.error))
+
 
 def check_or_raise_task_exception(result):
     if isinstance(result, GroupResult):
@@ -28,8 +34,13 @@ def _check_error(result):
     _check_error(result.parent)
 
 
-@retry(10, delay=5, backoff=1, except_on=(IOError, socket.error))
 def simple_result(result):
+    """
+    Evaluates the (nested) task result. Transient errors while reading the
+    result are not retried here (See: RESULT_RETRY_POLICY).
+
+    :raise: TaskNotReadyException if result is not yet available
+    """
     # DO not remove line below
     # Explanation: https://github.com/celery/celery/issues/2315
     deployer.celery.app.set_current()
@@ -1,7 +1,44 @@
-from jinja2 import Environment, PackageLoader
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache
+from conf.appconfig import TEMPLATE_SETTINGS
 
-env = Environment(loader=PackageLoader('deployer', 'templates'))
+"""
+Templates used for notifications. All templates are compiled once at startup
+and are never reloaded.
+"""
+
+TEMPLATE_EXTENSIONS = ('html', 'jinja')
+
+
+def _bytecode_cache():
+    if TEMPLATE_SETTINGS['bytecode-cache']:
+        return FileSystemBytecodeCache(
+            directory=TEMPLATE_SETTINGS['bytecode-cache-dir'])
+    return None
+
+
+env = Environment(loader=PackageLoader('deployer', 'templates'),
+                  auto_reload=False, cache_size=-1,
+                  bytecode_cache=_bytecode_cache())
+
+
+def precompile_templates(jinja_env=env):
+    """
+    Compiles all the templates for given environment
+
+    :keyword jinja_env: Jinja environment
+    :type jinja_env: Environment
+    :return: Dictionary of template name and compiled template
+    :rtype: dict
+    """
+    return {
+        name: jinja_env.get_template(name) for name in
+        jinja_env.list_templates(extensions=TEMPLATE_EXTENSIONS)
+    }
+
+
+_templates = precompile_templates()
 
 
 def render_template(template, *args, **kwargs):
-    return env.get_template(template).render(*args, **kwargs)
+    compiled = _templates.get(template) or env.get_template(template)
+    return compiled.render(*args, **kwargs)
@@ -4,6 +4,9 @@ General utility methods
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 import errno
+import hashlib
+import json
+from contextlib import contextmanager
 from functools import wraps
 import os
 import re
@@ -12,9 +15,13 @@ from future.builtins import (  # noqa
     ascii, chr, hex, input, next, oct, open,
     pow, round, super,
     filter, map, zip)
+from future.utils import raise_
 
+from collections import OrderedDict
 import copy
-import signal
+import random
+import sys
+import threading
 import time
 import math
 
@@ -59,72 +66,270 @@ class TimeoutError(Exception):
     pass
 
 
+_deadlines = threading.local()
+
+
+def _deadline_stack():
+    stack = getattr(_deadlines, 'stack', None)
+    if stack is None:
+        stack = _deadlines.stack = []
+    return stack
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Context manager that applies deadline (time budget) for the enclosed
+    block. Deadlines can be nested and nested deadline never exceeds the
+    enclosing one. Deadline is tracked per thread (per greenlet when gevent
+    is monkey patched) and is not enforced by itself (See: timeout). Nested
+    calls use remaining_time to bound the blocking operations.
+
+    :param seconds: Time budget in seconds
+    :type seconds: float
+    :return: Time (epoch seconds) at which deadline expires
+    :rtype: float
+    """
+    stack = _deadline_stack()
+    expires_at = time.time() + seconds
+    if stack:
+        expires_at = min(expires_at, stack[-1])
+    stack.append(expires_at)
+    try:
+        yield expires_at
+    finally:
+        stack.pop()
+
+
+def remaining_time(default=None):
+    """
+    Gets the time remaining for the current deadline.
+
+    :keyword default: Time returned when no deadline is in effect. If
+        deadline is in effect, the smaller of default and remaining time is
+        returned.
+    :type default: float
+    :return: Remaining time in seconds (never negative)
+    :rtype: float
+    """
+    stack = _deadline_stack()
+    if not stack:
+        return default
+    remaining = max(0, stack[-1] - time.time())
+    return remaining if default is None else min(default, remaining)
+
+
+def gevent_patched():
+    """
+    Checks if gevent monkey patching is in effect (e.g. gevent celery pool)
+
+    :rtype: bool
+    """
+    try:
+        from gevent import monkey
+    except ImportError:  # pragma: no cover
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def _call_in_thread(func, args, kwargs, expires_at, error_message):
+    """
+    Executes the function in separate (daemon) thread that inherits the
+    deadline. Thread is abandoned if it does not complete before deadline.
+    """
+    outcome = {}
+
+    def target():
+        _deadline_stack().append(expires_at)
+        try:
+            outcome['result'] = func(*args, **kwargs)
+        except:
+            outcome['error'] = sys.exc_info()
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    thread.join(max(0, expires_at - time.time()))
+    if thread.is_alive():
+        raise TimeoutError(error_message)
+    if 'error' in outcome:
+        raise_(*outcome['error'])
+    return outcome['result']
+
+
 def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
     """
-    Decorator that applies timeout for a dunction
+    Decorator that applies timeout for a function. Function is executed
+    within deadline scope (See: deadline), so that nested calls can use the
+    remaining time. When gevent is monkey patched, timeout is enforced using
+    gevent.Timeout, otherwise function is executed in a separate thread that
+    is abandoned on timeout. Unlike signal based timeouts, it works in any
+    thread (or greenlet) and can be nested.
 
     :param seconds: Timeout in seconds. Defaults to 10s.
     :param error_message: Error message corresponding to timeout.
     :return: decorated function
     """
     def decorator(func):
-        def _handle_timeout(signum, frame):
-            raise TimeoutError(error_message)
 
         @wraps(func)
         def wrapper(*args, **kwargs):
-            try:
-                signal.signal(signal.SIGALRM, _handle_timeout)
-                signal_disabled = False
-            except ValueError:
-                # Possibly running in debug mode. Timeouts will be ignored
-                signal_disabled = True
-                pass
-
-            if not signal_disabled:
-                signal.alarm(seconds)
-            try:
-                result = func(*args, **kwargs)
-            finally:
-                if not signal_disabled:
-                    signal.alarm(0)
-            return result
+            with deadline(seconds) as expires_at:
+                budget = expires_at - time.time()
+                if budget <= 0:
+                    raise TimeoutError(error_message)
+                if gevent_patched():
+                    import gevent
+                    with gevent.Timeout(budget, TimeoutError(error_message)):
+                        return func(*args, **kwargs)
+                return _call_in_thread(func, args, kwargs, expires_at,
+                                       error_message)
 
         return wrapper
     return decorator
 
 
-def function_retry(tries, delay, backoff, except_on, fn, *args, **kwargs):
-    mtries, mdelay = tries, delay  # make mutable
+class RetryPolicy(object):
+    """
+    Retry policy with exponential backoff, max delay, jitter and total time
+    budget. Policy can be used to retry a function call (sleeping between the
+    attempts) or to retry a celery task using countdown (so that worker is
+    not held idle while waiting).
+    """
 
-    while True:
-        try:
-            return fn(*args, **kwargs)
-        except except_on:
-            pass
+    def __init__(self, tries, delay=3, backoff=2, max_delay=None, jitter=0,
+                 budget=None, except_on=(Exception, )):
+        """
+        :param tries: Max. no. of attempts (including the first one)
+        :type tries: int
+        :keyword delay: Delay in seconds before first retry
+        :type delay: float
+        :keyword backoff: Factor by which delay grows after each retry
+        :type backoff: float
+        :keyword max_delay: Max. delay in seconds between the retries
+        :type max_delay: float
+        :keyword jitter: Fraction (0 to 1) of delay that is randomized, so
+            that concurrent retries are spread out.
+        :type jitter: float
+        :keyword budget: Max. total time in seconds spent waiting between
+            the retries
+        :type budget: float
+        :keyword except_on: Exceptions for which call is retried
+        :type except_on: tuple
+        """
+        self.tries = int(math.floor(tries))
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.budget = budget
+        self.except_on = except_on
+
+    def delay_for(self, retries, jitter=True):
+        """
+        Gets the delay before the next retry
+
+        :param retries: No. of retries already performed
+        :type retries: int
+        :keyword jitter: If False, jitter is not applied
+        :type jitter: bool
+        :return: Delay in seconds
+        :rtype: float
+        """
+        delay = self.delay * (self.backoff ** retries)
+        if self.max_delay is not None:
+            delay = min(delay, self.max_delay)
+        if jitter and self.jitter:
+            delay *= 1 - self.jitter * random.random()
+        return delay
+
+    def max_retries(self):
+        """
+        Gets the max. no. of retries allowed by tries and budget
 
-        mtries -= 1         # consume an attempt
-        if mtries > 0:
-            time.sleep(mdelay)  # wait...
-            mdelay *= backoff   # make future wait longer
+        :rtype: int
+        """
+        retries, waited = 0, 0
+        while retries < self.tries - 1:
+            delay = self.delay_for(retries, jitter=False)
+            if self.budget is not None and waited + delay > self.budget:
+                break
+            waited += delay
+            retries += 1
+        return retries
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Invokes the function, retrying it (after sleeping) on failure. Last
+        exception is re-raised once tries, budget or current deadline (See:
+        deadline) are exhausted.
 
-    # Re-raise last exception
-    raise
+        :param fn: Function to be invoked
+        :return: Value returned by the function
+        """
+        retries, waited = 0, 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except self.except_on:
+                delay = self.delay_for(retries)
+                remaining = remaining_time()
+                if retries >= self.tries - 1 or \
+                        (self.budget is not None and
+                         waited + delay > self.budget) or \
+                        (remaining is not None and delay >= remaining):
+                    raise
+            time.sleep(delay)
+            waited += delay
+            retries += 1
+
+    def retry_task(self, task, exc, retries=None, **kwargs):
+        """
+        Retries the (bound) celery task using countdown as per the policy,
+        instead of sleeping in the worker.
+
+        :param task: Bound celery task
+        :param exc: Exception that caused the retry
+        :keyword retries: No. of retries already performed as per the policy,
+            if the task is also retried for other reasons (e.g. result not
+            ready). Defaults to the task retries.
+        :type retries: int
+        :keyword kwargs: Additional arguments for task.retry (e.g. kwargs)
+        :return: None
+        :raise: celery.exceptions.Retry (or exc when retries are exhausted)
+        """
+        if retries is None:
+            raise task.retry(exc=exc,
+                             countdown=self.delay_for(task.request.retries),
+                             max_retries=self.max_retries(), **kwargs)
+        if retries >= self.max_retries():
+            raise exc
+        # Retries are bounded by the policy (instead of task retries)
+        raise task.retry(exc=exc, countdown=self.delay_for(retries),
+                         max_retries=task.request.retries + 1, **kwargs)
+
+
+def function_retry(tries, delay, backoff, except_on, fn, *args, **kwargs):
+    return RetryPolicy(tries, delay=delay, backoff=backoff,
+                       except_on=except_on).call(fn, *args, **kwargs)
 
 
 # Retry decorator with backoff
-def retry(tries, delay=3, backoff=2, except_on=(Exception, )):
+def retry(tries, delay=3, backoff=2, except_on=(Exception, ), max_delay=None,
+          jitter=0, budget=None):
     """Retries a function or method until it returns True.
     delay sets the initial delay in seconds, and backoff sets the factor by
     which the delay should lengthen after each failure.
-    tries must be at least 0, and delay greater than 0."""
+    tries must be at least 0, and delay greater than 0.
+    See RetryPolicy for max_delay, jitter and budget."""
 
-    tries = math.floor(tries)
+    policy = RetryPolicy(tries, delay=delay, backoff=backoff,
+                         max_delay=max_delay, jitter=jitter, budget=budget,
+                         except_on=except_on)
 
     def decorator(f):
         def f_retry(*args, **kwargs):
-            return function_retry(
-                tries, delay, backoff, except_on, f, *args, **kwargs)
+            return policy.call(f, *args, **kwargs)
         return f_retry  # true decorator -> decorated function
     return decorator    # @retry(arg[, ...]) -> true decorator
 
@@ -183,3 +388,107 @@ class InvalidInterval(Exception):
 
     def __str__(self):
         return self.message
+
+
+class LRUCache(object):
+    """
+    Thread safe LRU cache with optional expiry (ttl) of entries.
+    """
+
+    def __init__(self, max_size=1000, ttl=None, on_evict=None):
+        """
+        :keyword max_size: Maximum no. of entries in the cache. Least recently
+            used entries are evicted once max size is reached.
+        :type max_size: int
+        :keyword ttl: Time in seconds after which entries expire. If None,
+            entries never expire.
+        :type ttl: float
+        :keyword on_evict: Optional callback invoked with (key, value) when
+            entry is evicted, expired or invalidated.
+        :type on_evict: function
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _evict(self, key):
+        value, _ = self._entries.pop(key)
+        if self.on_evict:
+            self.on_evict(key, value)
+
+    def get(self, key, default=None):
+        """
+        Gets the cached value for given key
+
+        :param key: Cache key
+        :keyword default: Value returned if key is not cached (or expired)
+        :return: Cached value
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, expires_at = self._entries.pop(key)
+            if expires_at is not None and expires_at <= time.time():
+                if self.on_evict:
+                    self.on_evict(key, value)
+                return default
+            # Re-insert to mark as most recently used
+            self._entries[key] = (value, expires_at)
+            return value
+
+    def put(self, key, value):
+        """
+        Caches value for given key
+
+        :param key: Cache key
+        :param value: Value to be cached
+        :return: None
+        """
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                existing, _ = self._entries.pop(key)
+                if self.on_evict and existing is not value:
+                    self.on_evict(key, existing)
+            self._entries[key] = (value, expires_at)
+            while len(self._entries) > self.max_size:
+                self._evict(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        """
+        Removes the cached value for given key (if any)
+
+        :param key: Cache key
+        :return: None
+        """
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+
+    def clear(self):
+        """
+        Removes all the cached values
+        :return: None
+        """
+        with self._lock:
+            for key in list(self._entries.keys()):
+                self._evict(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def content_hash(value):
+    """
+    Computes hash for the content of given value (json serializable structure)
+    that is independent of the ordering of dictionary keys.
+
+    :param value: Value to be hashed
+    :return: Hex digest for the content
+    :rtype: str
+    """
+    serialized = json.dumps(value, sort_keys=True, separators=(',', ':'),
+                            default=str)
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
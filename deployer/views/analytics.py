@@ -0,0 +1,57 @@
+import flask
+from flask import request
+from flask.views import MethodView
+from conf.appconfig import MIME_JSON, MIME_DEPLOY_LATENCY_V1, \
+    SCHEMA_DEPLOY_LATENCY_V1, ANALYTICS_SETTINGS
+from deployer.services.storage.factory import get_store
+from deployer.views import hypermedia
+from deployer.views.util import build_response, use_api_reads
+
+
+class DeployLatencyApi(MethodView):
+    """
+    API for deploy latency analytics
+    """
+
+    @hypermedia.produces({
+        MIME_JSON: SCHEMA_DEPLOY_LATENCY_V1,
+        MIME_DEPLOY_LATENCY_V1: SCHEMA_DEPLOY_LATENCY_V1
+    }, default=MIME_DEPLOY_LATENCY_V1)
+    @use_api_reads
+    def get(self, name=None, **kwargs):
+        """
+        Gets the per stage deploy latency percentiles for the cluster (or
+        given application) over a sliding window ('window' query parameter,
+        defaults to first configured window).
+
+        :keyword name: Optional application name
+        :type name: str
+        :return: Flask Response wrapping latency rollup
+        """
+        window = request.args.get('window', ANALYTICS_SETTINGS['windows'][0])
+        rollup = get_store().get_rollup(window)
+        if not rollup:
+            flask.abort(404)
+        if name:
+            apps = [app for app in rollup['apps'] if app['name'] == name]
+            if not apps:
+                flask.abort(404)
+            rollup = dict(rollup, **apps[0])
+            del(rollup['apps'])
+        return build_response(rollup)
+
+
+def register(app, **kwargs):
+    """
+    Registers DeployLatencyApi ('/analytics/deploy-latency' and
+    '/apps/<name>/analytics/deploy-latency')
+    Only GET operation is available.
+
+    :param app: Flask application
+    :return: None
+    """
+    latency_func = DeployLatencyApi.as_view('deploy-latency')
+    app.add_url_rule('/analytics/deploy-latency', view_func=latency_func,
+                     methods=['GET'])
+    app.add_url_rule('/apps/<name>/analytics/deploy-latency',
+                     view_func=latency_func, methods=['GET'])
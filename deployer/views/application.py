@@ -8,14 +8,24 @@ from conf.appconfig import MIME_JSON, MIME_TASK_V1, \
     SCHEMA_APP_LIST_V1, MIME_APP_LIST_V1, SCHEMA_APP_VERSION_LIST_V1, \
     MIME_APP_VERSION_LIST_V1, MIME_APP_VERSION_DELETE_V1, \
     SCHEMA_APP_VERSION_UNIT_LIST_V1, MIME_APP_VERSION_UNIT_LIST_V1, \
-    SCHEMA_RECOVERY_V1, MIME_RECOVERY_V1
+    SCHEMA_RECOVERY_V1, MIME_RECOVERY_V1, TASK_SETTINGS, \
+    SCHEMA_APP_VERSION_EVENT_LIST_V1, MIME_APP_VERSION_EVENT_LIST_V1
+from deployer.services.deployment import generate_deployment_id
 from deployer.services.storage.factory import get_store
 
 from deployer.tasks.deployment import create, delete, list_units, \
     recover_cluster
 from deployer.views import hypermedia, task_client
 from deployer.views.util import created_task, created, deleted, \
-    build_response, use_paging
+    build_response, use_paging, use_etag, use_cursor, encode_cursor, \
+    use_api_reads
+
+
+def _change_stamp(view, name=None, version=None, **kwargs):
+    """
+    Gets the change stamp for deployments matching the view arguments.
+    """
+    return get_store().get_change_stamp(name=name, version=version)
 
 
 class ApplicationApi(MethodView):
@@ -40,9 +50,14 @@ class ApplicationApi(MethodView):
         deployment = request_data
         result = create.delay(deployment)
         if accept_mimetype == MIME_APP_VERSION_V1:
-            result = task_client.ready(
-                result.id, wait=True, raise_error=True)
-            deployment = result['output']
+            output = task_client.wait(
+                result.id, raise_error=True,
+                timeout=TASK_SETTINGS['SYNC_CREATE_TIMEOUT'])
+            if output['status'] == 'PENDING':
+                # Deployment is still in progress. Fallback to task
+                # representation (202) so that client can poll the task.
+                return created_task(result)
+            deployment = output['output']
             location = url_for(
                 '.versions', name=deployment['deployment']['name'],
                 version=deployment['deployment']['version'])
@@ -61,6 +76,8 @@ class ApplicationApi(MethodView):
         MIME_JSON: SCHEMA_APP_LIST_V1,
         MIME_APP_LIST_V1: SCHEMA_APP_LIST_V1
     }, default=MIME_APP_LIST_V1)
+    @use_api_reads
+    @use_etag(_change_stamp)
     def list(self, **kwargs):
         """
         Lists all applications.
@@ -109,7 +126,9 @@ class VersionApi(MethodView):
         MIME_JSON: SCHEMA_APP_VERSION_LIST_V1,
         MIME_APP_VERSION_LIST_V1: SCHEMA_APP_VERSION_LIST_V1
     }, default=MIME_APP_VERSION_LIST_V1)
+    @use_api_reads
     @use_paging
+    @use_etag(_change_stamp)
     def list(self, name, **kwargs):
         """
         Lists all applications. Require search to be enabled.
@@ -118,13 +137,15 @@ class VersionApi(MethodView):
         :return: Flask Response wrapping deployment list.
         """
 
-        deployments = get_store().filter_deployments(name)
+        deployments = get_store().filter_deployments(name, lazy=True)
         return build_response(deployments)
 
     @hypermedia.produces({
         MIME_JSON: SCHEMA_APP_VERSION_V1,
         MIME_APP_VERSION_V1: SCHEMA_APP_VERSION_V1
     }, default=MIME_APP_VERSION_V1)
+    @use_api_reads
+    @use_etag(_change_stamp)
     def find_one(self, name, version, **kwargs):
         """
         Finds single deployment. Require search to be enabled.
@@ -220,6 +241,48 @@ class UnitApi(MethodView):
             return created_task(result)
 
 
+class EventApi(MethodView):
+    """
+    API for the event timeline of an application version
+    """
+
+    @hypermedia.produces({
+        MIME_JSON: SCHEMA_APP_VERSION_EVENT_LIST_V1,
+        MIME_APP_VERSION_EVENT_LIST_V1: SCHEMA_APP_VERSION_EVENT_LIST_V1
+    }, default=MIME_APP_VERSION_EVENT_LIST_V1)
+    @use_api_reads
+    @use_cursor
+    def get(self, name, version, after=None, size=None, **kwargs):
+        """
+        Lists the events for given application version sorted by date. Events
+        can be filtered using 'type' query parameter (can be repeated). If
+        more events are available, Link header with rel="next" is added.
+
+        :param name: Name of the application
+        :type name: str
+        :param version: Version of the application
+        :type version: str
+        :return: Flask Response wrapping event list
+        """
+        event_types = request.args.getlist('type')
+        try:
+            events = get_store().find_events(
+                generate_deployment_id(name, version),
+                event_types=event_types, after=after, limit=size)
+        except ValueError:
+            # Cursor that was tampered with
+            flask.abort(400)
+        headers = {}
+        if events and len(events) >= size:
+            last_event = events[-1]
+            next_url = url_for(
+                '.events', name=name, version=version, type=event_types,
+                size=size,
+                cursor=encode_cursor(last_event['date'], last_event['id']))
+            headers['Link'] = '<{}>; rel="next"'.format(next_url)
+        return build_response(events, headers=headers)
+
+
 class RecoveryApi(MethodView):
     """
     Provides API for deployment recovery
@@ -248,6 +311,7 @@ def register(app, **kwargs):
     apps_func = ApplicationApi.as_view('apps')
     versions_func = VersionApi.as_view('versions')
     units_func = UnitApi.as_view('units')
+    events_func = EventApi.as_view('events')
     recovery_func = RecoveryApi.as_view('recovery')
 
     for uri in ('/apps', '/apps/'):
@@ -267,5 +331,8 @@ def register(app, **kwargs):
     for uri in ('%s/units' % (version_uri), '%s/units/' % version_uri):
         app.add_url_rule(uri, view_func=units_func, methods=['GET'])
 
+    for uri in ('%s/events' % (version_uri), '%s/events/' % version_uri):
+        app.add_url_rule(uri, view_func=events_func, methods=['GET'])
+
     for uri in ('/recovery', '/recovery/'):
         app.add_url_rule(uri, view_func=recovery_func, methods=['POST'])
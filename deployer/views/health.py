@@ -27,16 +27,19 @@ class HealthApi(MethodView):
         }, default=MIME_HEALTH_V1)
     def get(self, **kwargs):
         """
-        Health endpoint for Orchestrator
+        Health endpoint for Orchestrator. Responds with 500 if any of the
+        checks failed or its result is stale.
 
         :return: Flask Json Response containing version.
         """
         check_celery = request.args.get('celery', 'true').lower() in \
             BOOLEAN_TRUE_VALUES
         health = get_health(check_celery)
+        # Stale results (e.g. background probe is hung) are not trusted
         failed_checks = [
             health_status['status'] for health_status in health.values()
-            if health_status['status'] != HEALTH_OK
+            if health_status['status'] != HEALTH_OK or
+            health_status.get('stale')
         ]
         http_status = 200 if not failed_checks else 500
         return build_response(health, status=http_status)
@@ -1,10 +1,20 @@
+import base64
+import binascii
 import copy
+import datetime
 import functools
+import hashlib
 import json
 
-from flask import url_for, Response, request
+import pytz
+from flask import url_for, Response, request, abort
+from werkzeug.http import http_date, quote_etag
 
-from conf.appconfig import MIME_JSON, API_DEFAULT_PAGE_SIZE
+from conf.appconfig import MIME_JSON, API_DEFAULT_PAGE_SIZE, \
+    API_STREAM_BUFFER_SIZE, API_MAX_PAGE_SIZE
+from deployer.services.storage.base import api_reads
+
+EPOCH = datetime.datetime(1970, 1, 1)
 
 
 def build_response(output, status=200, mimetype=MIME_JSON,
@@ -13,7 +23,8 @@ def build_response(output, status=200, mimetype=MIME_JSON,
     Utility method to build the Json response with custom mimetype, status code
     and response headers
 
-    :param output: Json Serializable object
+    :param output: Json Serializable object. If output is an iterable (list,
+        mongo cursor, generator), response is streamed as json array.
     :param status: Http Status code
     :type status: int
     :param mimetype: Response mimetype.
@@ -22,11 +33,51 @@ def build_response(output, status=200, mimetype=MIME_JSON,
     :type headers: dict
     :return: Tuple consisting of Flask Response, Status Code and Http Headers
     """
-    resp = Response(json.dumps(output, cls=DateTimeEncoder))
+    if hasattr(output, '__iter__') and not isinstance(output, dict):
+        resp = Response(stream_json(output))
+    else:
+        resp = Response(dumps(output))
     resp.mimetype = mimetype
     return resp, status, headers
 
 
+def dumps(output):
+    """
+    Serializes the output to json string. Serialization is done in one shot
+    so that C accelerated encoder gets used (when available).
+
+    :param output: Json Serializable object
+    :return: Json string
+    :rtype: str
+    """
+    return json.dumps(output, cls=DateTimeEncoder)
+
+
+def stream_json(items, buffer_size=API_STREAM_BUFFER_SIZE):
+    """
+    Generator that serializes iterable as json array. Items are consumed and
+    serialized one at a time (e.g. while walking mongo cursor) and serialized
+    chunks are yielded once buffer size is reached. This keeps the memory
+    bounded for large list responses.
+
+    :param items: Iterable of json serializable objects
+    :param buffer_size: Minimum no. of characters to be buffered before
+        yielding a chunk
+    :type buffer_size: int
+    :return: Generator for serialized json chunks
+    """
+    buf, buf_len = ['['], 1
+    for idx, item in enumerate(items):
+        chunk = dumps(item) if idx == 0 else ',' + dumps(item)
+        buf.append(chunk)
+        buf_len += len(chunk)
+        if buf_len >= buffer_size:
+            yield ''.join(buf)
+            buf, buf_len = [], 0
+    buf.append(']')
+    yield ''.join(buf)
+
+
 def created_task(result, status=202, mimetype='application/vnd.task-v1+json',
                  headers={}):
     """
@@ -92,6 +143,151 @@ def use_paging(func):
     return inner
 
 
+def use_api_reads(func):
+    """
+    Decorator for read only views that can tolerate stale data. Store reads
+    made by the view use the API read preference
+    (See: MONGODB_API_READ_PREFERENCE).
+    """
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        with api_reads():
+            return func(*args, **kwargs)
+    return inner
+
+
+def use_cursor(func):
+    """
+    Decorator that parses cursor based paging parameters ('cursor' and
+    'size') from the request. Invalid cursor results in 400 (Bad Request).
+    """
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        try:
+            size = int(request.args.get('size', API_DEFAULT_PAGE_SIZE))
+            size = max(1, min(API_MAX_PAGE_SIZE, size))
+        except ValueError:
+            size = API_DEFAULT_PAGE_SIZE
+
+        cursor = request.args.get('cursor')
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            abort(400)
+
+        kwargs.setdefault('after', after)
+        kwargs.setdefault('size', size)
+        return func(*args, **kwargs)
+    return inner
+
+
+def encode_cursor(date, item_id):
+    """
+    Encodes the position of an item (sorted by date and id) into an opaque
+    cursor value.
+
+    :param date: Date for the item
+    :type date: datetime.datetime
+    :param item_id: Id of the item
+    :type item_id: str
+    :return: Cursor value
+    :rtype: str
+    """
+    delta = _as_utc_naive(date) - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + \
+        delta.microseconds
+    return base64.urlsafe_b64encode('{}:{}'.format(micros, item_id))
+
+
+def decode_cursor(cursor):
+    """
+    Decodes the cursor value created using encode_cursor
+
+    :param cursor: Cursor value
+    :type cursor: str
+    :return: Tuple of date (naive UTC) and item id
+    :rtype: tuple
+    :raises ValueError: if cursor is invalid
+    """
+    try:
+        micros, item_id = base64.urlsafe_b64decode(str(cursor)).split(':', 1)
+        return EPOCH + datetime.timedelta(microseconds=int(micros)), item_id
+    except (TypeError, binascii.Error):
+        raise ValueError('Invalid cursor: {}'.format(cursor))
+
+
+def not_modified(headers={}):
+    """
+    Creates 304 (Not Modified) response
+
+    :param headers: Response headers (key, value)
+    :type headers: dict
+    :return: Tuple consisting of Flask Response, Status Code and Http Headers
+    """
+    return Response(status=304), 304, copy.deepcopy(headers or {})
+
+
+def generate_etag(stamp, *variants):
+    """
+    Generates ETag value for given change stamp.
+
+    :param stamp: Change stamp dictionary (containing 'modified' and
+        'count')
+    :type stamp: dict
+    :param variants: Additional values that alter the representation (e.g.
+        mimetype, query string)
+    :return: ETag value (un-quoted)
+    :rtype: str
+    """
+    modified = stamp.get('modified')
+    parts = [modified.isoformat() if modified else '',
+             str(stamp.get('count', ''))] + [str(v or '') for v in variants]
+    return hashlib.md5('|'.join(parts)).hexdigest()
+
+
+def _as_utc_naive(date):
+    if date and date.tzinfo:
+        return date.astimezone(pytz.UTC).replace(tzinfo=None)
+    return date
+
+
+def use_etag(stamp_func):
+    """
+    Decorator that adds conditional GET support using ETag and Last-Modified
+    headers. The change stamp is looked up before invoking the view, so
+    unchanged resources are answered with 304 without fetching them.
+
+    :param stamp_func: Function invoked with view arguments that returns the
+        change stamp (dictionary with 'modified' and 'count')
+    :return: decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            stamp = stamp_func(*args, **kwargs)
+            etag = generate_etag(stamp, kwargs.get('accept_mimetype'),
+                                 request.query_string)
+            headers = {'ETag': quote_etag(etag)}
+            last_modified = _as_utc_naive(stamp.get('modified'))
+            if last_modified:
+                # Http dates do not have sub-second precision
+                last_modified = last_modified.replace(microsecond=0)
+                headers['Last-Modified'] = http_date(last_modified)
+
+            if request.if_none_match:
+                if etag in request.if_none_match:
+                    return not_modified(headers)
+            elif last_modified and request.if_modified_since:
+                if last_modified <= _as_utc_naive(request.if_modified_since):
+                    return not_modified(headers)
+
+            resp, status, resp_headers = func(*args, **kwargs)
+            headers.update(resp_headers or {})
+            return resp, status, headers
+        return inner
+    return decorator
+
+
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, obj):
         if hasattr(obj, 'isoformat'):
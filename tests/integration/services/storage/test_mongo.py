@@ -91,14 +91,16 @@ class TestMongoStore():
     def setup(cls):
         cls.store = create(
             deployment_coll='deployments-integration-store',
-            event_coll='events-integration-store'
+            event_coll='events-integration-store',
+            app_coll='apps-integration-store'
         )
         cls.store._deployments.drop()
         cls.store._events.drop()
-        cls.store.setup()
+        cls.store._apps.drop()
         requests = [pymongo.InsertOne(copy.deepcopy(deployment)) for deployment
                     in EXISTING_DEPLOYMENTS.values()]
         cls.store._deployments.bulk_write(requests)
+        cls.store.setup()
 
     def _get_raw_document_without_internal_id(self, deployment_id):
         deployment = self.store._deployments.find_one(
@@ -123,11 +125,65 @@ class TestMongoStore():
         event_indexes = self.store._events.index_information()
 
         # Indexes are created as expected
-        for idx in ('created_idx', 'identity_idx', 'app_idx',
-                    'expiry_idx'):
+        for idx in ('identity_idx', 'expiry_idx', 'app_state_idx',
+                    'state_idx', 'promoted_idx', 'modified_idx',
+                    'app_modified_idx'):
             ok_(idx in indexes, '{} was not created'.format(idx))
 
-        ok_('expiry_idx' in event_indexes, 'Event expiry_idx was not created')
+        for idx in ('expiry_idx', 'deployment_date_idx'):
+            ok_(idx in event_indexes, 'Event {} was not created'.format(idx))
+
+    def test_store_setup_drops_obsolete_indexes(self):
+        # Given: Obsolete index in deployments collection
+        self.store._deployments.create_index(
+            [('cluster', pymongo.ASCENDING), ('date', pymongo.DESCENDING)],
+            name='created_idx')
+
+        # When: I setup the store
+        self.store.setup()
+
+        # Then: Obsolete index gets dropped
+        indexes = self.store._deployments.index_information()
+        ok_('created_idx' not in indexes, 'created_idx was not dropped')
+
+    def _assert_no_collection_scan(self, cursor):
+        plan = cursor.explain()
+        winning_plan = str(plan.get('queryPlanner', {}).get('winningPlan') or
+                           plan.get('cursor'))
+        ok_('COLLSCAN' not in winning_plan and
+            'BasicCursor' not in winning_plan,
+            'Query uses collection scan: {}'.format(winning_plan))
+
+    def test_store_queries_use_indexes(self):
+        # Given: Query shapes used by the store
+        queries = [
+            {'name': 'test-deployment1'},
+            {'name': 'test-deployment1', 'version': 'v1'},
+            {'name': 'test-deployment1', 'state': DEPLOYMENT_STATE_PROMOTED},
+            {},
+            {'state': DEPLOYMENT_STATE_PROMOTED},
+            {'state': DEPLOYMENT_STATE_NEW},
+            {'exclude_names': ['test-deployment2']},
+            {'only_running': False}
+        ]
+        cursors = [
+            self.store._deployments.find(
+                self.store._deployment_filter(**query)
+            ).sort('deployment.version') for query in queries
+        ] + [
+            self.store._deployments.find({'id': 'test-deployment1-v1'}),
+            self.store._deployments.find(
+                self.store._deployment_filter(name='test-deployment1',
+                                              only_running=False)
+            ).sort('modified', pymongo.DESCENDING),
+            self.store._apps.find(
+                {'cluster': CLUSTER_NAME}).sort('name', pymongo.ASCENDING)
+        ]
+
+        for cursor in cursors:
+            # When: I explain the query
+            # Then: Query does not use collection scan
+            self._assert_no_collection_scan(cursor)
 
     def test_get_deployment(self):
 
@@ -210,6 +266,7 @@ class TestMongoStore():
             'component': 'deployer',
             'type': 'MOCK_EVENT',
             'date': NOW,
+            '_expiry': NOW,
             'meta-info': {
                 'mock': 'search'
             },
@@ -218,6 +275,42 @@ class TestMongoStore():
             }
         })
 
+    def test_find_events(self):
+        # Given: Events for the deployment
+        for event_type in ('EVENT1', 'EVENT2', 'EVENT3'):
+            self.store.add_event(event_type, search_params={
+                'deployment': {'id': 'test-deployment1-v1'}
+            })
+
+        # When: I find the events after the first event
+        first_page = self.store.find_events('test-deployment1-v1', limit=1)
+        events = self.store.find_events(
+            'test-deployment1-v1', event_types=['EVENT1', 'EVENT3'],
+            after=(first_page[0]['date'], first_page[0]['id']))
+
+        # Then: Matching events are returned in order
+        eq_([event['type'] for event in first_page], ['EVENT1'])
+        eq_([event['type'] for event in events], ['EVENT3'])
+
+    @freeze_time(NOW)
+    def test_add_event_in_bucketed_mode(self):
+        # Given: Store using daily buckets for events
+        self.store.event_storage_mode = 'bucketed'
+        bucket = self.store._db['events-integration-store-20220101']
+        bucket.drop()
+
+        try:
+            # When: I add event to the store
+            self.store.add_event('MOCK_EVENT')
+
+            # Then: Event gets added to the daily bucket
+            events = list(self.store._find_events({'type': 'MOCK_EVENT'}))
+            eq_(len(events), 1)
+            eq_(bucket.count(), 1)
+        finally:
+            self.store.event_storage_mode = 'ttl'
+            bucket.drop()
+
     def test_update_state_bulk(self):
         # Given: Deployment that needs to be updated
         deployment_name = 'test-deployment1'
@@ -264,6 +357,25 @@ class TestMongoStore():
         # Then: Expected apps are returned
         eq_(apps, ['test-deployment1', 'test-deployment2'])
 
+    def test_find_apps_after_create_deployment(self):
+        # Given: New deployment for an application
+        self.store.create_deployment({
+            'id': 'test-deployment0-v1',
+            'deployment': {
+                'name': 'test-deployment0',
+                'version': 'v1'
+            },
+            'state': DEPLOYMENT_STATE_NEW,
+            'cluster': CLUSTER_NAME
+        })
+
+        # When: I find applications from the store
+        apps = self.store.find_apps()
+
+        # Then: Newly created application is returned
+        eq_(apps, ['test-deployment0', 'test-deployment1',
+                   'test-deployment2'])
+
     def test_filter_deployments(self):
         # When: I filter deployments from the store
         deployments = self.store.filter_deployments()
@@ -327,6 +439,20 @@ class TestMongoStore():
         dict_compare(deployments[0], {'id': 'test-deployment1-v1'})
         dict_compare(deployments[1], {'id': 'test-deployment1-v2'})
 
+    def test_get_change_stamp(self):
+        # Given: Existing deployment with modified timestamp
+        self.store._deployments.update_one(
+            {'id': 'test-deployment1-v1'}, {'$set': {'modified': NOW}})
+
+        # When: I get the change stamp for the application
+        stamp = self.store.get_change_stamp('test-deployment1')
+
+        # Then: Expected change stamp is returned
+        dict_compare(stamp, {
+            'modified': NOW,
+            'count': 3
+        })
+
     @freeze_time(NOW)
     def test_update_runtime_upstreams(self):
 
@@ -378,3 +504,20 @@ class TestMongoStore():
             'modified': NOW,
         })
         dict_compare(deployment, expected_deployment)
+
+    def test_update_runtime_units_when_unchanged(self):
+
+        # Given: Deployment with existing runtime units
+        units = [{'name': 'unit1', 'sub': 'running'}]
+        with freeze_time(NOW):
+            self.store.update_runtime_units('test-deployment1-v1', units)
+
+        # When: I update the deployment with same units
+        with freeze_time(NOW + datetime.timedelta(minutes=15)):
+            self.store.update_runtime_units('test-deployment1-v1', units)
+
+        # Then: Deployment is not modified
+        deployment = self.store.get_deployment('test-deployment1-v1')
+        eq_(deployment['modified'], NOW)
+        eq_(deployment['runtime'], {'units': units})
+        ok_('_runtime-hashes' not in deployment)
@@ -77,6 +77,10 @@ class TestAbstractStore:
     def test_filter_deployments(self):
         self.store.filter_deployments('myapp')
 
+    @raises(NotImplementedError)
+    def test_get_change_stamp(self):
+        self.store.get_change_stamp('myapp')
+
     @freeze_time(NOW)
     def test_apply_modified_ts(self):
 
@@ -94,3 +98,43 @@ class TestAbstractStore:
             },
             'modified': NOW
         })
+
+    @freeze_time(NOW_NOTZ)
+    def test_unit_of_work(self):
+        # Given: Store with mock operations
+        self.store.update_state = MagicMock()
+        self.store.update_runtime_units = MagicMock()
+        self.store._add_raw_event = MagicMock()
+
+        # When: I record operations using unit of work
+        with self.store.unit_of_work() as uow:
+            uow.update_state('fake_id', 'PROMOTED')
+            uow.update_runtime_units('fake_id', [])
+            uow.add_event('MOCK_EVENT')
+            # Then: Operations are not applied before commit
+            self.store.update_state.assert_not_called()
+
+        # And: Operations are applied on commit
+        self.store.update_state.assert_called_once_with('fake_id', 'PROMOTED')
+        self.store.update_runtime_units.assert_called_once_with('fake_id', [])
+        self.store._add_raw_event.assert_called_once_with({
+            'type': 'MOCK_EVENT',
+            'component': 'deployer',
+            'details': None,
+            'date': NOW_NOTZ
+        })
+
+    def test_unit_of_work_with_error(self):
+        # Given: Store with mock operations
+        self.store.update_state = MagicMock()
+
+        # When: Error occurs while recording operations
+        try:
+            with self.store.unit_of_work() as uow:
+                uow.update_state('fake_id', 'PROMOTED')
+                raise ValueError('mock error')
+        except ValueError:
+            pass
+
+        # Then: Operations are not applied
+        self.store.update_state.assert_not_called()
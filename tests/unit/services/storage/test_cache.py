@@ -0,0 +1,139 @@
+from mock import MagicMock
+from nose.tools import eq_, ok_
+from deployer.services.storage.cache import cached, CachedStore
+
+__author__ = 'sukrit'
+
+
+class TestCachedStore:
+
+    def setup(self):
+        self.backend = MagicMock()
+        self.backend.get_deployment.side_effect = \
+            lambda deployment_id: {'id': deployment_id, 'state': 'NEW'}
+        self.store = cached(self.backend, ttl=60, max_size=10)
+
+    def test_create(self):
+        ok_(isinstance(self.store, CachedStore))
+
+    def test_get_deployment_is_cached(self):
+        # When: I get the same deployment twice
+        self.store.get_deployment('mockid')
+        deployment = self.store.get_deployment('mockid')
+
+        # Then: Deployment is read from the backend only once
+        eq_(deployment, {'id': 'mockid', 'state': 'NEW'})
+        self.backend.get_deployment.assert_called_once_with('mockid')
+
+    def test_get_deployment_returns_copy(self):
+        # Given: Cached deployment modified by the caller
+        self.store.get_deployment('mockid')['state'] = 'PROMOTED'
+
+        # When: I get the deployment again
+        deployment = self.store.get_deployment('mockid')
+
+        # Then: Cached deployment is not modified
+        eq_(deployment['state'], 'NEW')
+
+    def test_missing_deployment_is_not_cached(self):
+        # Given: Backend with missing deployment
+        self.backend.get_deployment.side_effect = None
+        self.backend.get_deployment.return_value = None
+
+        # When: I get the deployment twice
+        self.store.get_deployment('mockid')
+        self.store.get_deployment('mockid')
+
+        # Then: Backend is queried every time
+        eq_(self.backend.get_deployment.call_count, 2)
+
+    def _assert_invalidates(self, write, *args):
+        # Given: Cached deployment
+        self.store.get_deployment('mockid')
+        self.backend.get_deployment.reset_mock()
+
+        # When: I write using the store
+        getattr(self.store, write)(*args)
+        self.store.get_deployment('mockid')
+
+        # Then: Deployment is read again from the backend
+        self.backend.get_deployment.assert_called_once_with('mockid')
+
+    def test_update_state_invalidates_cache(self):
+        self._assert_invalidates('update_state', 'mockid', 'PROMOTED')
+
+    def test_update_runtime_units_invalidates_cache(self):
+        self._assert_invalidates('update_runtime_units', 'mockid', [])
+
+    def test_update_runtime_upstreams_invalidates_cache(self):
+        self._assert_invalidates('update_runtime_upstreams', 'mockid', {})
+
+    def test_create_deployment_invalidates_cache(self):
+        self._assert_invalidates('create_deployment', {'id': 'mockid'})
+
+    def test_update_state_bulk_invalidates_cache(self):
+        self._assert_invalidates('update_state_bulk', 'mockapp', 'PROMOTED')
+
+    def test_read_racing_with_write_is_not_cached(self):
+        # Given: Backend where deployment gets updated during read
+        def racing_read(deployment_id):
+            self.store.update_state(deployment_id, 'PROMOTED')
+            return {'id': deployment_id, 'state': 'NEW'}
+        self.backend.get_deployment.side_effect = racing_read
+        self.store.get_deployment('mockid')
+
+        # When: I get the deployment again
+        self.backend.get_deployment.side_effect = None
+        self.backend.get_deployment.return_value = {
+            'id': 'mockid',
+            'state': 'PROMOTED'
+        }
+        deployment = self.store.get_deployment('mockid')
+
+        # Then: Updated deployment is returned
+        eq_(deployment['state'], 'PROMOTED')
+
+    def test_read_racing_with_evicted_write_is_not_cached(self):
+        # Given: Backend where deployment gets updated during read and its
+        # version stamp gets evicted by writes to other deployments
+        def racing_read(deployment_id):
+            self.store.update_state(deployment_id, 'PROMOTED')
+            for index in range(20):
+                self.store.update_state('other{}'.format(index), 'NEW')
+            return {'id': deployment_id, 'state': 'NEW'}
+        self.backend.get_deployment.side_effect = racing_read
+        self.store.get_deployment('mockid')
+
+        # When: I get the deployment again
+        self.backend.get_deployment.side_effect = None
+        self.backend.get_deployment.return_value = {
+            'id': 'mockid',
+            'state': 'PROMOTED'
+        }
+        deployment = self.store.get_deployment('mockid')
+
+        # Then: Updated deployment is returned
+        eq_(deployment['state'], 'PROMOTED')
+
+    def test_version_stamps_are_bounded(self):
+        # When: I update more deployments than the max size of the cache
+        for index in range(20):
+            self.store.update_state('mockid{}'.format(index), 'NEW')
+
+        # Then: Version stamps are tracked only for max size deployments
+        eq_(len(self.store._versions._entries), 10)
+
+    def test_other_operations_are_delegated(self):
+        # When: I invoke non cached operations
+        self.store.filter_deployments('mockapp', only_running=False)
+        self.store.find_apps()
+        self.store.add_event('MOCK_EVENT')
+        self.store.setup()
+
+        # Then: Operations are delegated to the backend
+        self.backend.filter_deployments.assert_called_once_with(
+            'mockapp', only_running=False)
+        self.backend.find_apps.assert_called_once_with()
+        self.backend.add_event.assert_called_once_with(
+            'MOCK_EVENT', details=None, search_params=None)
+        self.backend.setup.assert_called_once_with()
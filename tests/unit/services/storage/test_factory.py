@@ -1,6 +1,8 @@
 from mock import patch, MagicMock
-from nose.tools import ok_, raises
-from deployer.services.storage.factory import get_store, AbstractStorageFactory
+from nose.tools import ok_, raises, eq_
+from deployer.services.storage.cache import CachedStore
+from deployer.services.storage.factory import get_store, \
+    AbstractStorageFactory, DefaultStorageFactory
 
 
 @patch('deployer.services.storage.mongo.create')
@@ -40,3 +42,20 @@ class TestAbstractStorageFactory:
     @raises(NotImplementedError)
     def test_register(self):
         self.factory.register('mystore', MagicMock())
+
+
+@patch('deployer.services.storage.mongo.create')
+def test_get_cached_store(mock_create):
+    # Given: Factory with caching enabled
+    factory = DefaultStorageFactory(cache_settings={
+        'enabled': True,
+        'ttl': 5,
+        'max-size': 10
+    })
+
+    # When: I get the store from the factory
+    store = factory.get('mongo')
+
+    # Then: Cached store wrapping the mongo store is returned
+    ok_(isinstance(store, CachedStore))
+    eq_(store.store, mock_create.return_value)
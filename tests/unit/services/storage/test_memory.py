@@ -0,0 +1,354 @@
+import copy
+import datetime
+import threading
+from freezegun import freeze_time
+from nose.tools import eq_, ok_
+import pytz
+from conf.appconfig import DEPLOYMENT_STATE_DECOMMISSIONED, \
+    DEPLOYMENT_STATE_NEW, DEPLOYMENT_STATE_PROMOTED, CLUSTER_NAME, \
+    DEPLOYMENT_STATE_STARTED
+from deployer.services.storage.factory import DefaultStorageFactory
+from deployer.services.storage.memory import create, MemoryStore
+from tests.helper import dict_compare
+
+__author__ = 'sukrit'
+
+
+NOW = datetime.datetime(2022, 01, 01, tzinfo=pytz.UTC)
+NOW_NOTZ = datetime.datetime(2022, 01, 01)
+LATER = datetime.datetime(2022, 01, 01, 0, 1, tzinfo=pytz.UTC)
+
+
+def _deployment(deployment_id, name, version, state,
+                cluster=CLUSTER_NAME):
+    return {
+        'id': deployment_id,
+        'deployment': {
+            'name': name,
+            'version': version
+        },
+        'state': state,
+        'cluster': cluster
+    }
+
+
+EXISTING_DEPLOYMENTS = [
+    _deployment('test-deployment1-v0', 'test-deployment1', 'v0',
+                DEPLOYMENT_STATE_DECOMMISSIONED),
+    _deployment('test-deployment1-v1', 'test-deployment1', 'v1',
+                DEPLOYMENT_STATE_PROMOTED),
+    _deployment('test-deployment1-v2', 'test-deployment1', 'v2',
+                DEPLOYMENT_STATE_NEW),
+    _deployment('test-deployment2-v1', 'test-deployment2', 'v1',
+                DEPLOYMENT_STATE_DECOMMISSIONED),
+    _deployment('test-deployment2-v2', 'test-deployment2', 'v2',
+                DEPLOYMENT_STATE_STARTED),
+    _deployment('test-deployment3-v1', 'test-deployment3', 'v1',
+                DEPLOYMENT_STATE_STARTED, cluster='DIFFERENT-CLUSTER')
+]
+
+
+def _ids(deployments):
+    return [deployment['id'] for deployment in deployments]
+
+
+class TestMemoryStore:
+
+    def setup(self):
+        self.store = create(deployment_expiry=3600, event_expiry=3600)
+        with freeze_time(NOW):
+            for deployment in EXISTING_DEPLOYMENTS:
+                self.store.create_deployment(copy.deepcopy(deployment))
+            self.store.update_state('test-deployment1-v1',
+                                    DEPLOYMENT_STATE_PROMOTED)
+
+    def test_create(self):
+        ok_(isinstance(self.store, MemoryStore))
+
+    def test_factory_provides_memory_store(self):
+        # When: I get the memory store from the factory
+        store = DefaultStorageFactory().get('memory')
+
+        # Then: MemoryStore instance is returned
+        ok_(isinstance(store, MemoryStore))
+
+    @freeze_time(NOW)
+    def test_create_deployment(self):
+        # When: I create a new deployment
+        self.store.create_deployment(
+            _deployment('test-deployment4-v1', 'test-deployment4', 'v1',
+                        DEPLOYMENT_STATE_NEW))
+
+        # Then: Deployment gets created
+        dict_compare(self.store.get_deployment('test-deployment4-v1'), dict(
+            _deployment('test-deployment4-v1', 'test-deployment4', 'v1',
+                        DEPLOYMENT_STATE_NEW),
+            **{
+                'modified': NOW,
+                'state-updated': NOW
+            }))
+
+    @freeze_time(NOW)
+    def test_get_deployment_returns_copy(self):
+        # Given: Deployment that is modified by the caller
+        deployment = self.store.get_deployment('test-deployment1-v1')
+        deployment['state'] = DEPLOYMENT_STATE_DECOMMISSIONED
+
+        # When: I get the deployment again
+        deployment = self.store.get_deployment('test-deployment1-v1')
+
+        # Then: Stored deployment is not modified
+        eq_(deployment['state'], DEPLOYMENT_STATE_PROMOTED)
+
+    @freeze_time(NOW)
+    def test_get_non_existing_deployment(self):
+        eq_(self.store.get_deployment('invalid'), None)
+
+    @freeze_time(LATER)
+    def test_update_state(self):
+        # Given: Deployment with runtime information
+        self.store.update_runtime_units('test-deployment1-v2', ['mockunit'])
+
+        # When: I update the state of the deployment
+        self.store.update_state('test-deployment1-v2',
+                                DEPLOYMENT_STATE_STARTED)
+
+        # Then: State gets updated and runtime is reset
+        deployment = self.store.get_deployment('test-deployment1-v2')
+        eq_(deployment['state'], DEPLOYMENT_STATE_STARTED)
+        eq_(deployment['state-updated'], LATER)
+        eq_(deployment['runtime'], {})
+        eq_(_ids(self.store.filter_deployments(
+            state=DEPLOYMENT_STATE_NEW)), [])
+
+    @freeze_time(NOW)
+    def test_update_state_bulk(self):
+        # When: I bulk update the state for given application
+        self.store.update_state_bulk('test-deployment1',
+                                     DEPLOYMENT_STATE_DECOMMISSIONED,
+                                     existing_state=DEPLOYMENT_STATE_NEW)
+
+        # Then: Only deployments matching existing state are updated
+        eq_(_ids(self.store.filter_deployments(
+            'test-deployment1', state=DEPLOYMENT_STATE_DECOMMISSIONED)),
+            ['test-deployment1-v0', 'test-deployment1-v2'])
+        eq_(self.store.get_deployment('test-deployment1-v1')['state'],
+            DEPLOYMENT_STATE_PROMOTED)
+
+    @freeze_time(LATER)
+    def test_update_runtime_upstreams(self):
+        # When: I update the runtime upstreams for deployment
+        self.store.update_runtime_upstreams('test-deployment1-v1', {
+            'mockupstream': {}
+        })
+
+        # Then: Runtime upstreams get updated
+        deployment = self.store.get_deployment('test-deployment1-v1')
+        eq_(deployment['runtime'], {
+            'proxy-upstreams': {
+                'mockupstream': {}
+            }
+        })
+        eq_(deployment['modified'], LATER)
+
+    def test_update_runtime_units_when_unchanged(self):
+        # Given: Deployment with runtime units
+        with freeze_time(NOW):
+            self.store.update_runtime_units('test-deployment1-v1',
+                                            [{'name': 'unit1'}])
+
+        # When: I update the deployment with same units
+        with freeze_time(LATER):
+            self.store.update_runtime_units('test-deployment1-v1',
+                                            [{'name': 'unit1'}])
+            deployment = self.store.get_deployment('test-deployment1-v1')
+
+        # Then: Deployment is not modified
+        eq_(deployment['modified'], NOW)
+        eq_(deployment['runtime'], {'units': [{'name': 'unit1'}]})
+
+    @freeze_time(NOW)
+    def test_find_apps(self):
+        eq_(self.store.find_apps(), ['test-deployment1', 'test-deployment2'])
+
+    @freeze_time(NOW)
+    def test_filter_deployments(self):
+        # When: I filter running deployments
+        deployments = self.store.filter_deployments()
+
+        # Then: Running deployments for the cluster are returned sorted by
+        # version
+        eq_(_ids(deployments), ['test-deployment1-v1', 'test-deployment1-v2',
+                                'test-deployment2-v2'])
+
+    @freeze_time(NOW)
+    def test_filter_deployments_by_name_and_version(self):
+        eq_(_ids(self.store.filter_deployments(
+            'test-deployment1', version='v0', only_running=False)),
+            ['test-deployment1-v0'])
+
+    @freeze_time(NOW)
+    def test_filter_deployments_with_excluded_names(self):
+        eq_(_ids(self.store.filter_deployments(
+            exclude_names=['test-deployment1'])), ['test-deployment2-v2'])
+
+    @freeze_time(NOW)
+    def test_filter_deployment_ids(self):
+        # When: I filter deployments for ids only
+        deployments = self.store.filter_deployments('test-deployment1',
+                                                    only_ids=True)
+
+        # Then: Only ids are returned
+        eq_(deployments, [{'id': 'test-deployment1-v1'},
+                          {'id': 'test-deployment1-v2'}])
+
+    @freeze_time(NOW)
+    def test_filter_deployments_lazily(self):
+        # When: I filter deployments lazily
+        deployments = self.store.filter_deployments('test-deployment2',
+                                                    lazy=True)
+
+        # Then: Iterable over matching deployments is returned
+        ok_(not isinstance(deployments, list))
+        eq_(_ids(deployments), ['test-deployment2-v2'])
+
+    def test_expired_deployments_are_purged(self):
+        # When: I filter deployments after expiry
+        with freeze_time(NOW + datetime.timedelta(seconds=3601)):
+            deployments = self.store.filter_deployments(only_running=False)
+
+        # Then: Only promoted deployment remains
+        eq_(_ids(deployments), ['test-deployment1-v1'])
+        eq_(self.store.get_deployment('test-deployment1-v0'), None)
+
+    def test_purge_uses_latest_expiry_of_deployment(self):
+        # Given: Deployment updated after creation
+        with freeze_time(NOW + datetime.timedelta(seconds=3000)):
+            self.store.update_state('test-deployment1-v2',
+                                    DEPLOYMENT_STATE_STARTED)
+
+        # When: I filter deployments after expiry of other deployments
+        with freeze_time(NOW + datetime.timedelta(seconds=3601)):
+            deployments = self.store.filter_deployments(only_running=False)
+
+        # Then: Updated deployment is not purged
+        eq_(_ids(deployments), ['test-deployment1-v1', 'test-deployment1-v2'])
+
+        # And: Only the entry for updated deployment remains in expiry heap
+        eq_([deployment_id for _, deployment_id in self.store._expiry_heap],
+            ['test-deployment1-v2'])
+
+    def test_expired_events_are_purged(self):
+        # Given: Events added at different times
+        with freeze_time(NOW_NOTZ):
+            self.store.add_event('EVENT1')
+        with freeze_time(NOW_NOTZ + datetime.timedelta(seconds=60)):
+            self.store.add_event('EVENT2')
+
+        # When: I find events after expiry of first event
+        with freeze_time(NOW + datetime.timedelta(seconds=3630)):
+            self.store.find_events('mock-deployment-id')
+
+        # Then: Only the expired event is purged
+        eq_([event['type'] for event in self.store._events], ['EVENT2'])
+
+    @freeze_time(LATER)
+    def test_get_change_stamp(self):
+        # Given: Modified deployment
+        self.store.update_state('test-deployment1-v2',
+                                DEPLOYMENT_STATE_STARTED)
+
+        # When: I get the change stamp for the application
+        stamp = self.store.get_change_stamp('test-deployment1')
+
+        # Then: Expected change stamp is returned
+        eq_(stamp, {
+            'modified': LATER,
+            'count': 3
+        })
+
+    @freeze_time(NOW)
+    def test_get_change_stamp_for_missing_application(self):
+        eq_(self.store.get_change_stamp('invalid'), {
+            'modified': None,
+            'count': 0
+        })
+
+    @freeze_time(NOW_NOTZ)
+    def test_add_event(self):
+        # When: I add event to the store
+        self.store.add_event('MOCK_EVENT', details={'key': 'value'})
+
+        # Then: Event gets added
+        eq_(self.store._events, [{
+            'type': 'MOCK_EVENT',
+            'component': 'deployer',
+            'details': {'key': 'value'},
+            'date': NOW_NOTZ,
+            'id': '000000000000000000000001'
+        }])
+
+    @freeze_time(NOW)
+    def test_find_events(self):
+        # Given: Events for multiple deployments
+        for event_type, deployment_id in (
+                ('EVENT1', 'test-deployment1-v1'),
+                ('EVENT2', 'test-deployment1-v2'),
+                ('EVENT2', 'test-deployment1-v1'),
+                ('EVENT3', 'test-deployment1-v1')):
+            self.store.add_event(event_type, search_params={
+                'deployment': {'id': deployment_id}
+            })
+
+        # When: I find the events for deployment after the first event
+        first_page = self.store.find_events('test-deployment1-v1', limit=1)
+        events = self.store.find_events(
+            'test-deployment1-v1', event_types=['EVENT2', 'EVENT3'],
+            after=(first_page[0]['date'], first_page[0]['id']))
+
+        # Then: Matching events are returned in order
+        eq_([event['type'] for event in first_page], ['EVENT1'])
+        eq_([event['type'] for event in events], ['EVENT2', 'EVENT3'])
+
+    @freeze_time(LATER)
+    def test_unit_of_work(self):
+        # When: I commit state change and event using unit of work
+        with self.store.unit_of_work() as uow:
+            uow.update_state('test-deployment1-v2', DEPLOYMENT_STATE_STARTED)
+            uow.add_event('MOCK_EVENT')
+
+        # Then: State change and event are applied
+        eq_(self.store.get_deployment('test-deployment1-v2')['state'],
+            DEPLOYMENT_STATE_STARTED)
+        eq_(len(self.store._events), 1)
+
+    def test_concurrent_updates(self):
+        # Given: Threads updating the deployments concurrently
+        def update(index):
+            self.store.create_deployment(_deployment(
+                'concurrent-v{}'.format(index), 'concurrent',
+                'v{}'.format(index), DEPLOYMENT_STATE_NEW))
+            self.store.update_state('concurrent-v{}'.format(index),
+                                    DEPLOYMENT_STATE_STARTED)
+        threads = [threading.Thread(target=update, args=(index,))
+                   for index in range(10)]
+
+        # When: I run all the updates
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Then: All deployments are indexed correctly
+        eq_(len(self.store.filter_deployments(
+            'concurrent', state=DEPLOYMENT_STATE_STARTED)), 10)
+        eq_(self.store.filter_deployments(
+            'concurrent', state=DEPLOYMENT_STATE_NEW), [])
+
+    @freeze_time(NOW)
+    def test_health(self):
+        dict_compare(self.store.health(), {
+            'type': 'memory',
+            'deployments': 6,
+            'events': 0
+        })
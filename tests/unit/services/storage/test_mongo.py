@@ -0,0 +1,302 @@
+import datetime
+from freezegun import freeze_time
+from mock import patch, MagicMock
+from nose.tools import eq_, ok_, raises
+from pymongo import ReadPreference
+import pytz
+from conf.appconfig import CLUSTER_NAME
+from deployer.services.storage.base import api_reads
+from deployer.services.storage.mongo import ClientManager, create, \
+    MongoStore
+from deployer.util import content_hash
+
+__author__ = 'sukrit'
+
+NOW = datetime.datetime(2022, 01, 01, tzinfo=pytz.UTC)
+
+
+@patch('deployer.services.storage.mongo.MongoClient')
+@patch('deployer.services.storage.mongo.os')
+def test_client_manager_reuses_client_in_same_process(m_os, m_client):
+    # Given: Client manager
+    m_os.getpid.return_value = 100
+    manager = ClientManager('mongodb://mockhost', maxPoolSize=5)
+
+    # When: I get the client twice in the same process
+    client1 = manager.get()
+    client2 = manager.get()
+
+    # Then: Same client is returned
+    ok_(client1 is client2)
+    m_client.assert_called_once_with('mongodb://mockhost', tz_aware=True,
+                                     connect=False, maxPoolSize=5)
+
+
+@patch('deployer.services.storage.mongo.MongoClient')
+@patch('deployer.services.storage.mongo.os')
+def test_client_manager_creates_new_client_after_fork(m_os, m_client):
+    # Given: Client manager with client created in parent process
+    m_client.side_effect = lambda *args, **kwargs: MagicMock()
+    m_os.getpid.return_value = 100
+    manager = ClientManager('mongodb://mockhost')
+    parent_client = manager.get()
+
+    # When: I get the client in the forked process
+    m_os.getpid.return_value = 101
+    child_client = manager.get()
+
+    # Then: New client is created for the forked process
+    ok_(parent_client is not child_client)
+    eq_(m_client.call_count, 2)
+
+
+def test_read_only_operations_use_read_preference():
+    # Given: Mongo store with default read preferences
+    store = create(url='mongodb://mockhost')
+
+    # When: I get the collection for reads
+    collection = store._for_read(store._deployments)
+
+    # Then: Collection reads from primary
+    eq_(collection.read_preference, ReadPreference.PRIMARY)
+
+
+def test_api_reads_use_api_read_preference():
+    # Given: Mongo store with default read preferences
+    store = create(url='mongodb://mockhost')
+
+    # When: I get the collection for reads while serving API reads
+    with api_reads():
+        collection = store._for_read(store._deployments)
+
+    # Then: Collection uses API read preference
+    eq_(collection.read_preference, ReadPreference.SECONDARY_PREFERRED)
+    eq_(store._for_read(store._deployments).read_preference,
+        ReadPreference.PRIMARY)
+
+
+@raises(ValueError)
+def test_find_events_with_tampered_cursor():
+    # Given: Mongo store
+    store = create(url='mongodb://mockhost')
+    store._client_manager = MagicMock()
+
+    # When: I find events after an event id that is not an ObjectId
+    store.find_events('mock-deployment-id',
+                      after=(datetime.datetime(2022, 01, 01), 'tampered'))
+
+    # Then: ValueError is raised
+
+
+class TestBucketedEvents:
+
+    def setup(self):
+        self.store = create(url='mongodb://mockhost',
+                            event_coll='mockevents',
+                            event_storage_mode='bucketed')
+        self.store._client_manager = MagicMock()
+        self.db = self.store._client_manager.get.return_value \
+            .__getitem__.return_value
+        self.db.collection_names.return_value = [
+            'mockevents', 'mockevents-20211231', 'mockevents-20220101',
+            'mockevents-2022', 'deployments'
+        ]
+
+    def test_add_event_to_daily_bucket(self):
+        # When: I add event to the store
+        self.store._add_raw_event({
+            'type': 'MOCK_EVENT',
+            'date': datetime.datetime(2022, 01, 01, 10)
+        })
+
+        # Then: Event gets added to daily bucket
+        self.db.__getitem__.assert_any_call('mockevents-20220101')
+        self.db.__getitem__.return_value.insert_one.assert_called_once_with({
+            'type': 'MOCK_EVENT',
+            'date': datetime.datetime(2022, 01, 01, 10)
+        })
+
+    def test_event_collections(self):
+        # When: I get the event collections newer than given date
+        self.store._event_collections(
+            newest_first=True, since=datetime.datetime(2022, 01, 01, 10))
+
+        # Then: Only matching buckets are used
+        self.db.__getitem__.assert_called_once_with('mockevents-20220101')
+
+    @freeze_time(datetime.datetime(2022, 01, 01, 10))
+    @patch.dict('deployer.services.storage.mongo.__dict__', {
+        'EVENT_EXPIRY_SECONDS': 3600
+    })
+    def test_expire_events(self):
+        # When: I expire events
+        self.store.expire_events()
+
+        # Then: Buckets older than expiry are dropped
+        self.db.drop_collection.assert_called_once_with('mockevents-20211231')
+
+    def test_expire_events_for_ttl_mode(self):
+        # Given: Store using ttl mode for events
+        self.store.event_storage_mode = 'ttl'
+
+        # When: I expire events
+        self.store.expire_events()
+
+        # Then: No bucket gets dropped
+        eq_(self.db.drop_collection.call_count, 0)
+
+
+def test_setup_does_not_convert_existing_events_to_capped():
+    # Given: Mongo store in capped mode with existing (non capped) events
+    store = create(url='mongodb://mockhost', event_coll='mockevents',
+                   event_storage_mode='capped')
+    store._client_manager = MagicMock()
+    db = store._client_manager.get.return_value.__getitem__.return_value
+    db.collection_names.return_value = ['mockevents']
+    events = MagicMock()
+    events.options.return_value = {}
+    events.index_information.return_value = {}
+    db.__getitem__.side_effect = lambda name: \
+        events if name == 'mockevents' else MagicMock()
+
+    # When: I setup the store
+    store.setup()
+
+    # Then: Events collection is not converted
+    eq_(db.command.call_count, 0)
+
+    # And: Events expire using ttl index until converted
+    ok_('expiry_idx' in [call[1]['name'] for call in
+                         events.create_index.call_args_list])
+
+
+def test_merge_set():
+    # Given: Existing updates for deployment
+    updates = {}
+
+    # When: I merge runtime updates and state change
+    MongoStore._merge_set(updates, {'runtime.units': ['unit1'],
+                                    'modified': 1})
+    MongoStore._merge_set(updates, {'runtime': {}, 'state': 'PROMOTED'})
+    MongoStore._merge_set(updates, {'runtime.proxy-upstreams': {},
+                                    'modified': 2})
+
+    # Then: Updates are merged without conflicting paths
+    eq_(updates, {
+        'runtime': {
+            'proxy-upstreams': {}
+        },
+        'state': 'PROMOTED',
+        'modified': 2
+    })
+
+
+@patch('deployer.services.storage.mongo.MongoStore._refresh_app')
+def test_commit_unit_of_work(m_refresh_app):
+    # Given: Mongo store in ttl mode
+    store = create(url='mongodb://mockhost', event_coll='mockevents',
+                   deployment_coll='mockdeployments',
+                   event_storage_mode='ttl')
+    store._client_manager = MagicMock()
+    db = store._client_manager.get.return_value.__getitem__.return_value
+    collection = db.__getitem__.return_value
+    collection.name = 'mockevents'
+    collection.find.return_value = [
+        {'id': 'mockid', 'deployment': {'name': 'mockapp'}}]
+
+    # When: I commit multiple operations using unit of work
+    with store.unit_of_work() as uow:
+        uow.update_state('mockid', 'PROMOTED')
+        uow.update_runtime_units('mockid', ['unit1'])
+        uow.add_event('MOCK_EVENT')
+        uow.add_event('MOCK_EVENT2')
+
+    # Then: Deployment updates and events are written using single
+    # bulk_write each
+    eq_(collection.bulk_write.call_count, 2)
+    deployment_requests = collection.bulk_write.call_args_list[0][0][0]
+    eq_(len(deployment_requests), 1)
+    eq_(deployment_requests[0]._filter, {'id': 'mockid'})
+    event_requests = collection.bulk_write.call_args_list[1][0][0]
+    eq_(len(event_requests), 2)
+    m_refresh_app.assert_called_once_with('mockapp', datetime.datetime.max)
+
+
+@freeze_time(NOW)
+def test_update_state_refreshes_app_using_single_update():
+    # Given: Mongo store
+    store = create(url='mongodb://mockhost', deployment_coll='mockdeployments')
+    store._client_manager = MagicMock()
+    db = store._client_manager.get.return_value.__getitem__.return_value
+    collection = db.__getitem__.return_value
+    collection.find_one_and_update.return_value = {
+        'deployment': {'name': 'mockapp'}
+    }
+
+    # When: I update the deployment state
+    store.update_state('mockid', 'PROMOTED')
+
+    # Then: Application expiry is moved forward using single update
+    collection.update_one.assert_called_once_with(
+        {'cluster': CLUSTER_NAME, 'name': 'mockapp'},
+        {'$max': {'_expiry': datetime.datetime.max, 'modified': NOW}},
+        upsert=True)
+    eq_(collection.find_one.call_count, 0)
+
+
+@freeze_time(NOW)
+def test_update_runtime_units_only_when_changed():
+    # Given: Mongo store
+    store = create(url='mongodb://mockhost', deployment_coll='mockdeployments')
+    store._client_manager = MagicMock()
+    db = store._client_manager.get.return_value.__getitem__.return_value
+    collection = db.__getitem__.return_value
+
+    # When: I update runtime units
+    store.update_runtime_units('mockid', ['unit1'])
+
+    # Then: Deployment is updated only if the units hash differs
+    units_hash = content_hash(['unit1'])
+    collection.update_one.assert_called_once_with(
+        {
+            'id': 'mockid',
+            '_runtime-hashes.units': {'$ne': units_hash}
+        },
+        {
+            '$set': {
+                'runtime.units': ['unit1'],
+                '_runtime-hashes.units': units_hash,
+                'modified': NOW
+            }
+        })
+
+
+def test_commit_unit_of_work_with_runtime_updates():
+    # Given: Mongo store
+    store = create(url='mongodb://mockhost', deployment_coll='mockdeployments')
+    store._client_manager = MagicMock()
+    db = store._client_manager.get.return_value.__getitem__.return_value
+    collection = db.__getitem__.return_value
+
+    # When: I commit runtime updates using unit of work
+    with store.unit_of_work() as uow:
+        uow.update_runtime_units('mockid1', ['unit1'])
+        uow.update_runtime_upstreams('mockid1', {})
+        uow.update_runtime_units('mockid2', ['unit2'])
+
+    # Then: Deployments are updated only if runtime information changed
+    requests = collection.bulk_write.call_args[0][0]
+    eq_([request._filter for request in requests], [
+        {
+            'id': 'mockid1',
+            '$or': [
+                {'_runtime-hashes.proxy-upstreams': {
+                    '$ne': content_hash({})}},
+                {'_runtime-hashes.units': {'$ne': content_hash(['unit1'])}}
+            ]
+        },
+        {
+            'id': 'mockid2',
+            '_runtime-hashes.units': {'$ne': content_hash(['unit2'])}
+        }
+    ])
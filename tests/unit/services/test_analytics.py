@@ -0,0 +1,114 @@
+import datetime
+from freezegun import freeze_time
+from nose.tools import eq_
+from deployer.services import analytics
+from deployer.services.storage.memory import MemoryStore
+
+__author__ = 'sukrit'
+
+NOW = datetime.datetime(2022, 01, 01, 12)
+
+
+def _seconds(seconds):
+    return NOW - datetime.timedelta(seconds=seconds)
+
+
+def test_percentile():
+    values = range(1, 101)
+    eq_(analytics.percentile(values, 50), 50)
+    eq_(analytics.percentile(values, 95), 95)
+    eq_(analytics.percentile(values, 99), 99)
+    eq_(analytics.percentile([5], 99), 5)
+    eq_(analytics.percentile([], 50), None)
+
+
+def test_stage_durations():
+    # Given: Stage dates for deployment with missing stage
+    stage_dates = {
+        'NEW_DEPLOYMENT': _seconds(100),
+        'ACQUIRED_LOCK': _seconds(90),
+        'UNITS_STARTED': _seconds(50),
+        'PROMOTED': _seconds(0)
+    }
+
+    # When: I compute the stage durations
+    durations = analytics.stage_durations(stage_dates)
+
+    # Then: Durations since previous recorded stage are returned
+    eq_(durations, {
+        'ACQUIRED_LOCK': 10,
+        'UNITS_STARTED': 40,
+        'PROMOTED': 50,
+        'TOTAL': 100
+    })
+
+
+def test_summarize():
+    # When: I summarize durations for multiple deployments
+    summary = analytics.summarize([
+        {'PROMOTED': 10},
+        {'PROMOTED': 30},
+        {'PROMOTED': 20, 'ACQUIRED_LOCK': 5}
+    ], percentiles=(50, 99))
+
+    # Then: Percentiles are computed for each stage
+    eq_(summary, {
+        'PROMOTED': {'count': 3, 'max': 30, 'p50': 20, 'p99': 30},
+        'ACQUIRED_LOCK': {'count': 1, 'max': 5, 'p50': 5, 'p99': 5}
+    })
+
+
+class TestRollup:
+
+    def setup(self):
+        self.store = MemoryStore()
+        events = [
+            ('app1', 'app1-v1', 'NEW_DEPLOYMENT', 600),
+            ('app1', 'app1-v1', 'ACQUIRED_LOCK', 590),
+            ('app1', 'app1-v1', 'PROMOTED', 500),
+            ('app1', 'app1-v2', 'NEW_DEPLOYMENT', 300),
+            ('app1', 'app1-v2', 'PROMOTED', 100),
+            ('app2', 'app2-v1', 'ACQUIRED_LOCK', 50),
+            ('app2', 'app2-v1', 'PROMOTED', 20),
+            # Event outside the window
+            ('app2', 'app2-v0', 'NEW_DEPLOYMENT', 4000),
+            ('app2', 'app2-v0', 'PROMOTED', 3700),
+            # Non stage event
+            ('app2', 'app2-v1', 'WIRED', 10)
+        ]
+        for name, deployment_id, event_type, ago in events:
+            with freeze_time(_seconds(ago)):
+                self.store.add_event(event_type, search_params={
+                    'deployment': {
+                        'name': name,
+                        'id': deployment_id
+                    }
+                })
+
+    @freeze_time(NOW)
+    def test_compute_rollup(self):
+        # When: I compute the rollup for 1h window
+        rollup = analytics.compute_rollup('1h', end=NOW, store=self.store)
+
+        # Then: Rollup for the cluster and each app is computed
+        eq_(rollup['window'], '1h')
+        eq_(rollup['start'], _seconds(3600))
+        eq_(rollup['deployments'], 3)
+        eq_(rollup['stages']['PROMOTED']['count'], 3)
+        eq_(rollup['stages']['TOTAL'], {
+            'count': 2, 'max': 200, 'p50': 100, 'p95': 200, 'p99': 200
+        })
+        eq_([app['name'] for app in rollup['apps']], ['app1', 'app2'])
+        eq_(rollup['apps'][1]['stages'], {
+            'PROMOTED': {'count': 1, 'max': 30, 'p50': 30, 'p95': 30,
+                         'p99': 30}
+        })
+
+    @freeze_time(NOW)
+    def test_update_rollups(self):
+        # When: I update the rollups
+        analytics.update_rollups(windows=['1h', '2h'], store=self.store)
+
+        # Then: Rollups get saved for each window
+        eq_(self.store.get_rollup('1h')['deployments'], 3)
+        eq_(self.store.get_rollup('2h')['deployments'], 4)
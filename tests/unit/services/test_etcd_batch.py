@@ -0,0 +1,200 @@
+from mock import MagicMock
+from nose.tools import eq_
+from deployer.services.etcd_batch import EtcdBatch
+
+__author__ = 'sukrit'
+
+
+def _node(key, value=None, is_dir=False):
+    node = MagicMock()
+    node.key = key
+    node.value = value
+    node.dir = is_dir
+    return node
+
+
+def _etcd_client(nodes):
+    """
+    Creates mock etcd client backed by given nodes (key: value)
+    """
+    etcd_cl = MagicMock()
+
+    def read(key, recursive=False):
+        matching = [
+            _node(node_key, value, is_dir=value is None)
+            for node_key, value in sorted(nodes.items())
+            if node_key == key or node_key.startswith(key + '/')
+        ]
+        if not matching:
+            raise KeyError(key)
+        result = MagicMock()
+        result.get_subtree.return_value = matching
+        return result
+
+    etcd_cl.read.side_effect = read
+    return etcd_cl
+
+
+class TestEtcdBatch:
+
+    def setup(self):
+        self.etcd_cl = _etcd_client({
+            '/yoda/hosts/host1': None,
+            '/yoda/hosts/host1/locations': None,
+            '/yoda/hosts/host1/locations/loc1/path': '/path1',
+            '/yoda/hosts/host1/locations/loc1/upstream': 'app-8080',
+            '/yoda/hosts/host1/locations/loc2/path': '/path2',
+            '/yoda/upstreams/app-8080/mode': 'http'
+        })
+        self.batch = EtcdBatch(self.etcd_cl)
+
+    def test_write_is_recorded(self):
+        # When: I write using the batch
+        self.batch.write('/yoda/upstreams/app-8080/mode', 'tcp')
+
+        # Then: Write is not applied
+        eq_(self.etcd_cl.write.call_count, 0)
+
+    def test_flush_writes_only_changed_keys(self):
+        # Given: Host re-wired with one changed location
+        self.batch.delete('/yoda/hosts/host1', recursive=True)
+        self.batch.write('/yoda/hosts/host1/locations', None, dir=True)
+        self.batch.write('/yoda/hosts/host1/locations/loc1/path', '/path1')
+        self.batch.write('/yoda/hosts/host1/locations/loc1/upstream',
+                         'app-8081')
+
+        # When: I flush the batch
+        changes = self.batch.flush()
+
+        # Then: Only changed keys are written and removed keys are deleted
+        eq_(changes, 2)
+        self.etcd_cl.delete.assert_called_once_with(
+            '/yoda/hosts/host1/locations/loc2/path')
+        self.etcd_cl.write.assert_called_once_with(
+            '/yoda/hosts/host1/locations/loc1/upstream', 'app-8081',
+            ttl=None, dir=False)
+
+    def test_flush_for_unchanged_keys(self):
+        # Given: Upstream re-written with same value
+        self.batch.write('/yoda/upstreams/app-8080/mode', 'http')
+
+        # When: I flush the batch
+        changes = self.batch.flush()
+
+        # Then: Nothing is written
+        eq_(changes, 0)
+        eq_(self.etcd_cl.write.call_count, 0)
+
+    def test_flush_always_writes_keys_with_ttl(self):
+        # Given: Upstream re-written with same value and ttl
+        self.batch.write('/yoda/upstreams/app-8080/mode', 'http', ttl=60)
+
+        # When: I flush the batch
+        self.batch.flush()
+
+        # Then: Key is written to refresh the ttl
+        self.etcd_cl.write.assert_called_once_with(
+            '/yoda/upstreams/app-8080/mode', 'http', ttl=60, dir=False)
+
+    def test_flush_does_not_read_keys_with_ttl(self):
+        # Given: Upstream written with ttl
+        self.batch.write('/yoda/upstreams/app-8080/mode', 'http', ttl=60)
+
+        # When: I flush the batch
+        self.batch.flush()
+
+        # Then: Current state is not read
+        eq_(self.etcd_cl.read.call_count, 0)
+
+    def test_flush_deletes_removed_location_directory(self):
+        # Given: Etcd tree with directory nodes
+        self.etcd_cl = _etcd_client({
+            '/yoda/hosts/host1': None,
+            '/yoda/hosts/host1/locations': None,
+            '/yoda/hosts/host1/locations/loc1': None,
+            '/yoda/hosts/host1/locations/loc1/path': '/path1',
+            '/yoda/hosts/host1/locations/loc2': None,
+            '/yoda/hosts/host1/locations/loc2/path': '/path2',
+            '/yoda/hosts/host1/locations/loc2/upstream': 'app-8080',
+        })
+        self.batch = EtcdBatch(self.etcd_cl)
+
+        # And: Host re-wired without second location
+        self.batch.delete('/yoda/hosts/host1', recursive=True)
+        self.batch.write('/yoda/hosts/host1/locations', None, dir=True)
+        self.batch.write('/yoda/hosts/host1/locations/loc1/path', '/path1')
+
+        # When: I flush the batch
+        changes = self.batch.flush()
+
+        # Then: Removed location directory is deleted using single call
+        eq_(changes, 1)
+        self.etcd_cl.delete.assert_called_once_with(
+            '/yoda/hosts/host1/locations/loc2', recursive=True)
+        eq_(self.etcd_cl.write.call_count, 0)
+
+    def test_flush_writes_new_keys(self):
+        # Given: New upstream
+        self.batch.write('/yoda/upstreams/app-9090/mode', 'tcp')
+
+        # When: I flush the batch
+        self.batch.flush()
+
+        # Then: Key is written
+        self.etcd_cl.write.assert_called_once_with(
+            '/yoda/upstreams/app-9090/mode', 'tcp', ttl=None, dir=False)
+
+    def test_flush_deletes_removed_directory(self):
+        # Given: Deleted host
+        self.batch.delete('/yoda/hosts/host1', recursive=True)
+
+        # When: I flush the batch
+        self.batch.flush()
+
+        # Then: Host is deleted recursively using single call
+        self.etcd_cl.delete.assert_called_once_with('/yoda/hosts/host1',
+                                                    recursive=True)
+
+    def test_flush_resets_batch(self):
+        # Given: Flushed batch
+        self.batch.write('/yoda/upstreams/app-9090/mode', 'tcp')
+        self.batch.flush()
+
+        # When: I flush the batch again
+        changes = self.batch.flush()
+
+        # Then: No changes are applied
+        eq_(changes, 0)
+
+    def test_read_is_delegated(self):
+        # When: I read using the batch
+        result = self.batch.read('/yoda/upstreams/app-8080/mode')
+
+        # Then: Read is delegated to etcd client
+        eq_(result.get_subtree.return_value[0].value, 'http')
+
+    def test_merge(self):
+        # Given: Batch with recorded changes
+        other = EtcdBatch(self.etcd_cl)
+        other.delete('/yoda/hosts/host1', recursive=True)
+        other.write('/yoda/hosts/host1/locations/loc1/path', '/path1')
+
+        # When: I merge the batch
+        self.batch.merge(other)
+        self.batch.flush()
+
+        # Then: Changes from merged batch are applied
+        eq_(self.etcd_cl.delete.call_count, 2)
+        eq_(self.etcd_cl.write.call_count, 0)
+
+    def test_flush_with_base(self):
+        # Given: Changed upstream
+        self.batch.write('/yoda/upstreams/app-8080/mode', 'tcp')
+
+        # When: I flush the batch using base key
+        self.batch.flush(base='/yoda')
+
+        # Then: Current state is read once using base key
+        self.etcd_cl.read.assert_called_once_with('/yoda', recursive=True)
+        self.etcd_cl.write.assert_called_once_with(
+            '/yoda/upstreams/app-8080/mode', 'tcp', ttl=None, dir=False)
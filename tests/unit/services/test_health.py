@@ -1,6 +1,7 @@
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 from collections import namedtuple
+import time
 from future.builtins import (  # noqa
     bytes, dict, int, list, object, range, str,
     ascii, chr, hex, input, next, oct, open,
@@ -8,13 +9,24 @@ from future.builtins import (  # noqa
     filter, map, zip)
 
 from celery.tests.case import patch
-from conf.appconfig import HEALTH_OK
+from mock import MagicMock
+from nose.tools import eq_, ok_
+from conf.appconfig import HEALTH_OK, HEALTH_FAILED
 from deployer.services import health
 from tests.helper import dict_compare
 
 __author__ = 'sukrit'
 
 
+def _without_timestamps(health_status):
+    for status in health_status.values():
+        ok_(status.pop('checked-at'))
+        eq_(status.pop('stale'), False)
+    return health_status
+
+
+@patch('deployer.services.health._prober',
+       health.HealthProber(health.CHECKS, background=False))
 @patch('deployer.services.health.ping')
 @patch('deployer.services.health.client')
 @patch('deployer.services.health.get_store')
@@ -34,7 +46,7 @@ def test_get_health(
     health_status = health.get_health()
 
     # Then: Expected health status is returned
-    dict_compare(health_status, {
+    dict_compare(_without_timestamps(health_status), {
         'etcd': {
             'status': HEALTH_OK,
             'details': {
@@ -54,6 +66,8 @@ def test_get_health(
     })
 
 
+@patch('deployer.services.health._prober',
+       health.HealthProber(health.CHECKS, background=False))
 @patch('deployer.services.health.ping')
 @patch('deployer.services.health.client')
 @patch('deployer.services.health.get_store')
@@ -72,7 +86,7 @@ def test_get_health_when_celery_is_enabled(get_store, client, ping):
     health_status = health.get_health(check_celery=True)
 
     # Then: Expected health status is returned
-    dict_compare(health_status, {
+    dict_compare(_without_timestamps(health_status), {
         'etcd': {
             'status': HEALTH_OK,
             'details': {
@@ -90,3 +104,102 @@ def test_get_health_when_celery_is_enabled(get_store, client, ping):
             'details': 'Celery ping:pong'
         },
     })
+
+
+def test_run_checks_concurrently():
+    """
+    Should run the health checks concurrently
+    """
+
+    # Given: Slow health checks
+    def slow_check():
+        time.sleep(0.2)
+        return {'status': HEALTH_OK, 'details': 'slow'}
+
+    # When: I run the checks
+    start = time.time()
+    health_status = health.run_checks({
+        'check1': slow_check,
+        'check2': slow_check
+    })
+
+    # Then: Checks are run concurrently
+    ok_(time.time() - start < 0.35)
+    eq_(health_status['check1']['details'], 'slow')
+    eq_(health_status['check2']['details'], 'slow')
+
+
+def test_run_checks_with_timeout():
+    """
+    Should report the check as failed when it times out
+    """
+
+    # Given: Health check that does not complete in time
+    def hung_check():
+        time.sleep(0.5)
+
+    # When: I run the checks with smaller timeout
+    health_status = health.run_checks({'hung': hung_check},
+                                      check_timeout=0.1)
+
+    # Then: Check is reported as failed
+    eq_(health_status['hung']['status'], HEALTH_FAILED)
+
+
+def test_health_prober_serves_cached_results():
+    """
+    Should serve the cached health status without probing again
+    """
+
+    # Given: Prober with cached results
+    check = MagicMock(return_value={'status': HEALTH_OK, 'details': 'mock'})
+    prober = health.HealthProber({'mock': check}, background=False)
+    prober.get(['mock'])
+
+    # When: I get the health status again
+    health_status = prober.get(['mock'])
+
+    # Then: Cached status is returned
+    eq_(check.call_count, 1)
+    eq_(health_status['mock']['details'], 'mock')
+    eq_(health_status['mock']['stale'], False)
+
+
+def test_health_prober_marks_stale_results():
+    """
+    Should mark the cached health status as stale
+    """
+
+    # Given: Prober with cached results
+    check = MagicMock(return_value={'status': HEALTH_OK, 'details': 'mock'})
+    prober = health.HealthProber({'mock': check}, stale_after=0)
+    prober.probe(['mock'])
+
+    # When: I get the health status after stale time
+    with patch('deployer.services.health.HealthProber.start'):
+        time.sleep(0.01)
+        health_status = prober.get(['mock'])
+
+    # Then: Cached status is marked as stale
+    eq_(check.call_count, 1)
+    eq_(health_status['mock']['stale'], True)
+
+
+def test_health_prober_probes_only_requested_checks():
+    """
+    Should probe only the requested checks in background
+    """
+
+    # Given: Prober with multiple checks
+    check1 = MagicMock(return_value={'status': HEALTH_OK, 'details': '1'})
+    check2 = MagicMock(return_value={'status': HEALTH_OK, 'details': '2'})
+    prober = health.HealthProber({'check1': check1, 'check2': check2},
+                                 background=False)
+    prober.get(['check1'])
+
+    # When: I probe the checks
+    prober.probe()
+
+    # Then: Only requested check is probed
+    eq_(check1.call_count, 2)
+    eq_(check2.call_count, 0)
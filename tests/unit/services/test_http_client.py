@@ -0,0 +1,42 @@
+from mock import patch
+from nose.tools import eq_, ok_
+from deployer.services import http_client
+
+__author__ = 'sukrit'
+
+
+@patch.dict('deployer.services.http_client._sessions', {})
+def test_get_session_reuses_session_for_same_endpoint():
+    # When: I get sessions for urls
+    session1 = http_client.get_session('https://mockhost/path1')
+    session2 = http_client.get_session('https://mockhost/path2')
+    session3 = http_client.get_session('https://otherhost/path1')
+
+    # Then: Session is shared only for the same endpoint
+    ok_(session1 is session2)
+    ok_(session1 is not session3)
+
+
+@patch.dict('deployer.services.http_client._sessions', {})
+@patch.dict('deployer.services.http_client.HTTP_SETTINGS', {
+    'connect-timeout': 1,
+    'read-timeout': 2
+})
+@patch('deployer.services.http_client.requests')
+def test_post_with_default_timeout(m_requests):
+    # When: I post using pooled session
+    http_client.post('https://mockhost/path', data='mockdata')
+
+    # Then: Request is sent with default timeouts
+    m_requests.Session.return_value.post.assert_called_once_with(
+        'https://mockhost/path', data='mockdata', timeout=(1, 2))
+
+
+@patch.dict('deployer.services.http_client._sessions', {})
+@patch('deployer.services.http_client.requests')
+def test_post_with_timeout(m_requests):
+    # When: I post with explicit timeout
+    http_client.post('https://mockhost/path', timeout=30)
+
+    # Then: Given timeout is used
+    eq_(m_requests.Session.return_value.post.call_args[1]['timeout'], 30)
@@ -1,12 +1,13 @@
 """
 Tests proxy service methods
 """
-from mock import patch, call
+from mock import patch, call, ANY, MagicMock
 from nose.tools import eq_
 from yoda import Host, Location
 from conf.appconfig import DEPLOYMENT_MODE_BLUEGREEN, DEPLOYMENT_MODE_AB
 from deployer.services.proxy import wire_proxy, register_upstreams, \
-    get_discovered_nodes
+    get_discovered_nodes, reconcile_proxy
+from deployer.util import LRUCache
 
 
 MOCK_APP = 'mock-app'
@@ -46,8 +47,9 @@ def _get_mock_proxy_with_hosts():
     }
 
 
+@patch('deployer.services.proxy.EtcdBatch')
 @patch('yoda.client.Client')
-def test_wire_for_bluegreen(mock_yoda_cl):
+def test_wire_for_bluegreen(mock_yoda_cl, m_etcd_batch):
 
     # Given: Mock Proxy, application that needs to be wired
     proxy = _get_mock_proxy_with_hosts()
@@ -90,8 +92,9 @@ def test_wire_for_bluegreen(mock_yoda_cl):
         ])
 
 
+@patch('deployer.services.proxy.EtcdBatch')
 @patch('yoda.client.Client')
-def test_wire_for_ab(mock_yoda_cl):
+def test_wire_for_ab(mock_yoda_cl, m_etcd_batch):
 
     # Given: Mock Proxy, application that needs to be wired
     proxy = {
@@ -129,8 +132,9 @@ def test_wire_for_ab(mock_yoda_cl):
     ])
 
 
+@patch('deployer.services.proxy.EtcdBatch')
 @patch('yoda.client.Client')
-def test_register_upstreams_for_blue_green(mock_yoda_cl):
+def test_register_upstreams_for_blue_green(mock_yoda_cl, m_etcd_batch):
 
     # Given: Upstreams that needs to be registered
     upstreams = {
@@ -163,8 +167,9 @@ def test_register_upstreams_for_blue_green(mock_yoda_cl):
         ])
 
 
+@patch('deployer.services.proxy.EtcdBatch')
 @patch('yoda.client.Client')
-def test_register_upstreams_for_ab_deploy(mock_yoda_cl):
+def test_register_upstreams_for_ab_deploy(mock_yoda_cl, m_etcd_batch):
 
     # Given: Upstreams that needs to be registered
     upstreams = {
@@ -196,6 +201,115 @@ def test_register_upstreams_for_ab_deploy(mock_yoda_cl):
         ])
 
 
+@patch('deployer.services.proxy.get_etcd_client')
+@patch('deployer.services.proxy.EtcdBatch')
+@patch('yoda.client.Client')
+def test_wire_proxy_applies_changes_in_single_batch(mock_yoda_cl, m_etcd_batch,
+                                                    m_get_etcd_client):
+
+    # Given: Mock Proxy, application that needs to be wired
+    proxy = _get_mock_proxy_with_hosts()
+
+    # When: I wire the proxy
+    wire_proxy(MOCK_APP, MOCK_VERSION, proxy)
+
+    # Then: Single yoda client backed by etcd batch is used for all hosts
+    m_etcd_batch.assert_called_once_with(m_get_etcd_client.return_value)
+    mock_yoda_cl.assert_called_once_with(
+        etcd_cl=m_etcd_batch.return_value, etcd_base=ANY)
+    eq_(mock_yoda_cl.return_value.wire_proxy.call_count, 2)
+
+    # And: Changes are applied once
+    m_etcd_batch.return_value.flush.assert_called_once_with()
+
+
+@patch('deployer.services.proxy._desired_proxy_cache', LRUCache())
+@patch('deployer.services.proxy.get_etcd_client')
+@patch('deployer.services.proxy.EtcdBatch')
+@patch('yoda.client.Client')
+def test_reconcile_proxy(mock_yoda_cl, m_etcd_batch, m_get_etcd_client):
+
+    # Given: Promoted deployment
+    deployment = {
+        'id': 'mock-deployment-id',
+        'deployment': {
+            'name': MOCK_APP,
+            'version': MOCK_VERSION
+        },
+        'proxy': _get_mock_proxy_with_hosts()
+    }
+    m_etcd_batch.return_value.flush.return_value = 2
+
+    # When: I reconcile the proxy twice
+    reconcile_proxy([deployment])
+    result = reconcile_proxy([deployment])
+
+    # Then: Desired proxy is recorded only once
+    eq_(mock_yoda_cl.return_value.wire_proxy.call_count, 2)
+
+    # And: Drifted keys are repaired using single read of yoda base
+    m_etcd_batch.return_value.flush.assert_called_with(base=ANY)
+    eq_(result['deployments'], 1)
+    eq_(result['repaired'], 2)
+
+
+@patch('deployer.services.proxy._desired_proxy_cache', LRUCache())
+@patch('deployer.services.proxy.get_etcd_client')
+@patch('deployer.services.proxy.EtcdBatch')
+@patch('yoda.client.Client')
+def test_reconcile_proxy_during_promotion(mock_yoda_cl, m_etcd_batch,
+                                          m_get_etcd_client):
+
+    # Given: Promoted (old) deployment of application being promoted
+    deployment = {
+        'id': 'mock-deployment-id',
+        'deployment': {
+            'name': MOCK_APP,
+            'version': MOCK_VERSION
+        },
+        'proxy': _get_mock_proxy_with_hosts()
+    }
+    m_etcd_batch.return_value.flush.return_value = 0
+
+    # When: I reconcile the proxy during the promotion
+    result = reconcile_proxy([deployment],
+                             get_skip_apps=lambda: {MOCK_APP})
+
+    # Then: Proxy is not re-wired to the old version
+    eq_(mock_yoda_cl.return_value.wire_proxy.call_count, 0)
+    eq_(result['deployments'], 0)
+    eq_(result['skipped'], 1)
+
+
+@patch('deployer.services.proxy._desired_proxy_cache', LRUCache())
+@patch('deployer.services.proxy.get_etcd_client')
+@patch('deployer.services.proxy.EtcdBatch')
+@patch('yoda.client.Client')
+def test_reconcile_proxy_when_promotion_starts_during_pass(
+        mock_yoda_cl, m_etcd_batch, m_get_etcd_client):
+
+    # Given: Promoted deployment of application whose promotion starts
+    # while the desired proxy is being computed
+    deployment = {
+        'id': 'mock-deployment-id',
+        'deployment': {
+            'name': MOCK_APP,
+            'version': MOCK_VERSION
+        },
+        'proxy': _get_mock_proxy_with_hosts()
+    }
+    get_skip_apps = MagicMock(side_effect=[set(), {MOCK_APP}])
+    m_etcd_batch.return_value.flush.return_value = 0
+
+    # When: I reconcile the proxy
+    result = reconcile_proxy([deployment], get_skip_apps=get_skip_apps)
+
+    # Then: Application is skipped (skip list is re-checked before flush)
+    eq_(m_etcd_batch.return_value.merge.call_count, 0)
+    eq_(result['deployments'], 0)
+    eq_(result['skipped'], 1)
+
+
 @patch('yoda.client.Client')
 def test_check_discover_when_port_is_not_defined(mock_yoda_cl):
 
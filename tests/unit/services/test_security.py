@@ -6,9 +6,9 @@ from future.builtins import (  # noqa
     pow, round, super,
     filter, map, zip)
 from nose.tools import eq_, ok_
-from mock import patch
+from mock import patch, MagicMock
 from deployer.services.security import using_encryption_store, \
-    decrypt_config
+    decrypt_config, CachedKeyStore
 
 MOCK_BUCKET = 'mockbucket'
 MOCK_PASSPHRASE = 'mock-passphrase'
@@ -68,3 +68,58 @@ def test_decrypt_config(m_decrypt_obj):
     m_decrypt_obj.assert_called_once_with(
         {'mockkey': 'mockvalue'}, profile='default', store=None,
         passphrase=None)
+
+
+def test_cached_key_store_loads_key_once():
+    # Given: Cached key store
+    store = MagicMock()
+    store.load.return_value = b'mock-key'
+    cached_store = CachedKeyStore(store, ttl=60, max_size=10)
+
+    # When: I load the key twice
+    cached_store.load('mockprofile', 'priv')
+    key = cached_store.load('mockprofile', 'priv')
+
+    # Then: Key is fetched from store only once
+    eq_(key, b'mock-key')
+    store.load.assert_called_once_with('mockprofile', 'priv')
+
+
+def test_cached_key_store_zeroizes_evicted_keys():
+    # Given: Cached key store with cached key
+    store = MagicMock()
+    store.load.return_value = b'mock-key'
+    cached_store = CachedKeyStore(store, ttl=60, max_size=10)
+    cached_store.load('mockprofile', 'priv')
+    buffer = cached_store._cache.get(('mockprofile', 'priv'))
+
+    # When: I clear the cache
+    cached_store.clear()
+
+    # Then: Cached key buffer is zeroized
+    eq_(buffer, bytearray(len(b'mock-key')))
+
+
+def test_cached_key_store_does_not_cache_other_methods():
+    # Given: Cached key store
+    store = MagicMock()
+    cached_store = CachedKeyStore(store, ttl=60, max_size=10)
+
+    # When: I invoke other store method twice
+    cached_store.get_profiles()
+    cached_store.get_profiles()
+
+    # Then: Store method is invoked each time
+    eq_(store.get_profiles.call_count, 2)
+
+
+def test_cached_key_store_delegates_attributes():
+    # Given: Cached key store
+    store = MagicMock()
+    store.bucket = MOCK_BUCKET
+
+    # When: I get the store attribute
+    bucket = CachedKeyStore(store).bucket
+
+    # Then: Attribute from wrapped store is returned
+    eq_(bucket, MOCK_BUCKET)
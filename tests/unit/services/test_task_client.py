@@ -0,0 +1,49 @@
+from mock import MagicMock, patch
+from nose.tools import eq_, ok_
+from deployer.services.task_client import TaskClient
+
+
+class TestTaskClient:
+
+    def setup(self):
+        self.client = TaskClient(MagicMock())
+
+    @patch('deployer.services.task_client.gevent')
+    def test_wait_for_finished_task(self, m_gevent):
+        # Given: Task that has finished
+        self.client.ready = MagicMock(return_value={
+            'status': 'READY',
+            'output': 'mockoutput'
+        })
+
+        # When: I wait for the task
+        result = self.client.wait('mocktask', timeout=5, interval=1)
+
+        # Then: Task output is returned without sleeping
+        eq_(result, {
+            'status': 'READY',
+            'output': 'mockoutput'
+        })
+        m_gevent.sleep.assert_not_called()
+
+    def test_wait_for_pending_task(self):
+        # Given: Task that never finishes
+        self.client.ready = MagicMock(return_value={
+            'status': 'PENDING',
+            'output': None
+        })
+
+        # When: I wait for the task
+        result = self.client.wait('mocktask', timeout=0.05, interval=0.01)
+
+        # Then: Pending status is returned once timeout is exceeded
+        eq_(result, {
+            'status': 'PENDING',
+            'output': None
+        })
+
+        # And: Each poll is bounded by the remaining time
+        timeouts = [call[1]['timeout']
+                    for call in self.client.ready.call_args_list]
+        ok_(timeouts[0] <= 0.05)
+        ok_(timeouts[-1] < timeouts[0])
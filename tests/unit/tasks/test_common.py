@@ -0,0 +1,48 @@
+import socket
+from mock import patch, MagicMock
+from nose.tools import eq_, ok_, raises
+from deployer.tasks.common import async_wait
+
+
+@raises(Exception)
+@patch('deployer.tasks.common.simple_result')
+def test_async_wait_retries_on_transient_error(m_simple_result):
+    # Given: Result backend that is temporarily unavailable
+    error = socket.error('mock')
+    m_simple_result.side_effect = error
+
+    # And: Mock Implementation for retry
+    with patch.object(async_wait, 'retry',
+                      MagicMock(side_effect=Exception('Retry'))) as m_retry:
+
+        # When: I wait for the result
+        try:
+            async_wait('mock-result', max_retries=3)
+        finally:
+            # Then: Task is retried using countdown (instead of sleeping)
+            kwargs = m_retry.call_args[1]
+            eq_(kwargs['exc'], error)
+            eq_(kwargs['max_retries'], 1)
+            ok_(0 < kwargs['countdown'] <= 1)
+
+            # And: Transient error retries are tracked separately
+            eq_(kwargs['kwargs']['error_retries'], 1)
+
+
+@raises(socket.error)
+@patch('deployer.tasks.common.simple_result')
+def test_async_wait_when_transient_error_retries_are_exhausted(
+        m_simple_result):
+    # Given: Result backend that is unavailable
+    m_simple_result.side_effect = socket.error('mock')
+
+    # And: Mock Implementation for retry
+    with patch.object(async_wait, 'retry', MagicMock()) as m_retry:
+
+        # When: I wait for the result after exhausting transient error
+        # retries
+        try:
+            async_wait('mock-result', max_retries=100, error_retries=10)
+        finally:
+            # Then: Task is not retried
+            eq_(m_retry.call_count, 0)
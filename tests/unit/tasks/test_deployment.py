@@ -8,7 +8,9 @@ from nose.tools import raises, eq_, assert_raises
 from paramiko import SSHException
 
 from conf.appconfig import DEPLOYMENT_MODE_BLUEGREEN, \
-    DEPLOYMENT_MODE_REDGREEN, DEPLOYMENT_STATE_STARTED, CLUSTER_NAME
+    DEPLOYMENT_MODE_REDGREEN, DEPLOYMENT_STATE_STARTED, CLUSTER_NAME, \
+    DEPLOYMENT_STATE_PROMOTED, DEPLOYMENT_STATE_FAILED, \
+    DEPLOYMENT_STATE_DECOMMISSIONED
 from deployer.celery import app
 from deployer.tasks.exceptions import NodeNotUndeployed, MinNodesNotRunning, \
     NodeCheckFailed, MinNodesNotDiscovered, MaxStartConcurrencyReached
@@ -17,7 +19,8 @@ from tests.helper import dict_compare
 
 from deployer.tasks.deployment import _pre_create_undeploy, \
     _wait_for_undeploy, _fleet_check_deploy, _check_node, _check_deployment, \
-    _check_discover, _start_deployment, create_search_parameters
+    _check_discover, _start_deployment, create_search_parameters, \
+    _fleet_deploy, reconcile_promoted_proxy, _sync_runtime
 
 __author__ = 'sukrit'
 
@@ -249,6 +252,39 @@ def test_fleet_check_deploy_when_ssh_error_is_thrown(mock_filter_units):
     # Then: Check SSHException exception is thrown
 
 
+@patch('deployer.tasks.deployment.get_store')
+@patch('deployer.tasks.deployment.decrypt_config')
+@patch('deployer.tasks.deployment.Deployment')
+def test_fleet_deploy(m_deployment, m_decrypt_config, m_get_store):
+    # Given: Template for a service type
+    m_decrypt_config.side_effect = lambda args, profile: args
+    template = {'name': 'app.service', 'args': {}}
+
+    # When: I deploy units for the service type
+    _fleet_deploy({}, 'mockapp', 'v1', 3, 'app', template, 'default')
+
+    # Then: Units for the service type are deployed
+    eq_(m_deployment.call_args[1]['service_type'], 'app')
+    m_deployment.return_value.deploy.assert_called_once_with(start=False)
+    eq_(m_get_store.return_value.add_event.call_count, 1)
+
+
+@raises(SSHException)
+@patch('deployer.tasks.deployment.get_store')
+@patch('deployer.tasks.deployment.decrypt_config')
+@patch('deployer.tasks.deployment.Deployment')
+def test_fleet_deploy_when_ssh_error_is_thrown(m_deployment, m_decrypt_config,
+                                               m_get_store):
+    # Given: Fleet deployment that fails with ssh error
+    m_deployment.return_value.deploy.side_effect = SSHException()
+
+    # When: I deploy units
+    _fleet_deploy({}, 'mockapp', 'v1', 3, 'app',
+                  {'name': 'app.service', 'args': {}}, 'default')
+
+    # Then: SSHException is thrown (after retries)
+
+
 @patch('urllib2.urlopen')
 def test_check_node(m_urlopen):
     """
@@ -508,3 +544,102 @@ def test_create_search_parameters():
             }
         }
     })
+
+
+def _app_deployment(version, state, state_updated):
+    return {
+        'id': 'mock-app-{}'.format(version),
+        'deployment': {'name': 'mock-app', 'version': version},
+        'state': state,
+        'state-updated': state_updated
+    }
+
+
+@patch('deployer.tasks.deployment._release_lock')
+@patch('deployer.tasks.deployment._get_job_lock')
+@patch('deployer.tasks.deployment.reconcile_proxy')
+@patch('deployer.tasks.deployment.get_store')
+def test_reconcile_promoted_proxy_during_promotion(
+        m_get_store, m_reconcile_proxy, m_get_job_lock, m_release_lock):
+    # Given: Application being promoted (proxy already wired to new version
+    # while the old version is still the promoted deployment)
+    old_deployment = _app_deployment('v1', DEPLOYMENT_STATE_PROMOTED, NOW)
+    new_deployment = _app_deployment(
+        'v2', DEPLOYMENT_STATE_STARTED, NOW + datetime.timedelta(hours=1))
+    m_get_store.return_value.filter_deployments.side_effect = \
+        lambda state=None, **kwargs: \
+        [old_deployment] if state == DEPLOYMENT_STATE_PROMOTED else \
+        [old_deployment, new_deployment]
+    m_reconcile_proxy.return_value = {
+        'deployments': 0,
+        'skipped': 1,
+        'repaired': 0,
+        'duration': 0.1
+    }
+
+    # When: I reconcile the proxy for promoted deployments
+    reconcile_promoted_proxy()
+
+    # Then: Application being promoted is skipped
+    deployments = m_reconcile_proxy.call_args[0][0]
+    get_skip_apps = m_reconcile_proxy.call_args[1]['get_skip_apps']
+    eq_(deployments, [old_deployment])
+    eq_(get_skip_apps(), {'mock-app'})
+
+
+@patch('deployer.tasks.deployment._release_lock')
+@patch('deployer.tasks.deployment._get_job_lock')
+@patch('deployer.tasks.deployment.reconcile_proxy')
+@patch('deployer.tasks.deployment.get_store')
+def test_reconcile_promoted_proxy_after_failed_promotion(
+        m_get_store, m_reconcile_proxy, m_get_job_lock, m_release_lock):
+    # Given: Application whose promotion failed after wiring the proxy (and
+    # stopping the promoted version)
+    old_deployment = _app_deployment('v1', DEPLOYMENT_STATE_PROMOTED, NOW)
+    new_deployment = _app_deployment(
+        'v2', DEPLOYMENT_STATE_FAILED, NOW + datetime.timedelta(hours=1))
+    decommissioned = _app_deployment(
+        'v0', DEPLOYMENT_STATE_DECOMMISSIONED,
+        NOW + datetime.timedelta(hours=2))
+    m_get_store.return_value.filter_deployments.return_value = [
+        decommissioned, old_deployment, new_deployment]
+    m_reconcile_proxy.return_value = {
+        'deployments': 0,
+        'skipped': 1,
+        'repaired': 0,
+        'duration': 0.1
+    }
+
+    # When: I reconcile the proxy for promoted deployments
+    reconcile_promoted_proxy()
+
+    # Then: Application is skipped
+    get_skip_apps = m_reconcile_proxy.call_args[1]['get_skip_apps']
+    eq_(get_skip_apps(), {'mock-app'})
+    m_get_store.return_value.filter_deployments.assert_called_with(
+        only_running=False)
+
+
+@patch('deployer.tasks.deployment.get_store')
+def test_sync_runtime_in_chunks(m_get_store):
+    # Given: Promoted deployments
+    deployments = [{'id': 'mock-id-%d' % index} for index in range(3)]
+
+    # And: Store failing to write the runtime updates of first chunk
+    m_get_store.return_value.unit_of_work.return_value.commit.side_effect = \
+        [Exception('mock error'), None]
+
+    # And: Sync function for single deployment
+    def sync(deployment_id, uow=None):
+        return {'deployment_id': deployment_id, 'state': 'success'}
+
+    # When: I sync runtime information in chunks of 2 deployments
+    outputs = _sync_runtime(sync, deployments, chunk_size=2)
+
+    # Then: Runtime updates are written per chunk
+    eq_(m_get_store.return_value.unit_of_work.return_value.commit.call_count,
+        2)
+
+    # And: Only deployments in the failed chunk are marked failed
+    eq_([output['state'] for output in outputs],
+        ['failed', 'failed', 'success'])
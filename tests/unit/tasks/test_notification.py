@@ -1,6 +1,8 @@
-from mock import patch
+from mock import patch, MagicMock
+from nose.tools import eq_
 
-from conf.appconfig import LEVEL_FAILED, LEVEL_FAILED_WARN, LEVEL_SUCCESS
+from conf.appconfig import LEVEL_FAILED, LEVEL_FAILED_WARN, LEVEL_SUCCESS, \
+    LEVEL_PENDING
 from deployer.tasks import notification
 
 
@@ -72,10 +74,10 @@ def test_notify(m_notify_hipchat):
     m_notify_hipchat.si.assert_called_once()
 
 
-@patch('deployer.tasks.notification.requests')
+@patch('deployer.tasks.notification.http_client')
 @patch('deployer.tasks.notification.templatefactory')
 @patch('deployer.tasks.notification.json')
-def test_notify_hipchat(m_json, m_templatefactory, m_requests):
+def test_notify_hipchat(m_json, m_templatefactory, m_http_client):
     """
     Should send hipchat notification
     :return:
@@ -94,7 +96,7 @@ def test_notify_hipchat(m_json, m_templatefactory, m_requests):
         'default')
 
     # Then: Notification gets send successfully
-    m_requests.post.assert_called_once_with(
+    m_http_client.post.assert_called_once_with(
         'https://api.hipchat.com/v2/room/mockroom/notification',
         headers={
             'content-type': 'application/json',
@@ -114,11 +116,11 @@ def test_notify_hipchat(m_json, m_templatefactory, m_requests):
     )
 
 
-@patch('deployer.tasks.notification.requests')
+@patch('deployer.tasks.notification.http_client')
 @patch('deployer.tasks.notification.templatefactory')
 @patch('deployer.tasks.notification.json')
 def test_notify_hipchat_for_level_success(m_json, m_templatefactory,
-                                          m_requests):
+                                          m_http_client):
     """
     Should send hipchat notification
     :return:
@@ -137,7 +139,7 @@ def test_notify_hipchat_for_level_success(m_json, m_templatefactory,
         'default')
 
     # Then: Notification gets send successfully
-    m_requests.post.assert_called_once_with(
+    m_http_client.post.assert_called_once_with(
         'https://api.hipchat.com/v2/room/mockroom/notification',
         headers={
             'content-type': 'application/json',
@@ -150,10 +152,10 @@ def test_notify_hipchat_for_level_success(m_json, m_templatefactory,
         })
 
 
-@patch('deployer.tasks.notification.requests')
+@patch('deployer.tasks.notification.http_client')
 @patch('deployer.tasks.notification.templatefactory')
 @patch('deployer.tasks.notification.json')
-def test_notify_slack(m_json, m_templatefactory, m_requests):
+def test_notify_slack(m_json, m_templatefactory, m_http_client):
     """
     Should send slack notification
     :return:
@@ -171,7 +173,7 @@ def test_notify_slack(m_json, m_templatefactory, m_requests):
         'default')
 
     # Then: Notification gets send successfully
-    m_requests.post.assert_called_once_with(
+    m_http_client.post.assert_called_once_with(
         'http://mockslackurl',
         headers={
             'content-type': 'application/json'
@@ -179,11 +181,11 @@ def test_notify_slack(m_json, m_templatefactory, m_requests):
         data='{}')
 
 
-@patch('deployer.tasks.notification.requests')
+@patch('deployer.tasks.notification.http_client')
 @patch('deployer.tasks.notification.templatefactory')
 @patch('deployer.tasks.notification.json')
 def test_notify_slack_when_url_is_not_set(m_json, m_templatefactory,
-                                          m_requests):
+                                          m_http_client):
     """
     Should not send slack notification
     :return:
@@ -201,12 +203,12 @@ def test_notify_slack_when_url_is_not_set(m_json, m_templatefactory,
         'default')
 
     # Then: Notification is not sent
-    m_requests.post.assert_not_called()
+    m_http_client.post.assert_not_called()
 
 
-@patch('deployer.tasks.notification.requests')
+@patch('deployer.tasks.notification.http_client')
 @patch('deployer.tasks.notification.json')
-def test_github(m_json, m_requests):
+def test_github(m_json, m_http_client):
     """
     Should send github commit notification
     """
@@ -234,7 +236,7 @@ def test_github(m_json, m_requests):
         'default')
 
     # Then: Notification gets send successfully
-    m_requests.post.assert_called_once_with(
+    m_http_client.post.assert_called_once_with(
         'https://api.github.com/repos/mockowner/mockrepo/statuses/mockcommit',
         headers={
             'Content-Type': 'application/json',
@@ -248,9 +250,9 @@ def test_github(m_json, m_requests):
         })
 
 
-@patch('deployer.tasks.notification.requests')
+@patch('deployer.tasks.notification.http_client')
 @patch('deployer.tasks.notification.json')
-def test_github_with_no_git_metadata(m_json, m_requests):
+def test_github_with_no_git_metadata(m_json, m_http_client):
     """
     Should not send github commit notification when commit, ref, repo, owner is
     missing.
@@ -268,12 +270,12 @@ def test_github_with_no_git_metadata(m_json, m_requests):
         'default')
 
     # Then: Notification gets send successfully
-    m_requests.post.assert_not_called()
+    m_http_client.post.assert_not_called()
 
 
-@patch('deployer.tasks.notification.requests')
+@patch('deployer.tasks.notification.http_client')
 @patch('deployer.tasks.notification.json')
-def test_github_with_no_token(m_json, m_requests):
+def test_github_with_no_token(m_json, m_http_client):
     """
     Should not send github commit notification when GITHUB token is not
     specified.
@@ -292,4 +294,146 @@ def test_github_with_no_token(m_json, m_requests):
         'default')
 
     # Then: Notification gets send successfully
-    m_requests.post.assert_not_called()
+    m_http_client.post.assert_not_called()
+
+
+def _batch_request(*args):
+    request = MagicMock()
+    request.args = args
+    return request
+
+
+@patch('deployer.tasks.notification.http_client')
+@patch('deployer.tasks.notification.templatefactory')
+@patch('deployer.tasks.notification.json')
+def test_notify_batch_coalesces_hipchat(m_json, m_templatefactory,
+                                        m_http_client):
+    # Given: Buffered hipchat notifications for the same room
+    m_templatefactory.render_template.side_effect = ['mockmsg1', 'mockmsg2']
+    m_json.dumps.side_effect = lambda data: data
+    config = {'token': 'mocktoken', 'room': 'mockroom',
+              'colors': {'1': 'red', '3': 'green'}}
+
+    # When: I send the buffered notifications
+    notification.notify_batch([
+        _batch_request('hipchat', {'message': 'mock1'}, {}, LEVEL_SUCCESS,
+                       config, 'default'),
+        _batch_request('hipchat', {'message': 'mock2'}, {}, LEVEL_FAILED,
+                       config, 'default')
+    ])
+
+    # Then: Single notification is sent using the most severe level
+    m_http_client.post.assert_called_once_with(
+        'https://api.hipchat.com/v2/room/mockroom/notification',
+        headers={
+            'content-type': 'application/json',
+            'Authorization': 'Bearer mocktoken'},
+        data={
+            'color': 'red',
+            'message': 'mockmsg1<br/>mockmsg2',
+            'notify': True,
+            'message_format': 'html'
+        })
+
+
+@patch('deployer.tasks.notification.http_client')
+@patch('deployer.tasks.notification.json')
+def test_notify_batch_sends_latest_github_status(m_json, m_http_client):
+    # Given: Buffered github notifications for the same commit
+    m_json.dumps.side_effect = lambda data: data
+    ctx = {
+        'deployment': {
+            'meta-info': {
+                'git': {
+                    'commit': 'mockcommit',
+                    'repo': 'mockrepo',
+                    'owner': 'mockowner'
+                }
+            }
+        }
+    }
+
+    # When: I send the buffered notifications
+    notification.notify_batch([
+        _batch_request('github', {'message': 'started'}, ctx, LEVEL_PENDING,
+                       {'token': 'mocktoken'}, 'default'),
+        _batch_request('github', {'message': 'promoted'}, ctx, LEVEL_SUCCESS,
+                       {'token': 'mocktoken'}, 'default')
+    ])
+
+    # Then: Only latest status is sent
+    eq_(m_http_client.post.call_count, 1)
+    eq_(m_http_client.post.call_args[1]['data']['state'], 'success')
+
+
+@patch('deployer.tasks.notification.decrypt_config')
+@patch('deployer.tasks.notification.send_github')
+@patch('deployer.tasks.notification.http_client')
+def test_notify_batch_uses_rate_limited_send_task(m_http_client,
+                                                  m_send_github,
+                                                  m_decrypt_config):
+    # Given: Buffered github notification with encrypted config
+    m_decrypt_config.return_value = {'token': 'mocktoken'}
+    ctx = {
+        'deployment': {
+            'meta-info': {
+                'git': {
+                    'commit': 'mockcommit',
+                    'repo': 'mockrepo',
+                    'owner': 'mockowner'
+                }
+            }
+        }
+    }
+
+    # When: I send the buffered notifications
+    notification.notify_batch([
+        _batch_request('github', {'message': 'promoted'}, ctx, LEVEL_SUCCESS,
+                       {'token': 'mockencrypted'}, 'default')
+    ])
+
+    # Then: Notification is sent using (rate limited) send task with
+    # encrypted config (instead of the token)
+    send_ctx, config, security_profile, data = m_send_github.si.call_args[0]
+    eq_(send_ctx, ctx)
+    eq_(config, {'token': 'mockencrypted'})
+    eq_(security_profile, 'default')
+    eq_(data['state'], 'success')
+    m_send_github.si.return_value.delay.assert_called_once_with()
+    m_http_client.post.assert_not_called()
+
+
+@patch('deployer.tasks.notification.decrypt_config')
+@patch('deployer.tasks.notification.http_client')
+@patch('deployer.tasks.notification.json')
+def test_send_github_decrypts_config(m_json, m_http_client,
+                                     m_decrypt_config):
+    # Given: Encrypted github config
+    m_json.dumps.side_effect = lambda data: data
+    m_decrypt_config.return_value = {'token': 'mocktoken'}
+    ctx = {
+        'deployment': {
+            'meta-info': {
+                'git': {
+                    'commit': 'mockcommit',
+                    'repo': 'mockrepo',
+                    'owner': 'mockowner'
+                }
+            }
+        }
+    }
+
+    # When: I send the coalesced github status
+    notification.send_github(ctx, {'token': 'mockencrypted'}, 'default',
+                             {'state': 'success'})
+
+    # Then: Status is posted using decrypted token
+    m_decrypt_config.assert_called_once_with({'token': 'mockencrypted'},
+                                             profile='default')
+    m_http_client.post.assert_called_once_with(
+        'https://api.github.com/repos/mockowner/mockrepo/statuses/'
+        'mockcommit', headers={
+            'Content-Type': 'application/json',
+            'Accept': 'application/vnd.github.v3+json',
+            'Authorization': 'token mocktoken'
+        }, data={'state': 'success'})
@@ -0,0 +1,26 @@
+from mock import patch, MagicMock
+from nose.tools import eq_
+from deployer.tasks import routing
+
+
+MOCK_TASKS = {
+    'mock.blocking': MagicMock(blocking=True),
+    'mock.cooperative': MagicMock(blocking=False)
+}
+
+
+@patch.dict('deployer.celery.app.tasks', MOCK_TASKS, clear=True)
+def test_route_for_blocking_task():
+    eq_(routing.BlockingTaskRouter().route_for_task('mock.blocking'),
+        routing.ROUTE_BLOCKING)
+
+
+@patch.dict('deployer.celery.app.tasks', MOCK_TASKS, clear=True)
+def test_route_for_cooperative_task():
+    eq_(routing.BlockingTaskRouter().route_for_task('mock.cooperative'),
+        None)
+
+
+@patch.dict('deployer.celery.app.tasks', MOCK_TASKS, clear=True)
+def test_blocking_tasks():
+    eq_(routing.blocking_tasks(), ['mock.blocking'])
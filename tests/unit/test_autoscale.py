@@ -0,0 +1,96 @@
+from mock import MagicMock, patch
+from nose.tools import eq_, ok_
+from deployer.autoscale import QueueDepthAutoscaler, RuntimeStats
+
+
+def _autoscaler(messages=0, consumers=1, stats=None):
+    worker = MagicMock()
+    worker.app.amqp.queues.consume_from = {'mock-queue': MagicMock()}
+    channel = worker.app.connection.return_value.default_channel
+    channel.queue_declare.return_value = ('mock-queue', messages, consumers)
+    autoscaler = QueueDepthAutoscaler(
+        MagicMock(), 10, 1, worker=worker, poll_interval=5,
+        drain_seconds=10, default_runtime=2,
+        runtime_stats=stats or RuntimeStats())
+    # Poller is not started for tests
+    autoscaler.start_poller = MagicMock()
+    return autoscaler
+
+
+@patch('deployer.autoscale.state')
+def test_qty_uses_queue_backlog(m_state):
+    # Given: Queue with backlog shared with another consumer
+    autoscaler = _autoscaler(messages=40, consumers=2)
+    autoscaler.poll_backlog()
+    m_state.reserved_requests = [MagicMock()]
+
+    # When: I get the desired concurrency
+    qty = autoscaler.qty
+
+    # Then: Concurrency to drain the backlog is returned
+    eq_(autoscaler.backlog, 20)
+    eq_(qty, 5)
+
+
+@patch('deployer.autoscale.state')
+def test_qty_does_not_poll_broker(m_state):
+    # Given: Autoscaler with queue backlog
+    autoscaler = _autoscaler(messages=40)
+    m_state.reserved_requests = []
+
+    # When: I get the desired concurrency
+    qty = autoscaler.qty
+
+    # Then: Only cached backlog is used (polled in background)
+    eq_(qty, 0)
+    eq_(autoscaler.worker.app.connection.call_count, 0)
+    autoscaler.start_poller.assert_called_once_with()
+
+
+@patch('deployer.autoscale.monotonic')
+@patch('deployer.autoscale.state')
+def test_qty_uses_observed_runtime(m_state, m_monotonic):
+    # Given: Task that ran for 10 seconds
+    stats = RuntimeStats()
+    autoscaler = _autoscaler(messages=10, stats=stats)
+    autoscaler.poll_backlog()
+    m_state.reserved_requests = []
+    m_monotonic.return_value = 100
+    stats.task_started('task1')
+    m_monotonic.return_value = 110
+    stats.task_finished('task1')
+
+    # When: I get the desired concurrency
+    qty = autoscaler.qty
+
+    # Then: Observed runtime is used for desired concurrency
+    eq_(autoscaler.runtime, 10)
+    eq_(qty, 10)
+
+
+def test_runtime_stats_moving_average():
+    # Given: Runtime stats with recorded runtime
+    stats = RuntimeStats()
+    stats.record(10)
+
+    # When: I record another runtime
+    stats.record(20)
+
+    # Then: Moving average of runtimes is maintained
+    eq_(stats.runtime, 12)
+
+
+@patch('deployer.autoscale.state')
+def test_qty_when_queue_depth_is_not_available(m_state):
+    # Given: Broker that is not reachable
+    autoscaler = _autoscaler()
+    autoscaler.worker.app.connection.side_effect = IOError('mock')
+    autoscaler.poll_backlog()
+    m_state.reserved_requests = [MagicMock(), MagicMock()]
+
+    # When: I get the desired concurrency
+    qty = autoscaler.qty
+
+    # Then: Only reserved requests are considered
+    eq_(qty, 2)
+    ok_(autoscaler._connection is None)
@@ -0,0 +1,64 @@
+from mock import MagicMock
+from nose.tools import eq_, ok_
+from deployer.hubmonitor import HubMonitor
+
+
+def _monitor():
+    monitor = HubMonitor(threshold=1)
+    monitor._hub = MagicMock(name='hub')
+    return monitor
+
+
+def test_check_when_greenlets_are_switching():
+    # Given: Monitor observing greenlet switches
+    monitor = _monitor()
+    monitor.check(100)
+    monitor._trace('switch', (monitor._hub, MagicMock()))
+
+    # When: I check the hub after threshold
+    block = monitor.check(102)
+
+    # Then: Hub is not blocked
+    eq_(block, None)
+    eq_(monitor.blocks, {})
+
+
+def test_check_when_hub_is_idle():
+    # Given: Monitor with hub as the active greenlet
+    monitor = _monitor()
+    monitor._trace('switch', (MagicMock(), monitor._hub))
+    monitor.check(100)
+
+    # When: I check the hub after threshold
+    block = monitor.check(102)
+
+    # Then: Hub is not blocked
+    eq_(block, None)
+
+
+def test_check_when_task_blocks_hub():
+    # Given: Greenlet running a task that does not yield
+    monitor = _monitor()
+    task_greenlet = MagicMock()
+    monitor._tasks[task_greenlet] = 'mock.task'
+    monitor._trace('switch', (monitor._hub, task_greenlet))
+    monitor.check(100)
+    monitor.check(101.5)
+
+    # When: I check the hub again
+    block = monitor.check(103)
+
+    # Then: Blocking task is recorded
+    eq_(block['task'], 'mock.task')
+    eq_(block['duration'], 3)
+    eq_(monitor.blocks, {
+        'mock.task': {
+            'count': 1,
+            'max-duration': 3
+        }
+    })
+
+    # And: Block is reported once the task yields
+    monitor._trace('switch', (task_greenlet, monitor._hub))
+    monitor.check(104)
+    ok_(monitor.reports[0] is block)
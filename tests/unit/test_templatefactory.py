@@ -0,0 +1,24 @@
+from nose.tools import eq_, ok_
+from deployer import templatefactory
+
+
+def test_precompile_templates():
+    # When: I precompile the notification templates
+    templates = templatefactory.precompile_templates()
+
+    # Then: All notification templates are compiled
+    eq_(sorted(templates.keys()), ['hipchat.html', 'slack.json.jinja'])
+
+
+def test_render_template_uses_precompiled_template():
+    # When: I render the hipchat template
+    msg = templatefactory.render_template(
+        'hipchat.html', notification={'message': 'mock message'}, ctx={
+            'cluster': 'mock-cluster',
+            'operation': 'mockop',
+            'deployment': {'meta-info': {}}
+        }, level=1)
+
+    # Then: Template gets rendered
+    ok_('mock message' in msg)
+    ok_('hipchat.html' in templatefactory._templates)
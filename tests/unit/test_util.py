@@ -1,4 +1,7 @@
-from nose.tools import eq_, raises
+import threading
+import time
+from nose.tools import eq_, ok_, raises
+from mock import MagicMock, patch
 from deployer import util
 
 from deployer.util import dict_merge
@@ -104,3 +107,238 @@ def test_str_representation_for_invalid_interval():
     # Then: Expected representation is returned
     eq_(output, 'Invalid interval specified:invalid. Interval should '
                 'match format: ^\\s*(\d+)(ms|h|m|s|d|w)\\s*$')
+
+
+def test_lru_cache_get_and_put():
+    # Given: Cache with cached value
+    cache = util.LRUCache(max_size=2)
+    cache.put('key1', 'value1')
+
+    # When: I get the cached value
+    value = cache.get('key1')
+
+    # Then: Cached value is returned
+    eq_(value, 'value1')
+    eq_(cache.get('key2', 'default'), 'default')
+
+
+def test_lru_cache_evicts_least_recently_used():
+    # Given: Cache that is full
+    evicted = []
+    cache = util.LRUCache(
+        max_size=2, on_evict=lambda key, value: evicted.append(key))
+    cache.put('key1', 'value1')
+    cache.put('key2', 'value2')
+    cache.get('key1')
+
+    # When: I add a new entry
+    cache.put('key3', 'value3')
+
+    # Then: Least recently used entry gets evicted
+    eq_(evicted, ['key2'])
+    eq_(cache.get('key2'), None)
+    eq_(cache.get('key1'), 'value1')
+    eq_(len(cache), 2)
+
+
+@patch('deployer.util.time')
+def test_lru_cache_expires_entries(m_time):
+    # Given: Cache with entry that has expired
+    m_time.time.return_value = 100
+    evicted = []
+    cache = util.LRUCache(
+        ttl=5, on_evict=lambda key, value: evicted.append(value))
+    cache.put('key1', 'value1')
+    m_time.time.return_value = 106
+
+    # When: I get the cached value
+    value = cache.get('key1')
+
+    # Then: Expired entry is evicted
+    eq_(value, None)
+    eq_(evicted, ['value1'])
+    eq_(len(cache), 0)
+
+
+def test_lru_cache_invalidate_and_clear():
+    # Given: Cache with cached values
+    cache = util.LRUCache()
+    cache.put('key1', 'value1')
+    cache.put('key2', 'value2')
+
+    # When: I invalidate one entry and clear the cache
+    cache.invalidate('key1')
+    value1 = cache.get('key1')
+    cache.clear()
+
+    # Then: Entries are removed
+    eq_(value1, None)
+    eq_(cache.get('key2'), None)
+
+
+def test_content_hash_ignores_key_order():
+    # When: I compute content hash for dictionaries with same content
+    hash1 = util.content_hash({'key1': [1, 2], 'key2': {'a': 'b'}})
+    hash2 = util.content_hash({'key2': {'a': 'b'}, 'key1': [1, 2]})
+
+    # Then: Same hash is returned
+    eq_(hash1, hash2)
+
+
+def test_content_hash_for_different_content():
+    eq_(util.content_hash(['unit1']) == util.content_hash(['unit2']), False)
+
+
+def test_nested_deadline_does_not_exceed_enclosing_deadline():
+    # Given: Enclosing deadline
+    with util.deadline(1):
+
+        # When: I apply larger nested deadline
+        with util.deadline(100):
+            remaining = util.remaining_time()
+
+    # Then: Remaining time is bounded by enclosing deadline
+    ok_(0 < remaining <= 1)
+    eq_(util.remaining_time(5), 5)
+
+
+def test_timeout_propagates_deadline():
+    # Given: Function that returns remaining time
+    @util.timeout(seconds=1)
+    def get_remaining():
+        return util.remaining_time(10)
+
+    # When: I invoke the function
+    remaining = get_remaining()
+
+    # Then: Remaining time is bounded by timeout
+    ok_(0 < remaining <= 1)
+
+
+@raises(util.TimeoutError)
+def test_timeout_in_thread():
+    # Given: Function that does not complete in time
+    @util.timeout(seconds=0.1)
+    def slow():
+        time.sleep(1)
+    errors = []
+
+    def run():
+        try:
+            slow()
+        except util.TimeoutError as error:
+            errors.append(error)
+
+    # When: I invoke the function in separate thread
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+    # Then: TimeoutError is raised
+    raise errors[0]
+
+
+@raises(ValueError)
+def test_timeout_reraises_error():
+    # Given: Function that fails
+    @util.timeout(seconds=1)
+    def fail():
+        raise ValueError('mock')
+
+    # When: I invoke the function
+    fail()
+
+    # Then: Original error is raised
+
+
+@raises(IOError)
+@patch('deployer.util.time.sleep')
+def test_retry_reraises_last_error(m_sleep):
+    # Given: Function that always fails
+    fn = MagicMock(side_effect=IOError('mock'))
+
+    # When: I invoke the function with retry
+    try:
+        util.retry(3, delay=1, backoff=2, except_on=(IOError,))(fn)()
+    finally:
+        # Then: Function is retried with backoff before error is re-raised
+        eq_(fn.call_count, 3)
+        eq_([call[0][0] for call in m_sleep.call_args_list], [1, 2])
+
+
+@patch('deployer.util.time.sleep')
+def test_retry_within_budget(m_sleep):
+    # Given: Policy with total time budget
+    policy = util.RetryPolicy(10, delay=2, backoff=2, budget=10,
+                              except_on=(IOError,))
+    fn = MagicMock(side_effect=[IOError(), IOError(), 'done'])
+
+    # When: I invoke the function using policy
+    result = policy.call(fn)
+
+    # Then: Function is retried until it succeeds
+    eq_(result, 'done')
+    eq_(policy.max_retries(), 2)
+
+
+@patch('deployer.util.random.random')
+def test_retry_delay_with_jitter_and_max_delay(m_random):
+    # Given: Policy with jitter and max delay
+    m_random.return_value = 1
+    policy = util.RetryPolicy(10, delay=1, backoff=2, max_delay=5,
+                              jitter=0.5)
+
+    # When: I get the delay for the retries
+    delays = [policy.delay_for(retries) for retries in range(5)]
+
+    # Then: Delays are capped and randomized
+    eq_(delays, [0.5, 1, 2, 2.5, 2.5])
+
+
+def test_retry_task_uses_countdown():
+    # Given: Bound celery task
+    task = MagicMock()
+    task.request.retries = 2
+    task.retry.return_value = Exception('Retry')
+    policy = util.RetryPolicy(5, delay=1, backoff=2)
+    exc = IOError()
+
+    # When: I retry the task using the policy
+    try:
+        policy.retry_task(task, exc)
+    except Exception as error:
+        eq_(str(error), 'Retry')
+
+    # Then: Task is retried with countdown (instead of sleeping)
+    task.retry.assert_called_once_with(exc=exc, countdown=4, max_retries=4)
+
+
+def test_retry_task_with_separately_tracked_retries():
+    # Given: Bound celery task that was also retried for other reasons
+    task = MagicMock()
+    task.request.retries = 20
+    task.retry.return_value = Exception('Retry')
+    policy = util.RetryPolicy(5, delay=1, backoff=2)
+    exc = IOError()
+
+    # When: I retry the task using the policy
+    try:
+        policy.retry_task(task, exc, retries=1, kwargs={'mock': 'value'})
+    except Exception as error:
+        eq_(str(error), 'Retry')
+
+    # Then: Task is retried as per the policy retries
+    task.retry.assert_called_once_with(exc=exc, countdown=2, max_retries=21,
+                                       kwargs={'mock': 'value'})
+
+
+@raises(IOError)
+def test_retry_task_when_retries_are_exhausted():
+    # Given: Bound celery task
+    task = MagicMock()
+    policy = util.RetryPolicy(5, delay=1, backoff=2)
+
+    # When: I retry the task after exhausting the policy retries
+    policy.retry_task(task, IOError(), retries=4)
+
+    # Then: Exception is raised
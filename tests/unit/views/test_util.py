@@ -1,8 +1,13 @@
 import json
 import datetime
-from nose.tools import eq_
+from flask import Flask
+from mock import MagicMock
+from nose.tools import eq_, raises
 import pytz
-from deployer.views.util import DateTimeEncoder
+from werkzeug.exceptions import BadRequest
+from deployer.views.util import DateTimeEncoder, stream_json, use_etag, \
+    generate_etag, encode_cursor, decode_cursor, use_cursor, use_api_reads
+from deployer.services.storage.base import is_api_read
 
 NOW = datetime.datetime(2022, 01, 01, hour=0, minute=0, second=0,
                         microsecond=0, tzinfo=pytz.UTC)
@@ -22,3 +27,140 @@ def test_datetime_encoder_for_non_date_obj():
 
     # Then: Output gets serialized as expected
     eq_(output, '5')
+
+
+def test_stream_json_for_empty_iterable():
+    # When: I stream empty iterable as json
+    output = list(stream_json(iter([])))
+
+    # Then: Empty json array is returned
+    eq_(output, ['[]'])
+
+
+def test_stream_json():
+    # Given: Iterable with items that needs to be streamed
+    items = iter([{'modified': NOW}, {'id': 2}, {'id': 3}])
+
+    # When: I stream the items using small buffer
+    output = list(stream_json(items, buffer_size=10))
+
+    # Then: Items are yielded in chunks as valid json array
+    eq_(len(output), 4)
+    eq_(json.loads(''.join(output)), [
+        {'modified': '2022-01-01T00:00:00+00:00'},
+        {'id': 2},
+        {'id': 3}
+    ])
+
+
+def _mock_view_with_etag():
+    view = MagicMock(return_value=('mockresponse', 200, {}))
+    view.__name__ = 'mockview'
+    return view, use_etag(lambda **kwargs: {'modified': NOW, 'count': 2})(
+        view)
+
+
+def test_use_etag():
+    # Given: View that uses etag
+    view, etag_view = _mock_view_with_etag()
+
+    # When: I invoke the view without conditional headers
+    with Flask(__name__).test_request_context('/'):
+        output = etag_view(accept_mimetype='mockmimetype')
+
+    # Then: View response is returned with ETag and Last-Modified headers
+    eq_(output, ('mockresponse', 200, {
+        'ETag': '"%s"' % generate_etag(
+            {'modified': NOW, 'count': 2}, 'mockmimetype', ''),
+        'Last-Modified': 'Sat, 01 Jan 2022 00:00:00 GMT'
+    }))
+    view.assert_called_once_with(accept_mimetype='mockmimetype')
+
+
+def test_use_etag_for_matching_etag():
+    # Given: View that uses etag
+    view, etag_view = _mock_view_with_etag()
+    etag = generate_etag({'modified': NOW, 'count': 2}, 'mockmimetype', '')
+
+    # When: I invoke the view with matching If-None-Match header
+    with Flask(__name__).test_request_context(
+            '/', headers={'If-None-Match': '"%s"' % etag}):
+        output = etag_view(accept_mimetype='mockmimetype')
+
+    # Then: Not modified response is returned without invoking the view
+    eq_(output[1], 304)
+    view.assert_not_called()
+
+
+def test_use_etag_for_not_modified_since():
+    # Given: View that uses etag
+    view, etag_view = _mock_view_with_etag()
+
+    # When: I invoke the view with If-Modified-Since header
+    with Flask(__name__).test_request_context(
+            '/', headers={'If-Modified-Since':
+                          'Sat, 01 Jan 2022 00:00:00 GMT'}):
+        output = etag_view(accept_mimetype='mockmimetype')
+
+    # Then: Not modified response is returned without invoking the view
+    eq_(output[1], 304)
+    view.assert_not_called()
+
+
+def test_encode_and_decode_cursor():
+    # Given: Cursor for item
+    cursor = encode_cursor(NOW.replace(microsecond=123456), 'mockid')
+
+    # When: I decode the cursor
+    decoded = decode_cursor(cursor)
+
+    # Then: Position of the item is returned as naive utc date and id
+    eq_(decoded, (datetime.datetime(2022, 01, 01, microsecond=123456),
+                  'mockid'))
+
+
+@raises(ValueError)
+def test_decode_invalid_cursor():
+    decode_cursor('invalid')
+
+
+def test_use_cursor():
+    # Given: View using cursor based paging
+    view = MagicMock(return_value='mockresponse')
+    view.__name__ = 'mockview'
+    app = Flask(__name__)
+    cursor = encode_cursor(NOW, 'mockid')
+
+    # When: I invoke the view with cursor and size
+    with app.test_request_context(
+            '/?cursor={}&size=5'.format(cursor)):
+        use_cursor(view)()
+
+    # Then: Cursor position and size are passed to the view
+    view.assert_called_once_with(
+        after=(datetime.datetime(2022, 01, 01), 'mockid'), size=5)
+
+
+@raises(BadRequest)
+def test_use_cursor_with_invalid_cursor():
+    # Given: View using cursor based paging
+    view = MagicMock(return_value='mockresponse')
+    view.__name__ = 'mockview'
+    app = Flask(__name__)
+
+    # When: I invoke the view with invalid cursor
+    with app.test_request_context('/?cursor=invalid'):
+        use_cursor(view)()
+
+
+def test_use_api_reads():
+    # Given: Read only view
+    view = MagicMock(side_effect=lambda: is_api_read())
+    view.__name__ = 'mockview'
+
+    # When: I invoke the view using API reads
+    api_read = use_api_reads(view)()
+
+    # Then: View is invoked within API reads context
+    eq_(api_read, True)
+    eq_(is_api_read(), False)